@@ -2,15 +2,13 @@
 import os
 import h5py
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from fillmissing import fill_missing
-from cleaning import clean_and_validate_data
 from loadh5 import load_h5_data
+from preprocess import load_preprocessed
 from connect_broken_tracks import (connect_broken_tracks, calculate_distance, 
                                    find_start_end_frames, generate_connected_track_name, 
-                                   circle_check, create_new_tracks, complete_new_tracks)
-from groom import detect_grooming_events
+                                   merge_track_chains)
+from groom import detect_grooming_events, plot_grooming_timeline
+from plotting import save_track_plot, save_distance_scatter, render_figures
 
 # Directory paths
 directory = "h5try"
@@ -41,53 +39,42 @@ def save_individuals_count_to_file(individuals_count, output_directory):
         for filename, count in individuals_count.items():
             f.write(f"{filename}: {count}\n")
 
-def plot_tracks(locations, track_names, filename):
-    """Plot tracks for each individual and save as an image."""
-    plt.figure(figsize=(10, 8))
-    for track_idx in range(locations.shape[3]):
-        track_data = locations[:, :, :, track_idx]
-        x_data, y_data = track_data[:, 0, 0], track_data[:, 0, 1]
-        valid_indices = ~np.isnan(x_data) & ~np.isnan(y_data)
-        
-        if valid_indices.any():
-            plt.plot(x_data[valid_indices], y_data[valid_indices])
-            
-    plt.title(f"Tracks for {filename}")
-    plt.xlabel("X position")
-    plt.ylabel("Y position")
-    plt.tight_layout(rect=[0, 0.03, 1, 1])
+def plot_tracks(locations, track_names, filename, max_points=5000, figure_jobs=None):
+    """Plot the mandible track of each individual and save as an image, or add it to figure_jobs."""
     output_path = os.path.join(output_directory, f"{os.path.splitext(filename)[0]}_results.png")
-    plt.savefig(output_path)
-    plt.close()
-
-def plot_distance_scatter(distances, filename):
-    """Plot a scatter plot for total distance traveled by each track."""
-    plt.figure(figsize=(10, 8))
-    sns.scatterplot(x=list(distances.keys()), y=list(distances.values()), s=100)
-    plt.xlabel("Tracks")
-    plt.ylabel("Total Distance")
-    plt.xticks(rotation=90)
-    plt.title(f"Total Distance Traveled by Each Track in {filename}")
-    plt.tight_layout(rect=[0, 0.03, 1, 1])
+    kwargs = dict(locations=locations, output_path=output_path, title=f"Tracks for {filename}", node=0,
+                  max_points=max_points)
+    if figure_jobs is None:
+        save_track_plot(**kwargs)
+    else:
+        figure_jobs.append((save_track_plot, kwargs))
+
+def plot_distance_scatter(distances, filename, figure_jobs=None):
+    """Plot a scatter plot for total distance traveled by each track, or add it to figure_jobs."""
     output_path = os.path.join(output_directory, f"{os.path.splitext(filename)[0]}_distances.png")
-    plt.savefig(output_path)
-    plt.close()
-
-def process_file(filepath, output_directory):
-    """Process individual .h5 file to extract and analyze track data."""
+    kwargs = dict(distances=distances, output_path=output_path,
+                  title=f"Total Distance Traveled by Each Track in {filename}")
+    if figure_jobs is None:
+        save_distance_scatter(**kwargs)
+    else:
+        figure_jobs.append((save_distance_scatter, kwargs))
+
+def process_file(filepath, output_directory, figure_jobs=None):
+    """Process individual .h5 file to extract and analyze track data.
+
+    With a figure_jobs list, the figures are added to it as render_figures jobs instead of being drawn here.
+    """
     try:
         # Load file data
         with h5py.File(filepath, "r") as f:
             track_names = [n.decode() for n in f["track_names"][:]]
             locations = f["tracks"][:].T
 
-        # Load and clean data
-        frame_count, node_count, instance_count, locations, track_names, node_names = load_h5_data(filepath)
-        filled_locations = fill_missing(locations)
-        cleaned_dataset = clean_and_validate_data(filled_locations)
+        # Cleaned and filled data, memory-mapped from the cache next to the file after the first run
+        frame_count, node_count, instance_count, filled_locations, track_names, node_names = load_preprocessed(filepath)
 
         # Detect mandible_abdomen_grooming events
-        mandible_abdomen_grooming_events = detect_mandible_abdomen_grooming(
+        mandible_abdomen_grooming_events = detect_grooming_events(
             filled_locations, min_distance=1, max_distance=50, min_duration_frames=45
         )
         
@@ -127,21 +114,32 @@ def process_file(filepath, output_directory):
                 if not np.isnan(track_points[frame, :, :]).any() and not np.isnan(track_points[frame + 1, :, :]).any()
             ])
         
-        # Calculate distances for connected tracks
+        # Calculate distances for connected tracks, each chain merged into one track so no frame is counted twice
+        occupied = ~np.isnan(locations).all(axis=(1, 2))
+        chained_locations, chained_names = merge_track_chains(filled_locations, track_names, list(track_chains.values()), occupied)
         for new_track_name, track_chain in track_chains.items():
-            x_data = np.concatenate([filled_locations[:, 0, 0, track_names.index(tn)] for tn in track_chain])
-            y_data = np.concatenate([filled_locations[:, 0, 1, track_names.index(tn)] for tn in track_chain])
+            track_idx = chained_names.index(generate_connected_track_name(track_chain))
+            x_data, y_data = chained_locations[:, 0, 0, track_idx], chained_locations[:, 0, 1, track_idx]
             distances[new_track_name] = np.nansum(np.sqrt(np.diff(x_data) ** 2 + np.diff(y_data) ** 2))
 
         # Save results
-        save_distances_to_file(distances, os.path.join(output_directory, f"{os.path.splitext(filepath)[0]}_distances.txt"))
-        plot_tracks(filled_locations, track_names, os.path.basename(filepath))
-        plot_distance_scatter(distances, os.path.basename(filepath))
+        save_distances_to_file(distances, os.path.join(output_directory, f"{os.path.splitext(os.path.basename(filepath))[0]}_distances.txt"))
+        plot_tracks(filled_locations, track_names, os.path.basename(filepath), figure_jobs=figure_jobs)
+        plot_distance_scatter(distances, os.path.basename(filepath), figure_jobs=figure_jobs)
 
     except Exception as e:
         print(f"Error processing '{filepath}': {e}")
 
 
+def process_directory(directory, output_directory, processes=None):
+    """Process every .h5 file in a directory, then render all of their figures in parallel worker processes."""
+    figure_jobs = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".h5"):
+            process_file(os.path.join(directory, filename), output_directory, figure_jobs=figure_jobs)
+    return render_figures(figure_jobs, processes=processes)
+
+
 
 if __name__ == "__main__":
     # .h5 dosyasını yükle
@@ -0,0 +1,192 @@
+"""
+Compact archive format for trajectories. SLEAP files store every coordinate as float64 for every track
+slot and frame, mostly NaN padding. An archive stores the load_h5_data locations as:
+
+- deltas: int16 sub-pixel fixed-point coordinates (round(x * scale)), delta-encoded along frames, only
+  for the occupied pieces of every track (frames in which any node of the track is present)
+- keyframes: int32 absolute fixed-point coordinates at the first frame of every piece
+- validity: a packed bitmap of the present points; missing points inside a piece are stored as repeats
+  of the previous point (delta 0) and restored as NaN
+
+Pieces never cross a frame_chunk boundary, so any frame window is decoded from the pieces of the chunks
+it touches with one contiguous read of each dataset. A jump larger than the int16 delta range starts a
+new piece. The decoded coordinates are within 0.5 / scale pixels of the originals (1/32 px by default).
+
+Point and tracking scores are not archived.
+
+Example:
+    archive_h5("7_3_dev.h5", "7_3_dev.sarc")
+    frame_count, node_count, instance_count, locations, track_names, node_names = load_archive("7_3_dev.sarc")
+    window = read_archive("7_3_dev.sarc", 10000, 12000)
+"""
+import h5py
+import numpy as np
+from memory import analysis_dtype
+from prefetch import read_frame_blocks
+from runlength import find_runs
+
+ARCHIVE_VERSION = 1
+DELTA_LIMIT = np.iinfo(np.int16).max
+
+
+def fixed_point(block, scale):
+    """Fixed-point (frames, nodes, 2, tracks) int64 coordinates and the (frames, nodes, tracks) validity of a block.
+
+    Missing points take the value of the previous present point of the same node (or the first one), so
+    they cost a zero delta.
+    """
+    valid = ~np.isnan(block).any(axis=2)
+    values = np.round(np.where(valid[:, :, None, :], block, 0) * scale).astype(np.int64)
+    index = np.where(valid, np.arange(len(block))[:, None, None], -1)
+    index = np.maximum.accumulate(index, axis=0)
+    index = np.where(index < 0, valid.argmax(axis=0)[None], index)
+    return np.take_along_axis(values, index[:, :, None, :], axis=0), valid
+
+
+def block_pieces(values, valid):
+    """(track, start, stop) pieces of a block: occupied runs, split where a delta exceeds the int16 range."""
+    occupied = valid.any(axis=1)
+    jumps = np.zeros_like(occupied)
+    jumps[1:] = (np.abs(np.diff(values, axis=0)) > DELTA_LIMIT).any(axis=(1, 2))
+    pieces = []
+    for track, start, end in zip(*find_runs(occupied)):
+        cuts = start + 1 + np.flatnonzero(jumps[start + 1:end + 1, track])
+        bounds = np.concatenate([[start], cuts, [end + 1]])
+        pieces.extend((track, lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]))
+    return pieces
+
+
+def _append(dataset, data):
+    start = dataset.shape[0]
+    dataset.resize(start + len(data), axis=0)
+    dataset[start:] = data
+
+
+def write_archive_blocks(blocks, output_path, frame_count, node_count, num_tracks, track_names=None,
+                         node_names=None, scale=16, frame_chunk=4096, compression="gzip"):
+    """
+    Write an archive from consecutive frame blocks of exactly frame_chunk frames (the last may be shorter).
+
+    Parameters:
+    - blocks: (start_frame, locations block) pairs, blocks with shape (frames, nodes, 2, tracks).
+    - output_path (str): Path of the new archive.
+    - frame_count, node_count, num_tracks (int): Size of the recording.
+    - track_names, node_names (list): Names stored with the archive.
+    - scale (int): Fixed-point steps per pixel.
+    - frame_chunk (int): Frames per chunk; the unit of random access.
+    - compression (str): h5py compression filter.
+
+    Returns:
+    - dict: Number of pieces and stored delta rows.
+    """
+    with h5py.File(output_path, "w") as output:
+        output.attrs.update(version=ARCHIVE_VERSION, scale=scale, frame_chunk=frame_chunk,
+                            frame_count=frame_count, node_count=node_count, num_tracks=num_tracks)
+        row_chunk = max(1, min(frame_chunk, 65536 // max(node_count * 2, 1)))
+        deltas = output.create_dataset("deltas", shape=(0, node_count, 2), maxshape=(None, node_count, 2),
+                                       dtype=np.int16, chunks=(row_chunk, node_count, 2),
+                                       compression=compression, shuffle=True)
+        keyframes = output.create_dataset("keyframes", shape=(0, node_count, 2), maxshape=(None, node_count, 2),
+                                          dtype=np.int32, chunks=(1024, node_count, 2), compression=compression)
+        # Rows: track, start frame, stop frame (exclusive), first delta row
+        pieces = output.create_dataset("pieces", shape=(0, 4), maxshape=(None, 4), dtype=np.int64,
+                                       chunks=(1024, 4), compression=compression)
+        bitmap_width = -(-node_count * num_tracks // 8)
+        validity = output.create_dataset("validity", shape=(frame_count, bitmap_width), dtype=np.uint8,
+                                         chunks=(min(frame_chunk, max(frame_count, 1)), max(bitmap_width, 1)),
+                                         compression=compression)
+        chunk_pieces = [0]
+        rows = 0
+        for start, block in blocks:
+            values, valid = fixed_point(np.asarray(block), scale)
+            validity[start:start + len(block)] = np.packbits(valid.reshape(len(block), -1), axis=1)
+            block_list = block_pieces(values, valid)
+            if block_list:
+                tracks, starts, stops = (np.array(column) for column in zip(*block_list))
+                lengths = stops - starts
+                frames = np.concatenate([np.arange(lo, hi) for lo, hi in zip(starts, stops)])
+                gathered = values[frames, :, :, np.repeat(tracks, lengths)]
+                delta = np.diff(gathered, axis=0, prepend=gathered[:1])
+                delta[np.cumsum(lengths) - lengths] = 0
+                _append(deltas, delta.astype(np.int16))
+                _append(keyframes, values[starts, :, :, tracks].astype(np.int32))
+                offsets = rows + np.cumsum(lengths) - lengths
+                _append(pieces, np.stack([tracks, start + starts, start + stops, offsets], axis=1))
+                rows += lengths.sum()
+            chunk_pieces.append(chunk_pieces[-1] + len(block_list))
+
+        output.create_dataset("chunk_pieces", data=np.array(chunk_pieces, dtype=np.int64))
+        output.create_dataset("track_names", data=np.array([str(n).encode() for n in (track_names or [])]))
+        output.create_dataset("node_names", data=np.array([str(n).encode() for n in (node_names or [])]))
+        return {"pieces": chunk_pieces[-1], "rows": int(rows)}
+
+
+def write_archive(locations, output_path, track_names=None, node_names=None, scale=16, frame_chunk=4096,
+                  compression="gzip"):
+    """Write a (frames, nodes, 2, tracks) locations array to an archive (see write_archive_blocks)."""
+    frame_count, node_count, _, num_tracks = locations.shape
+    blocks = ((start, locations[start:start + frame_chunk]) for start in range(0, frame_count, frame_chunk))
+    return write_archive_blocks(blocks, output_path, frame_count, node_count, num_tracks, track_names, node_names,
+                                scale, frame_chunk, compression)
+
+
+def archive_h5(input_path, output_path, scale=16, frame_chunk=4096, compression="gzip"):
+    """Convert a SLEAP .h5 file to an archive, reading it one chunk of frames at a time."""
+    with h5py.File(input_path, "r") as f:
+        num_tracks, _, node_count, frame_count = f["tracks"].shape
+        track_names = [n.decode() for n in f["track_names"][:]]
+        node_names = [n.decode() for n in f["node_names"][:]]
+    blocks = ((start, block["tracks"]) for start, block in read_frame_blocks(input_path, frame_chunk, dtype=np.float64))
+    return write_archive_blocks(blocks, output_path, frame_count, node_count, num_tracks, track_names, node_names,
+                                scale, frame_chunk, compression)
+
+
+def read_archive(path, start=0, stop=None, dtype=None):
+    """
+    Decode the frames start .. stop - 1 of an archive.
+
+    Returns:
+    - numpy.array: (frames, nodes, 2, tracks) locations with NaN for missing points, like load_h5_data.
+    """
+    dtype = dtype or analysis_dtype()
+    with h5py.File(path, "r") as f:
+        attrs = f.attrs
+        frame_chunk, scale = int(attrs["frame_chunk"]), float(attrs["scale"])
+        frame_count, node_count, num_tracks = (int(attrs[k]) for k in ("frame_count", "node_count", "num_tracks"))
+        stop = frame_count if stop is None else min(stop, frame_count)
+        start = min(max(start, 0), stop)
+        first_chunk, last_chunk = start // frame_chunk, -(-stop // frame_chunk)
+        window_start = first_chunk * frame_chunk
+        locations = np.full((min(last_chunk * frame_chunk, frame_count) - window_start, node_count, 2, num_tracks),
+                            np.nan, dtype=dtype)
+
+        chunk_pieces = f["chunk_pieces"][first_chunk:last_chunk + 1]
+        if len(chunk_pieces) and chunk_pieces[-1] > chunk_pieces[0]:
+            pieces = f["pieces"][chunk_pieces[0]:chunk_pieces[-1]]
+            keyframes = f["keyframes"][chunk_pieces[0]:chunk_pieces[-1]].astype(np.int64)
+            tracks, starts, stops, offsets = pieces.T
+            lengths = stops - starts
+            deltas = f["deltas"][offsets[0]:offsets[-1] + lengths[-1]].astype(np.int64)
+            # Running sum of the deltas, restarted at every piece from its keyframe
+            total = np.cumsum(deltas, axis=0)
+            piece_of_row = np.repeat(np.arange(len(pieces)), lengths)
+            first_row = offsets - offsets[0]
+            values = keyframes[piece_of_row] + total - total[first_row][piece_of_row]
+            frames = np.concatenate([np.arange(lo, hi) for lo, hi in zip(starts, stops)]) - window_start
+            locations[frames, :, :, np.repeat(tracks, lengths)] = values / scale
+
+        bits = f["validity"][window_start:window_start + len(locations)]
+        valid = np.unpackbits(bits, axis=1, count=node_count * num_tracks).reshape(len(locations), node_count,
+                                                                                    num_tracks).astype(bool)
+        locations[np.broadcast_to(~valid[:, :, None, :], locations.shape)] = np.nan
+    return locations[start - window_start:stop - window_start]
+
+
+def load_archive(path, dtype=None):
+    """Load a whole archive; returns the same tuple as loadh5.load_h5_data."""
+    locations = read_archive(path, dtype=dtype)
+    with h5py.File(path, "r") as f:
+        track_names = [n.decode() for n in f["track_names"][:]]
+        node_names = [n.decode() for n in f["node_names"][:]]
+    frame_count, node_count, _, instance_count = locations.shape
+    return frame_count, node_count, instance_count, locations, track_names, node_names
@@ -0,0 +1,133 @@
+"""
+Benchmarks for the analysis pipeline on synthetic recordings.
+
+Every case runs in a fresh process so that its peak RSS (and, for the import cases, the import time)
+is measured on its own.
+
+Run:
+    python benchmark.py --frames 20000 --tracks 40 --budget 500MB
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+import numpy as np
+
+
+def synthetic_locations(frame_count, num_termites, num_nodes=3, dtype=np.float64, missing_fraction=0.05, seed=0):
+    """Random-walk termites in a 1000 x 1000 px arena, with a fraction of the points missing."""
+    rng = np.random.default_rng(seed)
+    locations = np.empty((frame_count, num_nodes, 2, num_termites), dtype=dtype)
+    centre = rng.uniform(100, 900, (2, num_termites))
+    heading = rng.uniform(0, 2 * np.pi, num_termites)
+    block_size = 4096
+    for start in range(0, frame_count, block_size):
+        stop = min(start + block_size, frame_count)
+        steps = rng.normal(0, 1.5, (stop - start, 2, num_termites))
+        path = np.clip(centre + np.cumsum(steps, axis=0), 0, 1000)
+        centre = path[-1]
+        body = np.stack([np.cos(heading), np.sin(heading)]) * 10
+        for node in range(num_nodes):
+            locations[start:stop, node] = path - node * body
+        missing = rng.random((stop - start, num_nodes, 1, num_termites)) < missing_fraction
+        block = locations[start:stop]
+        block[np.broadcast_to(missing, block.shape)] = np.nan
+    return locations
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_case(case, queue):
+    name, function, kwargs = case
+    start = time.perf_counter()
+    details = function(**kwargs) or {}
+    queue.put((name, time.perf_counter() - start, peak_rss_mb(), details))
+
+
+def run_cases(cases):
+    """Run each (name, function, kwargs) case in a fresh process and collect (name, seconds, peak RSS MB, details)."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for case in cases:
+        queue = context.Queue()
+        process = context.Process(target=_run_case, args=(case, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+
+def print_results(results):
+    print(f"{'case':<32}{'seconds':>10}{'peak RSS (MB)':>16}  details")
+    for name, seconds, rss, details in results:
+        extra = ", ".join(f"{key}={value}" for key, value in details.items())
+        print(f"{name:<32}{seconds:>10.2f}{rss:>16.1f}  {extra}")
+
+
+def pipeline_case(frames, tracks, nodes, budget=None):
+    from memory import set_memory_budget, analysis_dtype
+    from fillmissing import fill_missing
+    from pipeline import run_detectors
+
+    set_memory_budget(budget)
+    locations = synthetic_locations(frames, tracks, nodes, dtype=analysis_dtype())
+    locations = fill_missing(locations)
+    results = run_detectors(locations, ["grooming", "leader_follower", "mutual_grooming", "proximity_counts"])
+    return {"events": sum(len(r) for r in results.values() if isinstance(r, list))}
+
+
+CORE_MODULES = ["loadh5", "fillmissing", "cleaning", "groom", "proximity", "interactions", "connect_broken_tracks",
+                "pipeline"]
+PLOTTING_MODULES = ["matplotlib.pyplot", "seaborn", "scipy.interpolate"]
+
+
+def import_case(modules):
+    import importlib
+    import sys
+
+    for module in modules:
+        importlib.import_module(module)
+    heavy = [name for name in ("matplotlib", "seaborn", "scipy", "tkinter") if name in sys.modules]
+    return {"modules": len(sys.modules), "heavy": "+".join(heavy) or "none"}
+
+
+def prefetch_case(frames, tracks, nodes, depth):
+    import os
+    import tempfile
+    import h5py
+    from prefetch import PrefetchStats, run_detectors_streaming
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "synthetic.h5")
+        with h5py.File(filename, "w") as f:
+            f["tracks"] = synthetic_locations(frames, tracks, nodes, missing_fraction=0).T
+        stats = PrefetchStats()
+        run_detectors_streaming(filename, ["grooming", "leader_follower", "proximity_counts"], depth=depth, stats=stats)
+    return stats.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the termite analysis pipeline on synthetic data.")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--tracks", type=int, default=40)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--budget", default="500MB", help="Memory budget for the float32 case")
+    args = parser.parse_args()
+
+    size = dict(frames=args.frames, tracks=args.tracks, nodes=args.nodes)
+    cases = [
+        ("import analysis core", import_case, dict(modules=CORE_MODULES)),
+        ("import plotting stack", import_case, dict(modules=PLOTTING_MODULES)),
+        ("pipeline float64", pipeline_case, size),
+        (f"pipeline float32 ({args.budget})", pipeline_case, dict(size, budget=args.budget)),
+        ("streaming, no prefetch", prefetch_case, dict(size, depth=0)),
+        ("streaming, prefetch depth 2", prefetch_case, dict(size, depth=2)),
+    ]
+    print_results(run_cases(cases))
+
+
+if __name__ == "__main__":
+    main()
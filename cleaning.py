@@ -1,43 +1,155 @@
+import h5py
 import numpy as np
 
-def clean_and_validate_data(dataset):
+# Pixels per frame; a termite tip does not jump further than this between two frames
+DEFAULT_MAX_SPEED = 50
+# Skeleton length relative to the track's median length
+DEFAULT_LENGTH_RANGE = (0.5, 2.0)
+
+def estimate_bounds(locations, lower_quantile=0.001, upper_quantile=0.999, margin=20, max_samples=20000):
+    """Estimate the arena bounds (x_min, x_max, y_min, y_max) from the tracked points.
+
+    The bounds are robust quantiles of a strided sample of frames, widened by margin pixels,
+    so a handful of wild points does not stretch them the way a plain min/max would.
+    """
+    step = max(1, locations.shape[0] // max_samples)
+    sample = locations[::step]
+    x, y = sample[:, :, 0, :], sample[:, :, 1, :]
+    x, y = x[~np.isnan(x)], y[~np.isnan(y)]
+    if len(x) == 0:
+        return -np.inf, np.inf, -np.inf, np.inf
+    x_min, x_max = np.quantile(x, [lower_quantile, upper_quantile])
+    y_min, y_max = np.quantile(y, [lower_quantile, upper_quantile])
+    return x_min - margin, x_max + margin, y_min - margin, y_max + margin
+
+def get_arena_bounds(filename, lower_quantile=0.001, upper_quantile=0.999, margin=20, max_samples=20000):
+    """Estimate the arena bounds of a .h5 file without loading the whole tracks dataset."""
+    with h5py.File(filename, "r") as f:
+        tracks = f["tracks"]
+        step = max(1, tracks.shape[-1] // max_samples)
+        sample = tracks[:, :, :, ::step].T
+    return estimate_bounds(sample, lower_quantile, upper_quantile, margin, max_samples)
+
+def skeleton_lengths(block, edges):
+    """Sum of the edge lengths of every skeleton, shape (frames, tracks)."""
+    lengths = [np.sqrt(((block[:, b] - block[:, a]) ** 2).sum(axis=1)) for a, b in edges]
+    return np.sum(lengths, axis=0)
+
+def step_lengths(window):
+    """Distance moved by every node into and out of each inner frame of a window with one halo frame on each side."""
+    steps = np.sqrt((np.diff(window, axis=0) ** 2).sum(axis=2))
+    return steps[:-1], steps[1:]
+
+def clean_tracks(locations, bounds=None, max_speed=DEFAULT_MAX_SPEED, length_range=DEFAULT_LENGTH_RANGE,
+                 edges=None, block_size=4096, inplace=False):
+    """
+    Remove implausible points from the termite dataset in a chunked, vectorized pass.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, termites).
+    - bounds (tuple): Arena bounds (x_min, x_max, y_min, y_max); estimated from the data if None.
+      Use get_arena_bounds(filename) to take them from the file.
+    - max_speed (float): Largest plausible movement of a node between two frames in pixels; None disables the check.
+    - length_range (tuple): Plausible skeleton length as (min, max) ratio of the track's median length; None disables it.
+    - edges (list): Skeleton edges as (node, node) pairs; defaults to a chain through the nodes in order.
+    - block_size (int): Number of frames processed together.
+    - inplace (bool): Clean locations itself instead of a copy.
+
+    Returns:
+    - tuple: (cleaned locations, report). The report holds the boolean masks "out_of_bounds" and
+      "velocity_outliers" (frames, nodes, termites), "bad_skeleton" (frames, termites), "counts" of each,
+      the "bounds" that were applied and "bounds_source" ("given" or "estimated").
+    """
+    cleaned = locations if inplace else locations.copy()
+    frame_count, node_count, _, num_termites = cleaned.shape
+    bounds_source = "given" if bounds is not None else "estimated"
+    if bounds is None:
+        bounds = estimate_bounds(cleaned)
+    x_min, x_max, y_min, y_max = bounds
+    if edges is None:
+        edges = [(node, node + 1) for node in range(node_count - 1)]
+
+    out_of_bounds = np.zeros((frame_count, node_count, num_termites), dtype=bool)
+    velocity = np.zeros((frame_count, node_count, num_termites), dtype=bool)
+    bad_skeleton = np.zeros((frame_count, num_termites), dtype=bool)
+    lengths = np.empty((frame_count, num_termites))
+
+    # 1. Points outside the arena, and skeleton lengths of what is left
+    for start in range(0, frame_count, block_size):
+        block = cleaned[start:start + block_size]
+        x, y = block[:, :, 0, :], block[:, :, 1, :]
+        outside = (x < x_min) | (x > x_max) | (y < y_min) | (y > y_max)
+        out_of_bounds[start:start + block_size] = outside
+        block[np.broadcast_to(outside[:, :, None, :], block.shape)] = np.nan
+        if edges:
+            lengths[start:start + block_size] = skeleton_lengths(block, edges)
+
+    # 2. Frames with an implausible skeleton length for the track
+    if length_range is not None and edges:
+        valid = ~np.isnan(lengths)
+        median = np.array([np.median(lengths[valid[:, t], t]) if valid[:, t].any() else np.nan
+                           for t in range(num_termites)])
+        with np.errstate(invalid="ignore"):
+            bad_skeleton = (lengths < length_range[0] * median) | (lengths > length_range[1] * median)
+
+    # 3. Isolated velocity jumps, judged on the data cleaned by steps 1 and 2. A point is an outlier when it
+    #    is further than max_speed from both neighbours (or from the only one that exists), so the good
+    #    frame right after a single bad point is not flagged as well.
+    if max_speed is not None:
+        for start in range(0, frame_count, block_size):
+            stop = min(start + block_size, frame_count)
+            lo, hi = max(start - 1, 0), min(stop + 1, frame_count)
+            window = cleaned[lo:hi].copy()
+            window[np.broadcast_to(bad_skeleton[lo:hi, None, None, :], window.shape)] = np.nan
+            if start == 0:
+                window = np.concatenate([np.full_like(window[:1], np.nan), window])
+            if stop == frame_count:
+                window = np.concatenate([window, np.full_like(window[:1], np.nan)])
+            before, after = step_lengths(window)
+            with np.errstate(invalid="ignore"):
+                jump_before, jump_after = before > max_speed, after > max_speed
+            velocity[start:stop] = ((jump_before | np.isnan(before)) & (jump_after | np.isnan(after)) &
+                                    (jump_before | jump_after))
+
+    # 4. Remove the flagged points
+    for start in range(0, frame_count, block_size):
+        block = cleaned[start:start + block_size]
+        remove = velocity[start:start + block_size] | bad_skeleton[start:start + block_size, None, :]
+        block[np.broadcast_to(remove[:, :, None, :], block.shape)] = np.nan
+
+    report = {
+        "out_of_bounds": out_of_bounds,
+        "velocity_outliers": velocity,
+        "bad_skeleton": bad_skeleton,
+        "bounds": tuple(float(b) for b in bounds),
+        "bounds_source": bounds_source,
+        "counts": {
+            "out_of_bounds": int(out_of_bounds.sum()),
+            "velocity_outliers": int(velocity.sum()),
+            "bad_skeleton": int(bad_skeleton.sum()),
+            "missing": int(np.isnan(cleaned[:, :, 0, :]).sum()),
+        },
+    }
+    return cleaned, report
+
+def clean_and_validate_data(dataset, bounds=None, max_speed=DEFAULT_MAX_SPEED, length_range=DEFAULT_LENGTH_RANGE):
     """
     Cleans and validates the termite dataset.
 
     Parameters:
     - dataset (numpy.array): The multi-dimensional array containing the termite data with X and Y coordinates.
+    - bounds, max_speed, length_range: See clean_tracks.
 
     Returns:
-    - numpy.array: Cleaned and validated dataset.
+    - numpy.array: Cleaned dataset, with implausible points set to NaN.
     """
+    cleaned, report = clean_tracks(dataset, bounds=bounds, max_speed=max_speed, length_range=length_range)
+    print_report(report)
+    return cleaned
 
-    # 1. Ensure there are no missing values
-    if np.isnan(dataset).any():
-        print("Warning: Missing values detected!")
-        # Display the count of missing values
-        missing_values_count = np.isnan(dataset).sum()
-        print(f"There are {missing_values_count} missing values.")
-        # Implement your strategy to handle the NaNs here.
-
-    # 2. Validate the scale and range of the X and Y coordinates
-    X_MIN, X_MAX = 0, 1000
-    Y_MIN, Y_MAX = 0, 1000
-
-    invalid_x_coords = (dataset[:, 0, :, :] < X_MIN) | (dataset[:, 0, :, :] > X_MAX)
-    invalid_y_coords = (dataset[:, 1, :, :] < Y_MIN) | (dataset[:, 1, :, :] > Y_MAX)
-    
-    if invalid_x_coords.any():
-        print("Warning: Some X coordinates are out of the expected range!")
-        # Display the count of invalid X coordinates
-        invalid_x_count = invalid_x_coords.sum()
-        print(f"There are {invalid_x_count} invalid X coordinates.")
-        
-    if invalid_y_coords.any():
-        print("Warning: Some Y coordinates are out of the expected range!")
-        # Display the count of invalid Y coordinates
-        invalid_y_count = invalid_y_coords.sum()
-        print(f"There are {invalid_y_count} invalid Y coordinates.")
-    
-    # Implement your strategy to handle the invalid coordinates here.
-
-    return dataset
+def print_report(report):
+    """Print how many points clean_tracks removed and which arena bounds it applied."""
+    counts = report["counts"]
+    print("Arena bounds ({}): x {:.1f}..{:.1f}, y {:.1f}..{:.1f}".format(report["bounds_source"], *report["bounds"]))
+    print(f"Removed {counts['out_of_bounds']} points outside the arena, {counts['velocity_outliers']} velocity outliers "
+          f"and {counts['bad_skeleton']} implausible skeletons; {counts['missing']} points are missing.")
@@ -0,0 +1,135 @@
+"""
+Coarse-to-fine detection. Pairwise detectors only fire while two termites are close (see the reach()
+method of the pipeline detectors), and no node moves more than max_speed per frame, so pair distances
+change by at most 2 * max_speed per frame. The coarse stage therefore evaluates only every step-th frame
+with the distance thresholds relaxed by 2 * max_speed * (step // 2): every frame within step // 2 of a
+sample that fails the relaxed test cannot be part of an event. The refinement then runs the detectors
+at full frame rate block by block, computing features only for the pairs that are candidates somewhere
+in the block and skipping blocks without candidates.
+
+The events are identical to a full-resolution run as long as max_speed holds, which it does when it is
+measured on the same locations, the default: movement across a gap of missing points is spread over the
+gap (see max_node_speed), and a missing point at a sample makes the sample a candidate. When interactions are sparse the refinement covers a small part of the frames x pairs.
+
+Example:
+    results = run_detectors_coarse(filled_locations, ["grooming", "proximity", "leader_follower"], step=8)
+"""
+import numpy as np
+from memory import analysis_dtype
+from pipeline import FrameBlock, detector_block_size, start_detectors
+
+
+def max_node_speed(locations, block_size=4096):
+    """Largest per-frame movement of any node of any termite.
+
+    Across a gap of missing points the displacement between the two frames around the gap is divided by
+    the gap length, so the bound holds between any two frames in which a node is present.
+    """
+    fastest = 0.0
+    # Position and frame of every (node, track) when it was last present, carried across blocks
+    last_point = np.full(locations.shape[1:], np.nan)
+    last_frame = np.full(locations.shape[1:2] + locations.shape[3:], -1, dtype=np.int64)
+    for start in range(0, locations.shape[0], block_size):
+        block = np.asarray(locations[start:start + block_size], dtype=np.float64)
+        present = ~np.isnan(block).any(axis=2)
+        rows = np.arange(len(block))[:, None, None]
+        seen = np.maximum.accumulate(np.where(present, rows, -1), axis=0)
+        previous = np.concatenate([np.full((1,) + seen.shape[1:], -1), seen[:-1]])
+        previous_frame = np.where(previous >= 0, start + previous, last_frame)
+        previous_point = np.where((previous >= 0)[:, :, None, :],
+                                  np.take_along_axis(block, np.maximum(previous, 0)[:, :, None, :], axis=0),
+                                  last_point)
+        measured = present & (previous_frame >= 0)
+        if measured.any():
+            distance = np.sqrt(((block - previous_point) ** 2).sum(axis=2))
+            fastest = max(fastest, float((distance / np.maximum(start + rows - previous_frame, 1))[measured].max()))
+        ended = seen[-1] >= 0
+        last_frame = np.where(ended, start + seen[-1], last_frame)
+        last_point = np.where(ended[:, None, :],
+                              np.take_along_axis(block, np.maximum(seen[-1:], 0)[:, :, None, :], axis=0)[0], last_point)
+    return fastest
+
+
+def sample_frames(frame_count, step):
+    """Frames evaluated by the coarse stage: every step-th frame and the last one."""
+    samples = np.arange(0, frame_count, step)
+    return samples if samples[-1] == frame_count - 1 else np.append(samples, frame_count - 1)
+
+
+def candidate_samples(locations, detectors, step, max_speed, active, passive, chunk_size=4096):
+    """
+    Coarse stage: (samples, pairs) mask of the sample frames near which a pair may be in an event.
+
+    A sample is a candidate for a pair if, for any detector, one of its reach distances is within the
+    detector's distance plus 2 * max_speed * (step // 2), or is missing (NaN).
+    """
+    samples = sample_frames(locations.shape[0], step)
+    slack = 2 * max_speed * (step // 2)
+    bounds = []
+    for detector in detectors:
+        bound = detector.reach() if hasattr(detector, "reach") else None
+        if bound is None:
+            raise ValueError(f"Detector {detector.label} has no distance bound; run it with run_detectors")
+        bounds.append(bound)
+
+    candidates = np.zeros((len(samples), len(active)), dtype=bool)
+    for start in range(0, len(samples), chunk_size):
+        rows = samples[start:start + chunk_size]
+        block = FrameBlock(locations[rows], rows[0], active, passive)
+        for keys, distance in bounds:
+            for key in keys:
+                near = block[key] <= distance + slack
+                candidates[start:start + len(rows)] |= near | np.isnan(block[key])
+    return samples, candidates
+
+
+def block_pairs(samples, candidates, start, stop, reach_frames):
+    """Pairs with a candidate sample within reach_frames of the frames start .. stop - 1."""
+    lo = np.searchsorted(samples, start - reach_frames)
+    hi = np.searchsorted(samples, stop + reach_frames)
+    return np.flatnonzero(candidates[lo:hi].any(axis=0))
+
+
+def run_detectors_coarse(locations, detectors, step=8, max_speed=None, block_size=None, stats=None):
+    """
+    Run pairwise pipeline detectors in two stages, with the same result as run_detectors.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, termites).
+    - detectors (list): Detector names or detectors created with make_detector; all need reach().
+    - step (int): Frame step of the coarse stage.
+    - max_speed (float): Bound on the per-frame movement of any node; measured with max_node_speed by default.
+    - block_size (int): Frames per refinement block; by default derived from the memory budget.
+    - stats (dict): Optional; receives "refined_fraction", the fraction of frames x pairs evaluated at full rate.
+
+    Returns:
+    - dict: The result of each detector, keyed by its label.
+    """
+    frame_count, num_nodes, _, num_termites = locations.shape
+    detectors, active, passive, requires = start_detectors(detectors, num_termites)
+    if max_speed is None:
+        max_speed = max_node_speed(locations)
+    samples, candidates = candidate_samples(locations, detectors, step, max_speed, active, passive)
+    if block_size is None:
+        block_size = detector_block_size(requires, num_nodes, num_termites, len(active))
+    # A frame can only be in an event if a candidate sample lies within step // 2 of it; with gap tolerance,
+    # frames up to max_gap_frames further away decide whether two runs are merged
+    reach_frames = step // 2 + max(getattr(detector, "max_gap_frames", 0) for detector in detectors)
+
+    dtype = analysis_dtype()
+    refined = 0
+    for start in range(0, frame_count, block_size):
+        stop = min(start + block_size, frame_count)
+        pairs = block_pairs(samples, candidates, start, stop, reach_frames)
+        if not len(pairs):
+            continue
+        refined += (stop - start) * len(pairs)
+        previous = locations[start - 1].astype(dtype) if start else None
+        block = FrameBlock(locations[start:stop].astype(dtype, copy=False), start, active[pairs], passive[pairs],
+                           previous, pairs=pairs)
+        block.prepare(requires)
+        for detector in detectors:
+            detector.process(block)
+    if stats is not None:
+        stats["refined_fraction"] = refined / max(frame_count * len(active), 1)
+    return {detector.label: detector.finish() for detector in detectors}
@@ -0,0 +1,231 @@
+"""
+Continuous (sub-frame) contact detection. Between two frames every node is assumed to move in a
+straight line, so every point of a body segment (mandible-thorax, thorax-abdomen, ...) does too. For two
+such points the squared distance is a quadratic in time, which gives in closed form both the closest
+approach within the interval and the first time the distance drops below contact_distance. Contacts
+that happen between frames, e.g. two fast termites passing through each other, are found even when the
+distance at both frames is above the threshold.
+
+At the frames themselves the exact segment-to-segment distance is used, so crossing bodies are always
+found. Between frames segments are represented by points_per_segment evenly spaced points, so a contact
+that exists only between frames is found up to half the point spacing. A swept bounding-box test per
+termite and interval discards the pairs that cannot touch before any distance is computed, which keeps
+the cost close to a per-frame check. Missing nodes are skipped; the rest of the body is still checked.
+
+Example:
+    contacts = detect_collisions(filled_locations, contact_distance=5)
+    for active, passive, time, x, y, distance, between_frames in contacts:
+        ...
+    events = collision_events(contacts)
+"""
+import numpy as np
+from contacts import all_pairs
+
+
+def segment_ends(first, second):
+    """Segment ends with a missing end replaced by the other one, so the segment reduces to its present node."""
+    return np.where(np.isnan(first), second, first), np.where(np.isnan(second), first, second)
+
+
+def body_segments(node_count, segments=None):
+    """(node, node) pairs forming the body; by default consecutive nodes (0-1, 1-2, ...)."""
+    if segments is None:
+        segments = [(node, node + 1) for node in range(node_count - 1)] or [(0, 0)]
+    return segments
+
+
+def segment_points(locations, segments=None, points_per_segment=3):
+    """
+    Evenly spaced points along the body segments of every termite.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, termites).
+    - segments (list): (node, node) pairs forming the body; by default consecutive nodes (0-1, 1-2, ...).
+    - points_per_segment (int): Points per segment including both ends.
+
+    Returns:
+    - numpy.array: (frames, points, coordinates, termites). A segment with one missing end collapses
+      onto its present end.
+    """
+    segments = body_segments(locations.shape[1], segments)
+    weights = np.linspace(0.0, 1.0, points_per_segment)[:, None, None]
+    pieces = []
+    for a, b in segments:
+        first, second = segment_ends(locations[:, a, None], locations[:, b, None])
+        pieces.append((1 - weights) * first + weights * second)
+    return np.concatenate(pieces, axis=1)
+
+
+def swept_boxes(points):
+    """(intervals, 2, termites) lower and upper corners of the area every termite sweeps between consecutive frames.
+
+    Missing points are skipped; a termite missing at both frames gets an empty box (low = inf, high = -inf).
+    """
+    missing = np.isnan(points)
+    low = np.where(missing, np.inf, points).min(axis=1)
+    high = np.where(missing, -np.inf, points).max(axis=1)
+    return np.minimum(low[:-1], low[1:]), np.maximum(high[:-1], high[1:])
+
+
+def segment_distance(p0, p1, q0, q1):
+    """
+    Exact distance between the segments p0-p1 and q0-q1, vectorized over the leading axes.
+
+    Returns:
+    - tuple: (distance, midpoint of the two closest points); NaN where a segment end is missing.
+    """
+    ends = []
+    for point, a, b in ((p0, q0, q1), (p1, q0, q1), (q0, p0, p1), (q1, p0, p1)):
+        direction = b - a
+        length = (direction ** 2).sum(axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(length > 0, np.clip(((point - a) * direction).sum(axis=-1) / length, 0.0, 1.0), 0.0)
+        nearest = a + t[..., None] * direction
+        ends.append((np.sqrt(((point - nearest) ** 2).sum(axis=-1)), (point + nearest) / 2))
+    distances = np.stack([distance for distance, _ in ends])
+    midpoints = np.stack([midpoint for _, midpoint in ends])
+    best = np.where(np.isnan(distances), np.inf, distances).argmin(axis=0)
+    distance = np.take_along_axis(distances, best[None], axis=0)[0]
+    midpoint = np.take_along_axis(midpoints, best[None, ..., None], axis=0)[0]
+
+    # Segments that cross are at distance 0, at the crossing point
+    r, s, offset = p1 - p0, q1 - q0, q0 - p0
+    cross = r[..., 0] * s[..., 1] - r[..., 1] * s[..., 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (offset[..., 0] * s[..., 1] - offset[..., 1] * s[..., 0]) / cross
+        u = (offset[..., 0] * r[..., 1] - offset[..., 1] * r[..., 0]) / cross
+        crossing = (cross != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    distance = np.where(crossing, 0.0, distance)
+    midpoint = np.where(crossing[..., None], p0 + t[..., None] * r, midpoint)
+    return distance, midpoint
+
+
+def body_distance(active_nodes, passive_nodes, segments):
+    """Exact closest distance between two bodies, from (..., nodes, 2) node positions, and the midpoint there.
+
+    A segment with one missing end reduces to its present node (see segment_ends); the distance is inf
+    if no segment pair can be measured.
+    """
+    first, second = zip(*segments)
+    first, second = list(first), list(second)
+    p0, p1 = segment_ends(active_nodes[..., first, None, :], active_nodes[..., second, None, :])
+    q0, q1 = segment_ends(passive_nodes[..., None, first, :], passive_nodes[..., None, second, :])
+    distance, midpoint = segment_distance(p0, p1, q0, q1)
+    distance = np.where(np.isnan(distance), np.inf, distance).reshape(distance.shape[:-2] + (-1,))
+    best = distance.argmin(axis=-1)
+    midpoint = midpoint.reshape(midpoint.shape[:-3] + (-1, 2))
+    return (np.take_along_axis(distance, best[..., None], axis=-1)[..., 0],
+            np.take_along_axis(midpoint, best[..., None, None], axis=-2)[..., 0, :])
+
+
+def closest_approach(start, end, contact_distance):
+    """
+    Closed-form closest approach of linearly moving relative positions over an interval [0, 1].
+
+    Parameters:
+    - start, end (numpy.array): (..., 2) relative position (second point minus first) at both frames.
+    - contact_distance (float): Contact threshold.
+
+    Returns:
+    - tuple: (time of the closest approach, closest distance, first time the distance is at most
+      contact_distance or NaN if it never is), each with the leading shape of start.
+    """
+    motion = end - start
+    a = (motion ** 2).sum(axis=-1)
+    b = (start * motion).sum(axis=-1)
+    c = (start ** 2).sum(axis=-1) - contact_distance ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        closest = np.where(a > 0, np.clip(-b / a, 0.0, 1.0), 0.0)
+        distance = np.sqrt(((start + closest[..., None] * motion) ** 2).sum(axis=-1))
+        # Smaller root of a t^2 + 2 b t + c = 0; it lies in [0, closest] whenever the points touch
+        entry = (-b - np.sqrt(np.maximum(b * b - a * c, 0.0))) / a
+    entry = np.where(c <= 0, 0.0, entry)
+    return closest, distance, np.where(distance <= contact_distance, entry, np.nan)
+
+
+def detect_collisions(locations, contact_distance=5, segments=None, points_per_segment=3, block_size=4096):
+    """
+    Find the inter-frame intervals in which two termites touch, with sub-frame contact time and location.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, termites).
+    - contact_distance (float): Distance between body points that counts as contact.
+    - segments, points_per_segment: Body model, see segment_points. points_per_segment only affects
+      contacts that exist between frames but at neither frame.
+    - block_size (int): Frames processed together.
+
+    Returns:
+    - list: (active, passive, contact_time, x, y, closest_distance, between_frames) tuples for every unordered
+      pair and interval with contact, sorted by pair and time. contact_time is the frame number plus the
+      fraction of the interval at which contact starts, (x, y) the midpoint of the touching points then, and
+      between_frames is True if the bodies are apart at both frames, i.e. a per-frame check misses it.
+    """
+    frame_count, node_count, _, num_termites = locations.shape
+    segments = body_segments(node_count, segments)
+    active, passive = all_pairs(num_termites)
+    active, passive = active[active < passive], passive[active < passive]
+    found = []
+    for start in range(0, frame_count - 1, block_size):
+        # One extra frame closes the last interval of the block
+        block = locations[start:start + block_size + 1]
+        points = segment_points(block, segments, points_per_segment)
+        low, high = swept_boxes(points)
+        with np.errstate(invalid="ignore"):
+            overlap = ((low[:, :, active] - contact_distance <= high[:, :, passive]) &
+                       (low[:, :, passive] - contact_distance <= high[:, :, active])).all(axis=1)
+        intervals, pairs = np.nonzero(overlap)
+        if not len(intervals):
+            continue
+
+        # Exact body distance at both frames of every candidate interval
+        at_start, where_start = body_distance(block[intervals, :, :, active[pairs]], block[intervals, :, :, passive[pairs]],
+                                              segments)
+        at_end, _ = body_distance(block[intervals + 1, :, :, active[pairs]], block[intervals + 1, :, :, passive[pairs]],
+                                  segments)
+
+        # (candidates, points, 2) body points at both frames, then the relative position of every
+        # (active point, passive point) combination, (candidates, points, points, 2)
+        first_a, first_p = points[intervals, :, :, active[pairs]], points[intervals, :, :, passive[pairs]]
+        second_a, second_p = points[intervals + 1, :, :, active[pairs]], points[intervals + 1, :, :, passive[pairs]]
+        relative_start = first_p[:, None] - first_a[:, :, None]
+        relative_end = second_p[:, None] - second_a[:, :, None]
+        _, distance, entry = closest_approach(relative_start, relative_end, contact_distance)
+
+        flat_entry = np.where(np.isnan(entry), np.inf, entry).reshape(len(pairs), -1)
+        at_frame = at_start <= contact_distance
+        touching = at_frame | np.isfinite(flat_entry).any(axis=1)
+        if not touching.any():
+            continue
+        best = flat_entry.argmin(axis=1)
+        active_point, passive_point = np.unravel_index(best, entry.shape[1:])
+        rows = np.arange(len(pairs))
+        time = np.where(at_frame, 0.0, flat_entry[rows, best])
+        finite_time = np.where(touching, time, 0.0)[:, None]
+        where_a = first_a[rows, active_point] + finite_time * (second_a[rows, active_point] - first_a[rows, active_point])
+        where_p = first_p[rows, passive_point] + finite_time * (second_p[rows, passive_point] - first_p[rows, passive_point])
+        location = np.where(at_frame[:, None], where_start, (where_a + where_p) / 2)
+        sampled = np.where(np.isnan(distance), np.inf, distance).reshape(len(pairs), -1).min(axis=1)
+        closest = np.minimum(sampled, np.minimum(at_start, at_end))
+        between_frames = (at_start > contact_distance) & (at_end > contact_distance)
+
+        for row in np.flatnonzero(touching):
+            found.append((int(active[pairs[row]]), int(passive[pairs[row]]), float(start + intervals[row] + time[row]),
+                          float(location[row, 0]), float(location[row, 1]), float(closest[row]),
+                          bool(between_frames[row])))
+    found.sort(key=lambda contact: contact[:3])
+    return found
+
+
+def collision_events(contacts, min_duration_frames=1):
+    """Join contacts of a pair in consecutive intervals into (active, passive, start_frame, end_frame) events.
+
+    An interval from frame f to f + 1 covers frame f; min_duration_frames counts intervals.
+    """
+    events = []
+    for active, passive, time, *_ in contacts:
+        frame = int(np.floor(time))
+        if events and events[-1][:2] == (active, passive) and events[-1][3] + 1 >= frame:
+            events[-1] = (active, passive, events[-1][2], max(events[-1][3], frame))
+        else:
+            events.append((active, passive, frame, frame))
+    return [event for event in events if event[3] - event[2] + 1 >= min_duration_frames]
@@ -1,11 +1,6 @@
 import h5py
 import numpy as np
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
-from fillmissing import fill_missing
-from cleaning import clean_and_validate_data
-from loadh5 import load_h5_data
 
 
 def calculate_distance(point1, point2):
@@ -109,4 +104,130 @@ def create_new_tracks(connections, track_chains):
     for track1_name, start1, end1, track2_name, start2, end2 in connections:
         new_track_name = generate_connected_track_name(track_chains[track1_name])
         new_tracks[new_track_name] = (start1, end2)
-    return new_tracks
\ No newline at end of file
+    return new_tracks
+
+def split_connected_track_name(name, track_names):
+    """Split a name made by generate_connected_track_name (e.g. "track_3_track_17") into the original track names."""
+    known = set(track_names)
+    if name in known:
+        return [name]
+    parts, current = [], []
+    for token in name.split("_"):
+        current.append(token)
+        if "_".join(current) in known:
+            parts.append("_".join(current))
+            current = []
+    if current or not parts:
+        raise ValueError(f"Cannot split {name!r} into known track names")
+    return parts
+
+def chain_source_map(occupied, track_names, chains):
+    """
+    Which original track slot supplies each frame of each stitched track.
+
+    Parameters:
+    - occupied (numpy.array): (frames, tracks) boolean occupancy of the original tracks.
+    - track_names (list): Names of the original tracks.
+    - chains (list): Chains of track names in time order; members may be connected names like "track_3_track_17".
+      Tracks not in any chain are kept as they are.
+
+    Returns:
+    - tuple: ((frames, new tracks) source slot per frame, -1 where the new track has no data; new track names)
+    """
+    chains = [[part for member in chain for part in split_connected_track_name(member, track_names)] for chain in chains]
+    chained = {name for chain in chains for name in chain}
+    chain_of_first = {chain[0]: chain for chain in chains}
+    # New tracks keep the order of their first original track; chained tracks do not appear on their own
+    new_chains = [chain_of_first.get(name, [name]) for name in track_names if name in chain_of_first or name not in chained]
+
+    frame_count = occupied.shape[0]
+    source = np.full((frame_count, len(new_chains)), -1, dtype=np.int64)
+    frames = np.arange(frame_count)
+    for slot, chain in enumerate(new_chains):
+        for name in chain:
+            track_idx = track_names.index(name)
+            present = np.flatnonzero(occupied[:, track_idx])
+            if not len(present):
+                continue
+            # A later track in the chain takes over from its first frame, also where it overlaps the previous one
+            span = (frames >= present[0]) & (frames <= present[-1])
+            source[span, slot] = track_idx
+    return source, [generate_connected_track_name(chain) for chain in new_chains]
+
+def gather_tracks(data, source, track_axis=-1):
+    """Take data[frame, ..., source[frame, new_track]] for every frame and new track in one gather; NaN where source is -1.
+
+    data has frames on axis 0 and tracks on track_axis; the result has the new tracks on the same axis.
+    """
+    data = np.moveaxis(data, track_axis, 1)
+    gathered = data[np.arange(len(data))[:, None], np.maximum(source, 0)]
+    gathered = np.where(np.expand_dims(source >= 0, tuple(range(2, gathered.ndim))), gathered, np.nan)
+    return np.moveaxis(gathered, 1, track_axis)
+
+def merge_track_chains(locations, track_names, chains, occupied=None):
+    """Merge each chain of broken tracks into one track slot.
+
+    Pass occupied (frames, tracks), e.g. from the unfilled locations, when locations has been filled:
+    fill_missing extends every track over the whole recording.
+
+    Returns:
+    - tuple: (locations with shape (frames, nodes, 2, new tracks), new track names)
+    """
+    if occupied is None:
+        occupied = ~np.isnan(locations).all(axis=(1, 2))
+    source, new_names = chain_source_map(occupied, track_names, chains)
+    return gather_tracks(locations, source), new_names
+
+def export_stitched_tracks(input_path, output_path, chains, block_size=4096, compression="gzip"):
+    """
+    Write a copy of a SLEAP analysis file in which each chain of broken tracks is one track.
+
+    tracks, track_names, track_occupancy and the per-track score datasets are rebuilt frame block by frame
+    block; every other dataset is copied unchanged, so the result loads with load_h5_data and the detectors.
+
+    Parameters:
+    - input_path (str): The original .h5 file.
+    - output_path (str): The new .h5 file.
+    - chains (list): Chains of track names, e.g. the values of the track_chains returned by connect_broken_tracks.
+    - block_size (int): Frames gathered and written at a time; also the chunk length along the frame axis.
+    - compression (str): h5py compression filter for the rebuilt datasets.
+
+    Returns:
+    - list: The new track names.
+    """
+    with h5py.File(input_path, "r") as source_file, h5py.File(output_path, "w") as output:
+        track_names = [n.decode() for n in source_file["track_names"][:]]
+        tracks = source_file["tracks"]
+        num_tracks, _, node_count, frame_count = tracks.shape
+        occupancy = source_file["track_occupancy"][:].astype(bool) if "track_occupancy" in source_file else None
+        if occupancy is None:
+            occupancy = np.zeros((frame_count, num_tracks), dtype=bool)
+            for start in range(0, frame_count, block_size):
+                occupancy[start:start + block_size] = ~np.isnan(tracks[..., start:start + block_size]).all(axis=(1, 2)).T
+        source, new_names = chain_source_map(occupancy, track_names, chains)
+        num_new = len(new_names)
+        chunk_frames = min(block_size, frame_count)
+
+        # Per-track datasets, stored like SLEAP with tracks first and frames last
+        per_track = [name for name in ("tracks", "point_scores", "instance_scores", "tracking_scores")
+                     if name in source_file and source_file[name].shape[0] == num_tracks]
+        for name in per_track:
+            shape = (num_new,) + source_file[name].shape[1:]
+            output.create_dataset(name, shape=shape, dtype=source_file[name].dtype,
+                                  chunks=(1,) + shape[1:-1] + (chunk_frames,),
+                                  compression=compression, fillvalue=np.nan)
+        for start in range(0, frame_count, block_size):
+            stop = min(start + block_size, frame_count)
+            for name in per_track:
+                block = source_file[name][..., start:stop].T
+                output[name][..., start:stop] = gather_tracks(block, source[start:stop]).T
+
+        output.create_dataset("track_occupancy", data=(source >= 0).astype(np.uint8),
+                              chunks=(chunk_frames, max(num_new, 1)), compression=compression)
+        output.create_dataset("track_names", data=np.array([n.encode() for n in new_names]))
+        for name in source_file:
+            if name not in output:
+                source_file.copy(source_file[name], output, name)
+        for key, value in source_file.attrs.items():
+            output.attrs[key] = value
+    return new_names
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+Time-windowed contact networks. The contacts of each time window form a sparse adjacency matrix;
+all windows are kept together as one block-diagonal scipy.sparse matrix, so per-window metrics
+(degree, strength, clustering, eigenvector centrality) are computed for every window at once and
+no dense termites x termites matrix is ever allocated.
+
+Example:
+    events = run_detectors(filled_locations, ["grooming"])["grooming"]
+    networks = ContactNetworks.from_events(events, instance_count, window_size=1800, frame_count=frame_count)
+    degree = networks.degree()          # (windows, termites)
+    save_contact_networks(networks, "7_3_dev_networks.npz")
+"""
+import numpy as np
+from scipy import sparse
+
+
+def event_arrays(events):
+    """Split an event list into (active, passive, start_frame, end_frame) arrays.
+
+    Works for (a, p, start, end), (a, p, node, start, end) and (rule, a, p, start, end) tuples.
+    """
+    if not events:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty.copy(), empty.copy(), empty.copy()
+    first = 1 if isinstance(events[0][0], str) else 0
+    columns = np.array([(e[first], e[first + 1], e[-2], e[-1]) for e in events], dtype=np.int64)
+    return columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3]
+
+
+def window_edges_from_events(events, window_size):
+    """Spread every event over the time windows it overlaps.
+
+    Returns:
+    - tuple: (window, active, passive, frames) arrays; frames is the number of event frames inside the window.
+    """
+    active, passive, starts, ends = event_arrays(events)
+    first_window, last_window = starts // window_size, ends // window_size
+    repeats = last_window - first_window + 1
+
+    event_index = np.repeat(np.arange(len(starts)), repeats)
+    # Position of each repeated row within its event: 0, 1, ... repeats - 1
+    step = np.arange(len(event_index)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    window = first_window[event_index] + step
+    frames = (np.minimum(ends[event_index], (window + 1) * window_size - 1) -
+              np.maximum(starts[event_index], window * window_size) + 1)
+    return window, active[event_index], passive[event_index], frames
+
+
+def window_edges_from_mask(mask, active, passive, window_size, frame_offset=0):
+    """Count the frames per window in which each pair's mask is True.
+
+    Parameters:
+    - mask (numpy.array): (frames, pairs) boolean mask, e.g. thorax distance below a proximity threshold.
+    - active, passive (numpy.array): Termite indices of the mask columns.
+    - window_size (int): Frames per window.
+    - frame_offset (int): Frame number of the first mask row, so frame blocks can be fed one at a time.
+
+    Returns:
+    - tuple: (window, active, passive, frames) arrays of the non-zero counts.
+    """
+    frames_in_block = mask.shape[0]
+    boundaries = np.arange(-(frame_offset % window_size), frames_in_block, window_size)
+    boundaries[0] = 0
+    counts = np.add.reduceat(mask.astype(np.int64), boundaries, axis=0)
+    rows, pairs = np.nonzero(counts)
+    window = frame_offset // window_size + rows
+    return window, np.asarray(active)[pairs], np.asarray(passive)[pairs], counts[rows, pairs]
+
+
+class ContactNetworks:
+    """Sequence of per-window contact networks stored as one block-diagonal sparse matrix.
+
+    Window w occupies rows and columns w * num_termites .. (w + 1) * num_termites - 1 of matrix,
+    and entry (i, j) of a window is the number of contact frames between termites i and j in it.
+    """
+
+    def __init__(self, matrix, num_windows, num_termites, window_size, directed=False):
+        self.matrix = matrix.tocsr()
+        self.num_windows = num_windows
+        self.num_termites = num_termites
+        self.window_size = window_size
+        self.directed = directed
+
+    @classmethod
+    def from_edges(cls, edges, num_termites, window_size, num_windows=None, directed=False, unordered=False):
+        """Build from (window, active, passive, frames) edge arrays; several lists of edges may be concatenated.
+
+        (i, j) and (j, i) edges are different contacts, e.g. i grooming j and j grooming i, and undirected
+        networks add them up. Detectors marked unordered (mutual_grooming, approach_retreat) report each pair
+        once. For symmetric contacts listed in both orders, e.g. a thorax proximity mask over all_pairs,
+        pass unordered=True to keep only the active < passive edges.
+        """
+        window, active, passive, frames = (np.asarray(a) for a in edges)
+        if num_windows is None:
+            num_windows = int(window.max()) + 1 if len(window) else 0
+        keep = active < passive if unordered else active != passive
+        window, active, passive, frames = window[keep], active[keep], passive[keep], frames[keep]
+
+        size = num_windows * num_termites
+        base = window * num_termites
+        matrix = sparse.coo_matrix((frames.astype(np.float64), (base + active, base + passive)), shape=(size, size)).tocsr()
+        if not directed:
+            matrix = matrix + matrix.T
+        return cls(matrix, num_windows, num_termites, window_size, directed)
+
+    @classmethod
+    def from_events(cls, events, num_termites, window_size, frame_count=None, directed=False, unordered=False):
+        """Build from an event list such as the output of a pairwise detector (see from_edges for unordered)."""
+        num_windows = None if frame_count is None else -(-frame_count // window_size)
+        return cls.from_edges(window_edges_from_events(events, window_size), num_termites, window_size,
+                              num_windows, directed, unordered)
+
+    def window(self, index):
+        """The (termites, termites) sparse adjacency matrix of one window."""
+        lo, hi = index * self.num_termites, (index + 1) * self.num_termites
+        return self.matrix[lo:hi, lo:hi]
+
+    def _per_window(self, values):
+        return np.asarray(values).reshape(self.num_windows, self.num_termites)
+
+    def _binary(self):
+        binary = self.matrix.copy()
+        binary.data = (binary.data > 0).astype(np.float64)
+        binary.eliminate_zeros()
+        if self.directed:
+            binary = binary.maximum(binary.T)
+        return binary
+
+    def degree(self):
+        """Number of contact partners of each termite, shape (windows, termites)."""
+        return self._per_window(self._binary().getnnz(axis=1))
+
+    def strength(self):
+        """Total contact frames of each termite (outgoing ones for directed networks), shape (windows, termites)."""
+        return self._per_window(self.matrix.sum(axis=1))
+
+    def clustering(self):
+        """Local clustering coefficient of the undirected, unweighted network, shape (windows, termites)."""
+        binary = self._binary()
+        closed_paths = self._per_window((binary @ binary).multiply(binary).sum(axis=1))
+        degree = self._per_window(binary.getnnz(axis=1)).astype(np.float64)
+        possible = degree * (degree - 1)
+        return np.divide(closed_paths, possible, out=np.zeros_like(possible), where=possible > 0)
+
+    def degree_centrality(self):
+        """Degree divided by the number of other termites, shape (windows, termites)."""
+        return self.degree() / max(self.num_termites - 1, 1)
+
+    def eigenvector_centrality(self, max_iterations=200, tolerance=1e-8):
+        """Eigenvector centrality of the weighted, undirected network of every window.
+
+        A single power iteration runs on the block-diagonal matrix, normalizing each window on its own,
+        so all windows converge together. Windows without contacts get zero centrality.
+        """
+        weights = self.matrix if not self.directed else self.matrix + self.matrix.T
+        centrality = np.ones((self.num_windows, self.num_termites))
+        centrality /= np.sqrt(self.num_termites)
+        for _ in range(max_iterations):
+            # Adding the previous vector (A + I) prevents oscillation on bipartite networks
+            updated = self._per_window(weights @ centrality.ravel()) + centrality
+            norm = np.linalg.norm(updated, axis=1, keepdims=True)
+            updated = np.divide(updated, norm, out=np.zeros_like(updated), where=norm > 0)
+            converged = np.abs(updated - centrality).max() < tolerance
+            centrality = updated
+            if converged:
+                break
+        has_contacts = self._per_window(weights.getnnz(axis=1)).sum(axis=1, keepdims=True) > 0
+        return np.where(has_contacts, centrality, 0.0)
+
+
+def save_contact_networks(networks, filename):
+    """Save the networks compactly: window, termite pair and frame count of every non-zero entry."""
+    matrix = networks.matrix.tocoo()
+    window = matrix.row // networks.num_termites
+    upper = (matrix.row <= matrix.col) if not networks.directed else np.ones(matrix.nnz, dtype=bool)
+    np.savez_compressed(
+        filename,
+        window=window[upper].astype(np.int32),
+        active=(matrix.row[upper] % networks.num_termites).astype(np.int16),
+        passive=(matrix.col[upper] % networks.num_termites).astype(np.int16),
+        frames=matrix.data[upper].astype(np.int32),
+        shape=np.array([networks.num_windows, networks.num_termites, networks.window_size, networks.directed]),
+    )
+
+
+def load_contact_networks(filename):
+    """Load networks written by save_contact_networks."""
+    with np.load(filename) as data:
+        num_windows, num_termites, window_size, directed = (int(v) for v in data["shape"])
+        edges = (data["window"], data["active"].astype(np.int64), data["passive"].astype(np.int64), data["frames"])
+        return ContactNetworks.from_edges(edges, num_termites, window_size, num_windows, bool(directed))
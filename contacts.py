@@ -0,0 +1,123 @@
+"""
+Contact rules are written in terms of the skeleton's node_names, so the same detector works for the
+3-node (mandible, thorax, abdomen) skeleton and for newer skeletons with antennae and legs.
+
+Example:
+    rules = [
+        {"name": "antennation", "active": "antenna_*", "passive": "any", "max_distance": 15, "min_frames": 5},
+        {"name": "grooming", "active": "mandible", "passive": "abdomen", "min_distance": 1, "max_distance": 50, "min_frames": 45},
+    ]
+    events = detect_node_contacts(filled_locations, node_names, rules)
+"""
+import fnmatch
+import numpy as np
+from runlength import RunAccumulator
+
+
+def resolve_nodes(spec, node_names):
+    """Resolve a node spec ("any", a node name, a glob pattern or a list of them) to node indices."""
+    if spec is None or spec == "any":
+        return np.arange(len(node_names))
+    patterns = [spec] if isinstance(spec, str) else list(spec)
+    indices = [i for i, name in enumerate(node_names)
+               if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+    if not indices:
+        raise ValueError(f"Node spec {spec!r} does not match any of the nodes {node_names}")
+    return np.array(indices)
+
+
+def compile_contact_rules(rules, node_names):
+    """Compile a list of contact rules into one evaluation plan.
+
+    Parameters:
+    - rules (list of dict): Each rule has a "name", an "active" and a "passive" node spec, a "max_distance",
+      and optionally a "min_distance" (default 0) and "min_frames" (default 1).
+    - node_names (list): Node names of the skeleton, as returned by load_h5_data.
+
+    Returns:
+    - dict: The plan, with the union of active and passive nodes and per-rule positions into them.
+    """
+    active_sets = [resolve_nodes(rule.get("active"), node_names) for rule in rules]
+    passive_sets = [resolve_nodes(rule.get("passive"), node_names) for rule in rules]
+    active_nodes = np.unique(np.concatenate(active_sets))
+    passive_nodes = np.unique(np.concatenate(passive_sets))
+
+    return {
+        "names": [rule["name"] for rule in rules],
+        "active_nodes": active_nodes,
+        "passive_nodes": passive_nodes,
+        "active": [np.searchsorted(active_nodes, nodes) for nodes in active_sets],
+        "passive": [np.searchsorted(passive_nodes, nodes) for nodes in passive_sets],
+        "min_distance": np.array([rule.get("min_distance", 0) for rule in rules], dtype=float),
+        "max_distance": np.array([rule["max_distance"] for rule in rules], dtype=float),
+        "min_frames": np.array([rule.get("min_frames", 1) for rule in rules], dtype=int),
+    }
+
+
+def all_pairs(num_termites):
+    """Return (active, passive) index arrays of every ordered pair of different termites."""
+    active, passive = np.nonzero(~np.eye(num_termites, dtype=bool))
+    return active, passive
+
+
+def candidate_pair_mask(block, active, passive, reach):
+    """Flag the pairs that can possibly come within reach of each other in a frame block.
+
+    Every node lies within the termite's radius from its centroid, so the centroid distance minus
+    both radii is a lower bound for every node-to-node distance of the pair.
+    """
+    valid = ~np.isnan(block[:, :, 0, :])
+    counts = valid.sum(axis=1)
+    centroid = np.where(valid[:, :, None, :], block, 0).sum(axis=1) / np.maximum(counts, 1)[:, None, :]
+    centroid[np.broadcast_to(counts[:, None, :] == 0, centroid.shape)] = np.nan
+
+    radius = np.sqrt(((block - centroid[:, None]) ** 2).sum(axis=2))
+    radius = np.where(np.isnan(radius), 0, radius).max(axis=1)
+
+    gap = np.sqrt(((centroid[:, :, active] - centroid[:, :, passive]) ** 2).sum(axis=1))
+    gap = gap - radius[:, active] - radius[:, passive]
+    return (np.where(np.isnan(gap), np.inf, gap) <= reach).any(axis=0)
+
+
+def detect_node_contacts(locations, node_names, rules, block_size=512):
+    """Detect contacts between node groups of different termites for a whole rule set in one pass.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, termites).
+    - node_names (list): Node names of the skeleton.
+    - rules (list of dict): Contact rules, see compile_contact_rules.
+    - block_size (int): Number of frames evaluated together.
+
+    Returns:
+    - list: Tuples (rule_name, active, passive, start_frame, end_frame), sorted by rule, pair and start frame.
+    """
+    plan = compile_contact_rules(rules, node_names)
+    frame_count, _, _, num_termites = locations.shape
+    active, passive = all_pairs(num_termites)
+    num_rules, num_pairs = len(plan["names"]), len(active)
+    reach = plan["max_distance"].max()
+
+    accumulator = RunAccumulator(num_rules * num_pairs, np.repeat(plan["min_frames"], num_pairs))
+    for offset in range(0, frame_count, block_size):
+        block = locations[offset:offset + block_size]
+        mask = np.zeros((block.shape[0], num_rules, num_pairs), dtype=bool)
+
+        candidates = np.flatnonzero(candidate_pair_mask(block, active, passive, reach))
+        if len(candidates):
+            active_points = block[:, plan["active_nodes"]][:, :, :, active[candidates]]
+            passive_points = block[:, plan["passive_nodes"]][:, :, :, passive[candidates]]
+            # distances has shape (frames, active nodes, passive nodes, candidate pairs)
+            distances = np.sqrt(((active_points[:, :, None] - passive_points[:, None]) ** 2).sum(axis=3))
+            distances = np.where(np.isnan(distances), np.inf, distances)
+
+            for rule in range(num_rules):
+                rule_distances = distances[:, plan["active"][rule]][:, :, plan["passive"][rule]].min(axis=(1, 2))
+                mask[:, rule, candidates] = ((rule_distances >= plan["min_distance"][rule]) &
+                                             (rule_distances <= plan["max_distance"][rule]))
+
+        accumulator.update(mask.reshape(block.shape[0], -1), offset)
+
+    columns, starts, ends = accumulator.finish()
+    rule_ids, pair_ids = np.divmod(columns, num_pairs)
+    return [(plan["names"][r], int(active[p]), int(passive[p]), int(s), int(e))
+            for r, p, s, e in zip(rule_ids, pair_ids, starts, ends)]
@@ -0,0 +1,117 @@
+"""
+On-disk pairwise distance cube. The distances (and image-frame bearings) from chosen nodes of the
+active termite to chosen nodes of the passive termite are written for every ordered pair as HDF5
+datasets of shape (frames, pairs, node pairs), so analyses and models can read them instead of
+recomputing them with the per-frame loops of proximity.py.
+
+Each chunk holds one pair over frame_chunk frames and all node pairs. Reading one pair's whole series
+or one frame block is a single hyperslab read over whole chunks, and (frame block, pair) chunks in
+which the two termites never come within reach of each other (contacts.candidate_pair_mask) are not
+written at all: they take no space and read back as NaN.
+
+Example:
+    export_distance_cube(filled_locations, "7_3_dev_distances.h5", reach=200, track_names=track_names)
+    series = read_pair_series("7_3_dev_distances.h5", 0, 3)        # (frames, node pairs)
+    block = read_frame_block("7_3_dev_distances.h5", 0, 4096)      # (frames, pairs, node pairs)
+"""
+import h5py
+import numpy as np
+from contacts import all_pairs, candidate_pair_mask
+from memory import analysis_dtype
+from pipeline import MANDIBLE_INDEX, FrameBlock
+
+
+def node_pair_list(active_nodes, passive_nodes):
+    """(active node, passive node) index pairs stored along the last axis of the cube."""
+    return np.array([(a, b) for a in active_nodes for b in passive_nodes], dtype=np.int64).reshape(-1, 2)
+
+
+def export_distance_cube(locations, output_path, active_nodes=(MANDIBLE_INDEX,), passive_nodes=None, reach=None,
+                         bearings=True, dtype="float16", frame_chunk=4096, compression="gzip",
+                         track_names=None, node_names=None):
+    """
+    Write the pairwise node distance cube of a recording to an HDF5 file.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, termites).
+    - output_path (str): Path of the new .h5 file.
+    - active_nodes (tuple): Nodes of the active termite (default: the mandible).
+    - passive_nodes (tuple): Nodes of the passive termite (default: all nodes).
+    - reach (float): Only write the chunks in which a pair may come within this distance; None writes all.
+    - bearings (bool): Also write the "bearing" dataset (degrees, 0 .. 360, as pipeline "pair_bearing").
+    - dtype (str): Stored float type; float16 keeps about 3 significant digits (0.25 px at 500 px).
+    - frame_chunk (int): Frames per chunk.
+    - compression (str): h5py compression filter.
+    - track_names, node_names (list): Stored with the cube for reference.
+
+    Returns:
+    - float: Fraction of the (frame block, pair) chunks that were written.
+    """
+    frame_count, num_nodes, _, num_termites = locations.shape
+    passive_nodes = range(num_nodes) if passive_nodes is None else passive_nodes
+    node_pairs = node_pair_list(active_nodes, passive_nodes)
+    keys = [(a, b) for a, b in node_pairs]
+    active, passive = all_pairs(num_termites)
+    num_blocks = -(-frame_count // frame_chunk)
+    written = np.zeros((num_blocks, len(active)), dtype=bool)
+
+    with h5py.File(output_path, "w") as output:
+        options = dict(shape=(frame_count, len(active), len(node_pairs)), dtype=dtype,
+                       chunks=(min(frame_chunk, max(frame_count, 1)), 1, len(node_pairs)),
+                       compression=compression, shuffle=True, fillvalue=np.nan)
+        datasets = {"distance": output.create_dataset("distance", **options)}
+        if bearings:
+            datasets["bearing"] = output.create_dataset("bearing", **options)
+        for dataset in datasets.values():
+            for axis, label in enumerate(("frames", "pairs", "node_pairs")):
+                dataset.dims[axis].label = label
+
+        for index, start in enumerate(range(0, frame_count, frame_chunk)):
+            block = np.asarray(locations[start:start + frame_chunk], dtype=analysis_dtype())
+            candidates = np.arange(len(active))
+            if reach is not None:
+                candidates = np.flatnonzero(candidate_pair_mask(block, active, passive, reach))
+            if not len(candidates):
+                continue
+            features = FrameBlock(block, start, active[candidates], passive[candidates])
+            values = {"distance": np.stack([features[("pair_distance", a, b)] for a, b in keys], axis=2)}
+            if bearings:
+                values["bearing"] = np.stack([features[("pair_bearing", a, b)] for a, b in keys], axis=2)
+            for name, dataset in datasets.items():
+                cube = values[name].astype(dtype)
+                # One write per chunk: the block of frames for one pair
+                for column, pair in enumerate(candidates):
+                    dataset[start:start + len(block), pair] = cube[:, column]
+            written[index, candidates] = True
+
+        output.create_dataset("pairs", data=np.stack([active, passive], axis=1))
+        output.create_dataset("node_pairs", data=node_pairs)
+        output.create_dataset("written", data=written, compression=compression)
+        if track_names is not None:
+            output.create_dataset("track_names", data=np.array([str(n).encode() for n in track_names]))
+        if node_names is not None:
+            output.create_dataset("node_names", data=np.array([str(n).encode() for n in node_names]))
+        output.attrs["frame_chunk"] = frame_chunk
+        output.attrs["reach"] = np.nan if reach is None else reach
+    return written.mean() if written.size else 0.0
+
+
+def pair_index(cube_file, active, passive):
+    """Index of the (active, passive) pair along the pairs axis of an open cube file."""
+    pairs = cube_file["pairs"][:]
+    match = np.flatnonzero((pairs[:, 0] == active) & (pairs[:, 1] == passive))
+    if not len(match):
+        raise KeyError(f"Pair ({active}, {passive}) is not in the cube")
+    return int(match[0])
+
+
+def read_pair_series(path, active, passive, dataset="distance", start=0, stop=None):
+    """(frames, node pairs) float32 series of one ordered pair; NaN where missing or not written."""
+    with h5py.File(path, "r") as f:
+        return f[dataset][start:stop, pair_index(f, active, passive)].astype(np.float32)
+
+
+def read_frame_block(path, start, stop, dataset="distance"):
+    """(frames, pairs, node pairs) float32 values of all pairs for the frames start .. stop - 1."""
+    with h5py.File(path, "r") as f:
+        return f[dataset][start:stop].astype(np.float32)
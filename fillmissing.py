@@ -7,9 +7,10 @@ Created on Tue May 30 23:48:39 2023
 
 import h5py
 import numpy as np
-from scipy.interpolate import interp1d
 
 def fill_missing(Y, kind="linear"):
+    from scipy.interpolate import interp1d
+
     initial_shape = Y.shape
     Y = Y.reshape((initial_shape[0], -1))
 
@@ -1,7 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from loadh5 import load_h5_data  # loadh5.py dosyasından import
 import h5py
 
 def calculate_angle(vector1, vector2):
@@ -12,7 +9,7 @@ def calculate_angle(vector1, vector2):
     angle = np.arccos(np.clip(dot_product, -1.0, 1.0))
     return np.degrees(angle)
 
-def detect_grooming_events(locations, min_distance=1, max_distance=50, min_duration_frames=45):
+def detect_grooming_events(locations, min_distance=1, max_distance=50, min_duration_frames=45, max_gap_frames=0):
     frame_count, body_parts, _, num_termites = locations.shape
     grooming_events = []
     MANDIBLE_INDEX = 0  # Mandible (çene) noktası
@@ -24,42 +21,46 @@ def detect_grooming_events(locations, min_distance=1, max_distance=50, min_durat
                 continue  # Aynı termitleri atla
 
             start_frame = None
-            duration = 0
+            last_frame = None
+            gap = 0
 
             for frame in range(frame_count):
                 mandible_i = locations[frame, MANDIBLE_INDEX, :, i]
                 abdomen_j = locations[frame, ABDOMEN_INDEX, :, j]
 
                 if np.isnan(mandible_i).any() or np.isnan(abdomen_j).any():
-                    if duration >= min_duration_frames:
-                        grooming_events.append((i, j, start_frame, frame - 1))
-                    start_frame = None
-                    duration = 0
+                    # Eksik nokta: olay en fazla max_gap_frames kare boyunca açık kalır
+                    gap += 1
+                    if start_frame is not None and gap > max_gap_frames:
+                        if last_frame - start_frame + 1 >= min_duration_frames:
+                            grooming_events.append((i, j, start_frame, last_frame))
+                        start_frame = None
                     continue
 
+                gap = 0
                 distance = np.linalg.norm(mandible_i - abdomen_j)
 
                 if min_distance <= distance <= max_distance:
                     if start_frame is None:
                         start_frame = frame
-                    duration += 1
+                    last_frame = frame
                 else:
-                    if duration >= min_duration_frames:
-                        grooming_events.append((i, j, start_frame, frame - 1))
+                    if start_frame is not None and last_frame - start_frame + 1 >= min_duration_frames:
+                        grooming_events.append((i, j, start_frame, last_frame))
                     start_frame = None
-                    duration = 0
 
-            if duration >= min_duration_frames:
-                grooming_events.append((i, j, start_frame, frame_count - 1))
+            if start_frame is not None and last_frame - start_frame + 1 >= min_duration_frames:
+                grooming_events.append((i, j, start_frame, last_frame))
                 
     return grooming_events
 
 # Grooming olaylarını görselleştirmek için zaman çizelgesi fonksiyonu
 def plot_grooming_timeline(grooming_events):
+    import matplotlib.pyplot as plt
+    from plotting import draw_event_timeline
+
     plt.figure(figsize=(15, 10))
-    for event in grooming_events:
-        track_a, track_b, start_frame, end_frame = event
-        plt.hlines(y=f"{track_a}-{track_b}", xmin=start_frame, xmax=end_frame, linewidth=2)
+    draw_event_timeline(plt.gca(), grooming_events)
 
     plt.title("Grooming Olayları Zaman Çizelgesi")
     plt.xlabel("Kare Numarası")
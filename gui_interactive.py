@@ -4,9 +4,7 @@ import tkinter as tk
 from tkinter import simpledialog, messagebox
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Button
-from fillmissing import fill_missing
-from loadh5 import load_h5_data
-from cleaning import clean_and_validate_data
+from preprocess import load_preprocessed
 from proximity import detect_proximity_interactions_with_nodes_and_angles
 import pickle
 
@@ -110,15 +108,9 @@ class DigitalImprintApp:
 
 # Main code
 if __name__ == "__main__":
-    # Load data using the load_h5_data function from loadh5.py
+    # Load, clean and fill the data once; later runs memory-map the cache written next to the file
     filename = "h5try/7_3_dev.h5"  # Replace with your actual file path
-    frame_count, node_count, instance_count, locations, track_names, node_names = load_h5_data(filename)
-
-    # Clean and validate the data using the function from cleaning.py
-    cleaned_locations = clean_and_validate_data(locations)
-
-    # Fill missing data (if needed)
-    filled_locations = fill_missing(cleaned_locations)
+    frame_count, node_count, instance_count, filled_locations, track_names, node_names = load_preprocessed(filename)
 
     # Preprocess and load interactions
     interactions_file = "interactions.pkl"
@@ -0,0 +1,155 @@
+"""
+Identity-swap detection and correction. SLEAP's flow tracker can swap two identities when termites
+cross; afterwards every per-track distance and pairwise event of those tracks is wrong.
+
+Swaps can only happen where termites come close, so only those frames are examined: close pairs are
+found with a per-block bounding-box prefilter, and at every frame transition with close pairs each
+group of nearby tracks is re-assigned with linear_sum_assignment on a small cost matrix
+(constant-velocity prediction of every node vs. the observed nodes in the next frame).
+
+Example:
+    corrected, swaps = correct_identity_swaps(filled_locations, encounter_radius=60)
+"""
+from bisect import bisect_right
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+def track_centroids(locations):
+    """Mean position of the nodes of every track, shape (frames, 2, tracks); NaN where no node is tracked."""
+    valid = ~np.isnan(locations[:, :, 0, :])
+    counts = valid.sum(axis=1)
+    totals = np.where(valid[:, :, None, :], locations, 0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return totals / np.where(counts > 0, counts, np.nan)[:, None, :]
+
+
+def close_encounters(centroids, radius, block_size=32):
+    """Find every (frame, track_a, track_b) with track_a < track_b whose centroids are within radius.
+
+    Pairs whose centroid bounding boxes over a block of frames are further apart than radius are skipped
+    without computing any per-frame distance.
+    """
+    frame_count, _, num_tracks = centroids.shape
+    upper_a, upper_b = np.triu_indices(num_tracks, k=1)
+    frames, track_a, track_b = [], [], []
+    for start in range(0, frame_count, block_size):
+        block = centroids[start:start + block_size]
+        missing = np.isnan(block)
+        # Tracks absent from the whole block get an empty box (low = inf, high = -inf) and never overlap
+        low = np.where(missing, np.inf, block).min(axis=0)
+        high = np.where(missing, -np.inf, block).max(axis=0)
+        overlap = ((low[:, upper_a] - radius <= high[:, upper_b]) &
+                   (low[:, upper_b] - radius <= high[:, upper_a])).all(axis=0)
+        candidates = np.flatnonzero(overlap)
+        if not len(candidates):
+            continue
+        a, b = upper_a[candidates], upper_b[candidates]
+        distance = np.sqrt(((block[:, :, a] - block[:, :, b]) ** 2).sum(axis=1))
+        rows, columns = np.nonzero(distance < radius)
+        frames.append(start + rows)
+        track_a.append(a[columns])
+        track_b.append(b[columns])
+    if not frames:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty.copy(), empty.copy()
+    return np.concatenate(frames), np.concatenate(track_a), np.concatenate(track_b)
+
+
+def assignment_cost(locations, frame, tracks, previous_tracks=None):
+    """Cost of continuing each track of a group at frame into each track at frame + 1.
+
+    Each node is predicted at frame + 1 with constant velocity (or constant position if frame - 1 is
+    missing), and the cost is the mean distance between predicted and observed nodes.
+    previous_tracks gives the columns holding the same identities at frame - 1, if they differ.
+    """
+    if previous_tracks is None:
+        previous_tracks = tracks
+    current = locations[frame][:, :, tracks]
+    previous = locations[frame - 1][:, :, previous_tracks] if frame > 0 else current
+    predicted = np.where(np.isnan(previous), current, 2 * current - previous)
+    observed = locations[frame + 1][:, :, tracks]
+    # distance has shape (nodes, tracks at frame, tracks at frame + 1)
+    distance = np.sqrt(((predicted[:, :, :, None] - observed[:, :, None, :]) ** 2).sum(axis=1))
+    valid = ~np.isnan(distance)
+    counts = valid.sum(axis=0)
+    cost = np.where(valid, distance, 0).sum(axis=0) / np.maximum(counts, 1)
+    return np.where(counts > 0, cost, np.inf)
+
+
+def detect_identity_swaps(locations, encounter_radius=60, min_improvement=5.0):
+    """Find frame transitions where re-assigning nearby tracks is clearly cheaper than keeping identities.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, tracks).
+    - encounter_radius (float): Centroid distance in pixels below which two tracks can be swapped.
+    - min_improvement (float): Mean node distance in pixels the re-assignment must save per track.
+
+    Returns:
+    - list: (frame, tracks, new_order) tuples. From frame on, track slot tracks[k] should take the data of
+      slot tracks[new_order[k]], with earlier swaps already applied; tracks lists only the swapped identities.
+    """
+    frame_count = locations.shape[0]
+    frames, track_a, track_b = close_encounters(track_centroids(locations), encounter_radius)
+    # A close pair at frame t can swap between t - 1 and t or between t and t + 1
+    transitions = np.concatenate([frames - 1, frames])
+    pair_a, pair_b = np.concatenate([track_a, track_a]), np.concatenate([track_b, track_b])
+    keep = (transitions >= 0) & (transitions < frame_count - 1)
+    transitions, pair_a, pair_b = transitions[keep], pair_a[keep], pair_b[keep]
+    order = np.argsort(transitions, kind="stable")
+    transitions, pair_a, pair_b = transitions[order], pair_a[order], pair_b[order]
+
+    # Permutations in effect from each swap frame on; permutation[k] is the column holding identity k
+    swap_frames, permutations = [0], [np.arange(locations.shape[3])]
+    swaps = []
+    unique_transitions, first = np.unique(transitions, return_index=True)
+    bounds = np.append(first, len(transitions))
+    for index, frame in enumerate(unique_transitions):
+        a, b = pair_a[bounds[index]:bounds[index + 1]], pair_b[bounds[index]:bounds[index + 1]]
+        tracks, local = np.unique(np.concatenate([a, b]), return_inverse=True)
+        graph = coo_matrix((np.ones(len(a)), (local[:len(a)], local[len(a):])), shape=(len(tracks), len(tracks)))
+        _, labels = connected_components(graph, directed=False)
+        current = permutations[bisect_right(swap_frames, frame) - 1]
+        before = permutations[bisect_right(swap_frames, max(frame - 1, 0)) - 1]
+
+        for label in np.unique(labels):
+            # Encounters are found on the raw columns; identities are mapped through the swaps found so far
+            group = tracks[labels == label]
+            identities = np.argsort(current)[group]
+            order = np.argsort(identities)
+            group, identities = group[order], identities[order]
+            cost = assignment_cost(locations, frame, group, before[identities])
+            if not np.isfinite(np.diag(cost)).all():
+                continue
+            rows, columns = linear_sum_assignment(np.where(np.isfinite(cost), cost, 1e12))
+            if (columns == rows).all():
+                continue
+            saving = np.trace(cost) - cost[rows, columns].sum()
+            if saving > min_improvement * len(group):
+                if swap_frames[-1] != frame + 1:
+                    swap_frames.append(int(frame) + 1)
+                    permutations.append(permutations[-1].copy())
+                permutations[-1][identities] = group[columns]
+                # Report only the identities that change columns
+                moved = np.flatnonzero(columns != rows)
+                swaps.append((int(frame) + 1, identities[moved], np.searchsorted(moved, columns[moved])))
+    return swaps
+
+
+def apply_identity_swaps(locations, swaps, inplace=False):
+    """Apply swaps from detect_identity_swaps to the track axis of a locations array."""
+    corrected = locations if inplace else locations.copy()
+    permutation = np.arange(locations.shape[3])
+    boundaries = [frame for frame, _, _ in swaps] + [locations.shape[0]]
+    for (frame, tracks, new_order), stop in zip(swaps, boundaries[1:]):
+        permutation[tracks] = permutation[tracks[new_order]]
+        corrected[frame:stop] = locations[frame:stop][:, :, :, permutation]
+    return corrected
+
+
+def correct_identity_swaps(locations, encounter_radius=60, min_improvement=5.0, inplace=False):
+    """Detect identity swaps and return (corrected locations, swaps)."""
+    swaps = detect_identity_swaps(locations, encounter_radius, min_improvement)
+    return apply_identity_swaps(locations, swaps, inplace), swaps
@@ -1,5 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
 def calculate_vector(point1, point2):
     """Calculate the vector from point1 to point2."""
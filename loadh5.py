@@ -1,15 +1,29 @@
 import h5py
 import numpy as np
-from fillmissing import fill_missing
-from cleaning import clean_and_validate_data
+from memory import analysis_dtype
 
 #filename = "C+1_1_0.h5"
 #filename = "7.h5"
 
-def load_h5_data(filename):
+def read_locations(dataset, dtype, block_size=4096):
+    """Read a SLEAP tracks dataset into a (frames, nodes, 2, tracks) array of the given dtype, one frame block at a time."""
+    num_tracks, _, node_count, frame_count = dataset.shape
+    locations = np.empty((frame_count, node_count, 2, num_tracks), dtype=dtype)
+    for start in range(0, frame_count, block_size):
+        stop = min(start + block_size, frame_count)
+        locations[start:stop] = dataset[:, :, :, start:stop].T
+    return locations
+
+def load_h5_data(filename, dtype=None):
+    if dtype is None:
+        dtype = analysis_dtype()
     with h5py.File(filename, "r") as f:
         track_names = [n.decode() for n in f["track_names"][:]]
-        locations = f["tracks"][:].T
+        if np.dtype(dtype) == f["tracks"].dtype:
+            locations = f["tracks"][:].T
+        else:
+            # Under a memory budget the float64 file data is never held in full
+            locations = read_locations(f["tracks"], dtype)
         frame_count, node_count, _, instance_count = locations.shape
         node_names = [n.decode() for n in f["node_names"][:]]
         
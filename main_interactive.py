@@ -1,8 +1,5 @@
 
-import numpy as np
-from fillmissing import fill_missing
-from loadh5 import load_h5_data
-from cleaning import clean_and_validate_data
+from preprocess import load_preprocessed
 from interactions import detect_proximity_interactions_with_correct_angles
 from gui import DigitalImprintApp, get_xy_range
 
@@ -36,15 +33,9 @@ except Exception as e:
 """
 
 if __name__ == "__main__":
-    # Load data using the load_h5_data function from loadh5.py
+    # Load, clean and fill the data once; later runs memory-map the cache written next to the file
     filename = "h5try/7_3_dev.h5"  # Replace with your actual file path
-    frame_count, node_count, instance_count, locations, track_names, node_names = load_h5_data(filename)
-
-    # Clean and validate the data using the function from cleaning.py
-    cleaned_locations = clean_and_validate_data(locations)
-
-    # Fill missing data (if needed)
-    filled_locations = fill_missing(cleaned_locations)
+    frame_count, node_count, instance_count, filled_locations, track_names, node_names = load_preprocessed(filename)
 
     # Detect and print proximity interactions with nodes and angles
     #interactions = detect_proximity_interactions_with_nodes_and_angles(filled_locations, proximity_threshold=400, min_angle=50, max_angle=130)
@@ -0,0 +1,78 @@
+"""
+Global memory budget for long recordings. With a budget set, locations are stored as float32 and the
+frame-block size of the block-wise detectors is derived from the budget instead of a fixed default.
+
+Example:
+    set_memory_budget("2GB")
+    frame_count, node_count, instance_count, locations, track_names, node_names = load_h5_data(filename)
+    results = run_detectors(fill_missing(locations), ["grooming", "leader_follower"])
+"""
+import numpy as np
+
+MEMORY_BUDGET = None
+DEFAULT_BLOCK_SIZE = 1024
+MIN_BLOCK_SIZE = 16
+# Larger blocks do not speed up the vectorized detectors any further
+MAX_BLOCK_SIZE = 8192
+
+_UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_size(size):
+    """Convert a size such as 512000000, "500MB" or "2GB" to bytes."""
+    if isinstance(size, str):
+        text = size.strip().upper()
+        for unit, factor in _UNITS.items():
+            if text.endswith(unit):
+                return int(float(text[:-len(unit)]) * factor)
+        return int(float(text))
+    return int(size)
+
+
+def set_memory_budget(budget):
+    """Set the global memory budget (bytes or a size string). None switches back to unlimited float64 analysis."""
+    global MEMORY_BUDGET
+    MEMORY_BUDGET = None if budget is None else parse_size(budget)
+
+
+def analysis_dtype():
+    """Storage dtype for locations and derived features: float32 under a memory budget, float64 otherwise."""
+    return np.float64 if MEMORY_BUDGET is None else np.float32
+
+
+def frame_block_size(bytes_per_frame, reserved=0, budget=None, default=DEFAULT_BLOCK_SIZE):
+    """Number of frames per block that keeps the working set inside the memory budget.
+
+    Parameters:
+    - bytes_per_frame (int): Working memory needed per frame of a block.
+    - reserved (int): Memory already taken, e.g. by the locations array itself.
+    - budget (int or str): Budget to use instead of the global one.
+    - default (int): Block size used when no budget is set.
+
+    Returns:
+    - int: The block size, between MIN_BLOCK_SIZE and MAX_BLOCK_SIZE frames.
+    """
+    budget = MEMORY_BUDGET if budget is None else parse_size(budget)
+    if budget is None:
+        return default
+    available = budget - reserved
+    return int(np.clip(available // max(bytes_per_frame, 1), MIN_BLOCK_SIZE, MAX_BLOCK_SIZE))
+
+
+def feature_bytes_per_frame(requires, num_nodes, num_termites, num_pairs, itemsize):
+    """Estimate the per-frame memory of a FrameBlock holding the given pipeline features."""
+    values = num_nodes * 2 * num_termites
+    for key in requires:
+        kind = key[0]
+        if kind == "pair_offset":
+            values += 2 * num_pairs
+        elif kind in ("pair_distance", "pair_bearing"):
+            # The pair offset is computed along the way
+            values += 3 * num_pairs
+        elif kind in ("segment", "displacement"):
+            values += 2 * num_termites
+        else:
+            values += num_termites
+    # Masks and elementwise temporaries of the detectors (products, comparisons, stacked node masks)
+    values += 8 * num_pairs
+    return values * itemsize
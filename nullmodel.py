@@ -0,0 +1,215 @@
+"""
+Permutation null models for interaction significance. A surrogate recording is described by index
+maps only: every track is circularly shifted in time by its own random offset ("shift"), or its
+frames are cut into segments that are put in a random order per track ("shuffle"). The locations
+are never copied per surrogate; each frame block of a surrogate is gathered from the original array
+through its source-frame indices, and per-track features (speeds, displacements, body segments) are
+computed once on the original tracks and gathered the same way.
+
+Surrogates are evaluated in batches: the tracks of batch_size surrogates are stacked side by side
+in one block, so one detector pass covers the whole batch. Batches run in a process pool with the
+locations and features in shared memory (parallel.py).
+
+Example:
+    result = permutation_test(filled_locations, "grooming", num_surrogates=500, processes=8, seed=1)
+    print_permutation_test(result, track_names)
+"""
+import numpy as np
+from contacts import all_pairs
+from memory import analysis_dtype
+from parallel import run_sharded
+from pipeline import FrameBlock, detector_block_size, make_detector, run_detectors, start_detectors
+
+
+def random_shifts(num_surrogates, num_tracks, frame_count, seed=None):
+    """(surrogates, tracks) circular shifts, drawn uniformly from 0 .. frame_count - 1."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, frame_count, size=(num_surrogates, num_tracks))
+
+
+def random_segment_orders(num_surrogates, num_tracks, frame_count, segment_frames, seed=None):
+    """(surrogates, tracks, segments) random order of the whole segment_frames-long segments of every track."""
+    rng = np.random.default_rng(seed)
+    num_segments = frame_count // segment_frames
+    return rng.permuted(np.broadcast_to(np.arange(num_segments), (num_surrogates, num_tracks, num_segments)), axis=2)
+
+
+def source_frames(frames, frame_count, shifts=None, orders=None, segment_frames=None):
+    """
+    Frame of the original recording that each surrogate frame of each track is taken from.
+
+    Parameters:
+    - frames (numpy.array): Surrogate frame numbers.
+    - frame_count (int): Number of frames of the recording.
+    - shifts (numpy.array): (surrogates, tracks) circular shifts, see random_shifts.
+    - orders (numpy.array): (surrogates, tracks, segments) segment orders, see random_segment_orders.
+      Used instead of shifts if given; frames after the last whole segment keep their place.
+    - segment_frames (int): Segment length for orders.
+
+    Returns:
+    - numpy.array: (frames, surrogates, tracks) source frame indices.
+    """
+    frames = np.asarray(frames)
+    if orders is None:
+        return (frames[:, None, None] - np.asarray(shifts)[None]) % frame_count
+    segment, within = np.divmod(frames, segment_frames)
+    num_segments = orders.shape[2]
+    source = np.take(orders, np.minimum(segment, num_segments - 1), axis=2).transpose(2, 0, 1)
+    source = source * segment_frames + within[:, None, None]
+    return np.where((segment < num_segments)[:, None, None], source, frames[:, None, None])
+
+
+def track_features(locations, requires):
+    """The per-track features among requires (segment, displacement, speed), computed once on the whole recording.
+
+    Pair features are left out: they depend on how two tracks are aligned, so every surrogate computes its own.
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    block = FrameBlock(locations, 0, empty, empty)
+    return {key: block[key] for key in requires if not key[0].startswith("pair_")}
+
+
+def event_matrix(events, num_tracks, statistic="count", surrogate_tracks=None):
+    """
+    Per-pair statistic of pairwise events, (tracks, tracks) indexed by [active, passive].
+
+    statistic is "count" (number of events) or "frames" (total event frames). With surrogate_tracks set,
+    the event track indices refer to stacked surrogates (see evaluate_surrogates) and the result has shape
+    (surrogates, surrogate_tracks, surrogate_tracks).
+    """
+    events = np.array([(event[0], event[1], event[-2], event[-1]) for event in events], dtype=np.int64).reshape(-1, 4)
+    active, passive, starts, ends = events.T
+    weights = np.ones(len(events)) if statistic == "count" else (ends - starts + 1).astype(np.float64)
+    if surrogate_tracks is None:
+        matrix = np.zeros((num_tracks, num_tracks))
+        np.add.at(matrix, (active, passive), weights)
+        return matrix
+    matrix = np.zeros((num_tracks // surrogate_tracks, surrogate_tracks, surrogate_tracks))
+    np.add.at(matrix, (active // surrogate_tracks, active % surrogate_tracks, passive % surrogate_tracks), weights)
+    return matrix
+
+
+def evaluate_surrogates(locations, features, name, params, shifts=None, orders=None, segment_frames=None,
+                        statistic="count", block_size=None):
+    """
+    Run a detector on a batch of surrogates in a single pass and return their per-pair statistics.
+
+    The tracks of surrogate k are stacked as termites k * tracks .. (k + 1) * tracks - 1 of every block,
+    and only the pairs within one surrogate are evaluated.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, tracks).
+    - features (dict): Per-track features from track_features.
+    - name (str), params (dict): Registered detector name and its parameters.
+    - shifts, orders, segment_frames: The batch of surrogates, see source_frames.
+    - statistic (str): See event_matrix.
+    - block_size (int): Frames per block; by default derived from the memory budget.
+
+    Returns:
+    - numpy.array: (surrogates, tracks, tracks) statistic.
+    """
+    frame_count, num_nodes, _, num_tracks = locations.shape
+    num_surrogates = len(orders if orders is not None else shifts)
+    active, passive = all_pairs(num_tracks)
+    offsets = (np.arange(num_surrogates) * num_tracks)[:, None]
+    pairs = ((offsets + active).ravel(), (offsets + passive).ravel())
+    detectors, active, passive, requires = start_detectors([make_detector(name, **params)],
+                                                           num_surrogates * num_tracks, pairs)
+    if block_size is None:
+        block_size = detector_block_size(requires, num_nodes, num_surrogates * num_tracks, len(active))
+
+    tracks = np.tile(np.arange(num_tracks), num_surrogates)
+    for start in range(0, frame_count, block_size):
+        frames = np.arange(start, min(start + block_size, frame_count))
+        source = source_frames(frames, frame_count, shifts, orders, segment_frames).reshape(len(frames), -1)
+        block = FrameBlock(locations[source, :, :, tracks].transpose(0, 2, 3, 1), start, active, passive)
+        for key, feature in features.items():
+            # (frames, tracks) or (frames, coordinates, tracks), gathered like the locations
+            gathered = feature[source, ..., tracks]
+            block.features[key] = gathered if gathered.ndim == 2 else gathered.transpose(0, 2, 1)
+        block.prepare(requires)
+        for detector in detectors:
+            detector.process(block)
+    return event_matrix(detectors[0].finish(), num_surrogates * num_tracks, statistic, surrogate_tracks=num_tracks)
+
+
+def _surrogate_shard(arrays, shard):
+    name, params, shifts, orders, segment_frames, statistic, block_size = shard
+    features = {key: value for key, value in arrays.items() if key != "locations"}
+    return evaluate_surrogates(arrays["locations"], features, name, params, shifts, orders, segment_frames,
+                               statistic, block_size)
+
+
+def permutation_test(locations, name, num_surrogates=200, mode="shift", segment_frames=None, statistic="count",
+                     batch_size=4, processes=None, seed=None, block_size=None, start_method=None, **params):
+    """
+    Compare the events of a pairwise detector with their distribution in time-shifted or shuffled surrogates.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, tracks).
+    - name (str): Registered pairwise detector, e.g. "grooming" or "proximity".
+    - num_surrogates (int): Number of surrogates.
+    - mode (str): "shift" (independent circular shift per track) or "shuffle" (segments in random order per track).
+    - segment_frames (int): Segment length for "shuffle".
+    - statistic (str): "count" (events per pair) or "frames" (event frames per pair).
+    - batch_size (int): Surrogates evaluated together in one pass.
+    - processes (int): Worker processes for the batches (default: number of CPUs); 1 runs in this process.
+    - seed (int): Random seed of the surrogates.
+    - block_size (int): Frames per block, see pipeline.run_detectors.
+    - start_method (str): multiprocessing start method; the platform default if None.
+    - params: Detector parameters, e.g. max_distance=40.
+
+    Returns:
+    - dict: "observed" (tracks, tracks) and "null" (surrogates, tracks, tracks) statistics, "pair_p" per-pair and
+      "colony_p" colony-level p-values, "colony_observed" and "colony_null" (sums over all pairs).
+      A p-value is (1 + number of surrogates at least as extreme) / (1 + num_surrogates).
+    """
+    detector = make_detector(name, **params)
+    if getattr(detector, "per_termite", False):
+        raise ValueError(f"{name} reports per-termite events, which do not change when tracks are shifted")
+    locations = np.ascontiguousarray(locations, dtype=analysis_dtype())
+    frame_count, _, _, num_tracks = locations.shape
+    if mode == "shift":
+        shifts, orders = random_shifts(num_surrogates, num_tracks, frame_count, seed), None
+    elif mode == "shuffle":
+        if not segment_frames:
+            raise ValueError("mode='shuffle' needs segment_frames")
+        shifts, orders = None, random_segment_orders(num_surrogates, num_tracks, frame_count, segment_frames, seed)
+    else:
+        raise ValueError(f"Unknown surrogate mode {mode!r}")
+
+    observed = event_matrix(run_detectors(locations, [detector], block_size)[name], num_tracks, statistic)
+    arrays = {"locations": locations, **track_features(locations, detector.requires)}
+    shards = [(name, params,
+               None if shifts is None else shifts[start:start + batch_size],
+               None if orders is None else orders[start:start + batch_size],
+               segment_frames, statistic, block_size)
+              for start in range(0, num_surrogates, batch_size)]
+    if processes == 1:
+        null = [_surrogate_shard(arrays, shard) for shard in shards]
+    else:
+        null = run_sharded(_surrogate_shard, arrays, shards, processes, start_method)
+    null = np.concatenate(null)
+
+    colony_observed = observed.sum()
+    colony_null = null.sum(axis=(1, 2))
+    return {
+        "observed": observed,
+        "null": null,
+        "pair_p": (1 + (null >= observed).sum(axis=0)) / (1 + num_surrogates),
+        "colony_observed": colony_observed,
+        "colony_null": colony_null,
+        "colony_p": (1 + (colony_null >= colony_observed).sum()) / (1 + num_surrogates),
+    }
+
+
+def print_permutation_test(result, track_names=None, alpha=0.05):
+    """Print the colony-level result and the pairs whose statistic exceeds the null at level alpha."""
+    null_mean = result["colony_null"].mean()
+    print(f"Colony: observed {result['colony_observed']:.0f}, null mean {null_mean:.1f}, p = {result['colony_p']:.4f}")
+    pair_mean = result["null"].mean(axis=0)
+    for active, passive in zip(*np.nonzero((result["pair_p"] <= alpha) & (result["observed"] > 0))):
+        a = track_names[active] if track_names else active
+        p = track_names[passive] if track_names else passive
+        print(f"{a} -> {p}: observed {result['observed'][active, passive]:.0f}, "
+              f"null mean {pair_mean[active, passive]:.1f}, p = {result['pair_p'][active, passive]:.4f}")
@@ -0,0 +1,224 @@
+"""
+Spatial occupancy and visit-density maps. Points are binned on a fixed grid derived from the arena
+bounds and counted one frame block at a time, per track and per node, touching only the cells the
+block's points fall into:
+
+- time: number of frames a node of a track spent in each cell
+- visits: number of times it entered each cell (a frame in a cell different from the last cell it was
+  seen in; frames where the node is missing are skipped, so reappearing in the same cell after a gap
+  continues the visit, while leaving the arena bounds ends it)
+
+The counts are kept sparse, as the flat index and count of every non-zero (track, node, cell), since
+each termite only visits a small part of a fine grid; the dense (tracks, nodes, rows, columns) array
+is only built on request. Maps of several blocks or files are merged by adding them, and they are
+saved as the non-zero cells only, so neither building nor storing them needs the full recording in memory.
+
+Example:
+    maps = occupancy_from_file("7_3_dev.h5", cell_size=10)
+    colony_time = maps.colony("time")        # (rows, columns) frames per cell over all tracks and nodes
+    queen_time = maps.track_map("time", 0)   # (rows, columns) frames per cell of track 0
+    save_occupancy(maps, "7_3_dev_occupancy.npz")
+"""
+import h5py
+import numpy as np
+import memory
+from cleaning import get_arena_bounds
+from prefetch import prefetch_blocks
+
+
+class OccupancyMaps:
+    """Per-track, per-node time and visit counts on a fixed grid of logical shape (tracks, nodes, rows, columns).
+
+    Cell (row, column) covers x_min + column * cell_size .. x_min + (column + 1) * cell_size and the
+    same for y; points outside the bounds or NaN are not counted. The counts are stored sparsely by
+    flat index into that shape (see counts); use colony, track_map or dense to get arrays.
+    """
+
+    kinds = ("time", "visits")
+
+    def __init__(self, bounds, cell_size, num_tracks, num_nodes, track_names=None):
+        self.bounds = tuple(float(b) for b in bounds)
+        self.cell_size = float(cell_size)
+        x_min, x_max, y_min, y_max = self.bounds
+        self.shape = (num_tracks, num_nodes,
+                      max(1, int(np.ceil((y_max - y_min) / cell_size))),
+                      max(1, int(np.ceil((x_max - x_min) / cell_size))))
+        self.track_names = track_names
+        # Compacted (sorted flat indices, int64 counts) of each kind, plus per-block increments not yet added
+        self._counts = {kind: (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)) for kind in self.kinds}
+        self._pending = {kind: [] for kind in self.kinds}
+        self.frames = 0
+        # Cell of every (node, track) when it was last seen, -1 if outside or never seen, to count visits across blocks
+        self.last_cell = np.full((num_nodes, num_tracks), -1, dtype=np.int64)
+
+    def edges(self):
+        """(x_edges, y_edges) of the grid, as for np.histogram2d."""
+        x_min, _, y_min, _ = self.bounds
+        rows, columns = self.shape[2:]
+        return x_min + self.cell_size * np.arange(columns + 1), y_min + self.cell_size * np.arange(rows + 1)
+
+    def extent(self):
+        """(x_min, x_max, y_min, y_max) covered by the grid, for plotting.draw_heatmap."""
+        x_edges, y_edges = self.edges()
+        return x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]
+
+    def cells(self, block):
+        """Flat cell index (row * columns + column) of every point of a block, (frames, nodes, tracks); -1 outside."""
+        x_min, _, y_min, _ = self.bounds
+        rows, columns = self.shape[2:]
+        with np.errstate(invalid="ignore"):
+            column = np.floor((block[:, :, 0, :] - x_min) / self.cell_size)
+            row = np.floor((block[:, :, 1, :] - y_min) / self.cell_size)
+            inside = (column >= 0) & (column < columns) & (row >= 0) & (row < rows)
+        return np.where(inside, row * columns + column, -1).astype(np.int64)
+
+    def update(self, block):
+        """Add the frames of the next block, shape (frames, nodes, 2, tracks), directly following the last one."""
+        if not len(block):
+            return
+        cell = self.cells(block)
+        # Carry the last cell seen over frames in which the point is missing
+        seen = np.concatenate([self.last_cell[None], cell])
+        present = np.concatenate([np.ones((1,) + cell.shape[1:], dtype=bool), ~np.isnan(block).any(axis=2)])
+        source = np.maximum.accumulate(np.where(present, np.arange(len(seen))[:, None, None], 0), axis=0)
+        seen = np.take_along_axis(seen, source, axis=0)
+        entered = (cell >= 0) & (cell != seen[:-1])
+        self.last_cell = seen[-1]
+        self.frames += len(block)
+
+        num_tracks, num_nodes, rows, columns = self.shape
+        # Offset of the (track, node) map that every point falls into
+        base = ((np.arange(num_tracks)[None, None, :] * num_nodes + np.arange(num_nodes)[None, :, None])
+                * rows * columns)
+        index = base + cell
+        for kind, mask in (("time", cell >= 0), ("visits", entered)):
+            touched, added = np.unique(index[mask], return_counts=True)
+            self.add(kind, touched, added)
+
+    def add(self, kind, index, counts):
+        """Add counts to the cells at the given flat indices into shape."""
+        pending = self._pending[kind]
+        pending.append((np.asarray(index, dtype=np.int64), np.asarray(counts, dtype=np.int64)))
+        # Compact once the increments outgrow the stored cells, so the work per frame stays constant
+        if sum(len(index) for index, _ in pending) > max(len(self._counts[kind][0]), 1 << 16):
+            self.counts(kind)
+
+    def counts(self, kind="time"):
+        """(flat indices into shape, counts) of the non-zero cells of one kind, indices sorted."""
+        pending = self._pending[kind]
+        if pending:
+            index, counts = self._counts[kind]
+            index = np.concatenate([index] + [i for i, _ in pending])
+            counts = np.concatenate([counts] + [c for _, c in pending])
+            index, inverse = np.unique(index, return_inverse=True)
+            counts = np.bincount(inverse.ravel(), weights=counts, minlength=len(index)).astype(np.int64)
+            self._counts[kind] = (index[counts > 0], counts[counts > 0])
+            pending.clear()
+        return self._counts[kind]
+
+    def merge(self, other):
+        """Add the counts of maps built on the same grid, e.g. another recording of the same arena."""
+        if other.bounds != self.bounds or other.cell_size != self.cell_size or other.shape != self.shape:
+            raise ValueError("Occupancy maps can only be merged on the same grid and number of tracks and nodes")
+        for kind in self.kinds:
+            self.add(kind, *other.counts(kind))
+        self.frames += other.frames
+        return self
+
+    def summed(self, kind="time", track=None, node=None):
+        """(rows, columns) sum of the maps of one track or all tracks, and one node or all nodes."""
+        _, num_nodes, rows, columns = self.shape
+        index, counts = self.counts(kind)
+        track_node, cell = np.divmod(index, rows * columns)
+        tracks, nodes = np.divmod(track_node, num_nodes)
+        keep = np.ones(len(index), dtype=bool)
+        if track is not None:
+            keep &= tracks == track
+        if node is not None:
+            keep &= nodes == node
+        summed = np.bincount(cell[keep], weights=counts[keep], minlength=rows * columns)
+        return summed.astype(np.int64).reshape(rows, columns)
+
+    def colony(self, kind="time", node=None):
+        """Map summed over all tracks, for one node or all nodes, shape (rows, columns)."""
+        return self.summed(kind, node=node)
+
+    def track_map(self, kind, track, node=None):
+        """Map of one track, for one node or summed over all nodes, shape (rows, columns)."""
+        return self.summed(kind, track, node)
+
+    def dense(self, kind="time", dtype=np.uint32):
+        """Full (tracks, nodes, rows, columns) array of one kind; refused if it exceeds memory.MEMORY_BUDGET."""
+        size = int(np.prod(self.shape)) * np.dtype(dtype).itemsize
+        if memory.MEMORY_BUDGET is not None and size > memory.MEMORY_BUDGET:
+            raise ValueError(f"Dense occupancy maps need {size} bytes, more than the memory budget of "
+                             f"{memory.MEMORY_BUDGET}; use colony, track_map or counts instead")
+        array = np.zeros(int(np.prod(self.shape)), dtype=dtype)
+        index, counts = self.counts(kind)
+        array[index] = counts
+        return array.reshape(self.shape)
+
+    def density(self, kind="time", node=None):
+        """Colony map normalized to sum to 1."""
+        counts = self.colony(kind, node).astype(np.float64)
+        total = counts.sum()
+        return counts / total if total else counts
+
+
+def occupancy_from_blocks(blocks, bounds, cell_size, num_tracks, num_nodes, track_names=None):
+    """Build OccupancyMaps from consecutive (start_frame, locations block) pairs."""
+    maps = OccupancyMaps(bounds, cell_size, num_tracks, num_nodes, track_names)
+    for _, block in blocks:
+        maps.update(block)
+    return maps
+
+
+def occupancy_from_locations(locations, bounds, cell_size=10, block_size=4096, track_names=None):
+    """Build OccupancyMaps from a locations array with shape (frames, nodes, coordinates, tracks)."""
+    blocks = ((start, locations[start:start + block_size]) for start in range(0, locations.shape[0], block_size))
+    return occupancy_from_blocks(blocks, bounds, cell_size, locations.shape[3], locations.shape[1], track_names)
+
+
+def occupancy_from_file(filename, cell_size=10, bounds=None, block_size=4096, depth=2):
+    """Build OccupancyMaps from a SLEAP file block by block, with bounds from cleaning.get_arena_bounds by default."""
+    with h5py.File(filename, "r") as f:
+        num_tracks, _, num_nodes, _ = f["tracks"].shape
+        track_names = [n.decode() for n in f["track_names"][:]]
+    if bounds is None:
+        bounds = get_arena_bounds(filename)
+    blocks = ((start, block["tracks"]) for start, block in prefetch_blocks(filename, block_size, depth))
+    return occupancy_from_blocks(blocks, bounds, cell_size, num_tracks, num_nodes, track_names)
+
+
+def save_occupancy(maps, filename):
+    """Save the maps compactly: flat index and counts of the non-zero cells only."""
+    (time_index, time), (visit_index, visits) = maps.counts("time"), maps.counts("visits")
+    occupied = np.union1d(time_index, visit_index)
+    columns = {}
+    for kind, index, counts in (("time", time_index, time), ("visits", visit_index, visits)):
+        columns[kind] = np.zeros(len(occupied), dtype=np.uint32)
+        columns[kind][np.searchsorted(occupied, index)] = counts
+    np.savez_compressed(
+        filename,
+        cells=occupied.astype(np.int64 if np.prod(maps.shape) > np.iinfo(np.int32).max else np.int32),
+        time=columns["time"],
+        visits=columns["visits"],
+        bounds=np.array(maps.bounds),
+        cell_size=maps.cell_size,
+        shape=np.array(maps.shape),
+        frames=maps.frames,
+        track_names=np.array(maps.track_names or [], dtype=str),
+    )
+
+
+def load_occupancy(filename):
+    """Load maps written by save_occupancy."""
+    with np.load(filename) as data:
+        num_tracks, num_nodes = (int(v) for v in data["shape"][:2])
+        track_names = [str(name) for name in data["track_names"]] or None
+        maps = OccupancyMaps(data["bounds"], float(data["cell_size"]), num_tracks, num_nodes, track_names)
+        for kind in maps.kinds:
+            counts = data[kind]
+            maps.add(kind, data["cells"][counts > 0], counts[counts > 0])
+        maps.frames = int(data["frames"])
+    return maps
@@ -0,0 +1,143 @@
+"""
+Multi-process execution without copying the data to every worker. The locations array and any
+derived-feature arrays are placed in multiprocessing.shared_memory once; workers attach to them by
+name and see them as ordinary numpy arrays. Work is split into shards (ranges of the active x passive
+pair list, or frame blocks) and the results are merged in shard order, so the output does not depend
+on the number of processes or on which worker finishes first.
+
+Example:
+    results = run_detectors_parallel(filled_locations, ["grooming", "proximity"], processes=8)
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import memory
+from contacts import all_pairs
+from pipeline import make_detector, run_detectors, sort_events
+
+_WORKER_ARRAYS = {}
+_WORKER_MEMORY = []
+
+
+def share_arrays(arrays):
+    """Copy arrays into new shared memory blocks.
+
+    Returns:
+    - tuple: (list of SharedMemory blocks to close and unlink later, descriptors for attach_arrays)
+    """
+    blocks, descriptors = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        descriptors[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, descriptors
+
+
+def attach_arrays(descriptors):
+    """Attach to shared arrays created by share_arrays. Returns (SharedMemory blocks, dict of arrays)."""
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in descriptors.items():
+        try:
+            # The creating process owns the block; workers must not unlink it on exit (Python 3.13+)
+            block = shared_memory.SharedMemory(name=block_name, track=False)
+        except TypeError:
+            block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+def _init_worker(descriptors, memory_budget):
+    # Spawned workers start with the module defaults; adopt the parent's budget and so its analysis dtype
+    memory.set_memory_budget(memory_budget)
+    blocks, arrays = attach_arrays(descriptors)
+    _WORKER_MEMORY.extend(blocks)
+    _WORKER_ARRAYS.update(arrays)
+
+
+def _run_task(task):
+    function, argument = task
+    return function(_WORKER_ARRAYS, argument)
+
+
+def run_sharded(function, arrays, shards, processes=None, start_method=None):
+    """Run function(arrays, shard) for every shard in a process pool with the arrays in shared memory.
+
+    Parameters:
+    - function: A module-level function (it is pickled) taking the dict of shared arrays and one shard.
+    - arrays (dict): Arrays to share, e.g. {"locations": filled_locations, "centroids": centroids}.
+    - shards (list): One picklable work description per task.
+    - processes (int): Number of worker processes (default: number of CPUs).
+    - start_method (str): multiprocessing start method; the platform default if None.
+
+    The workers use the memory budget of this process (memory.MEMORY_BUDGET), and with it the same
+    analysis dtype and block sizes, whatever the start method.
+
+    Returns:
+    - list: The result of every shard, in shard order.
+    """
+    blocks, descriptors = share_arrays(arrays)
+    try:
+        context = multiprocessing.get_context(start_method)
+        initargs = (descriptors, memory.MEMORY_BUDGET)
+        with context.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+            return pool.map(_run_task, [(function, shard) for shard in shards], chunksize=1)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def shard_pairs(num_pairs, num_shards):
+    """Split the pair indices 0 .. num_pairs - 1 into num_shards contiguous ranges."""
+    bounds = np.linspace(0, num_pairs, num_shards + 1).astype(int)
+    return [(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+def shard_frames(frame_count, block_size):
+    """Split the frames into (start, stop) blocks."""
+    return [(start, min(start + block_size, frame_count)) for start in range(0, frame_count, block_size)]
+
+
+def _detect_pair_shard(arrays, shard):
+    detectors, active, passive, block_size = shard
+    return run_detectors(arrays["locations"], detectors, block_size, pairs=(active, passive))
+
+
+def merge_detector_results(shard_results):
+    """Merge per-shard run_detectors results: event lists are concatenated and sorted, count matrices added."""
+    merged = {}
+    for results in shard_results:
+        for label, result in results.items():
+            if label not in merged:
+                merged[label] = result if not isinstance(result, list) else list(result)
+            elif isinstance(result, list):
+                merged[label].extend(result)
+            else:
+                merged[label] = merged[label] + result
+    for result in merged.values():
+        if isinstance(result, list):
+            sort_events(result)
+    return merged
+
+
+def run_detectors_parallel(locations, detectors, processes=None, num_shards=None, block_size=None, start_method=None):
+    """Run pipeline detectors with the active x passive pairs sharded across worker processes.
+
+    Per-termite detectors (e.g. self_grooming) do not depend on pairs and run with the first shard only.
+    The result equals run_detectors(locations, detectors).
+    """
+    processes = processes or multiprocessing.cpu_count()
+    num_shards = num_shards or 4 * processes
+    detectors = [make_detector(d) if isinstance(d, str) else d for d in detectors]
+    pair_detectors = [d for d in detectors if not getattr(d, "per_termite", False)]
+    active, passive = all_pairs(locations.shape[3])
+
+    shards = []
+    for index, (lo, hi) in enumerate(shard_pairs(len(active), num_shards)):
+        shard_detectors = detectors if index == 0 else pair_detectors
+        shards.append((shard_detectors, active[lo:hi], passive[lo:hi], block_size))
+    shard_results = run_sharded(_detect_pair_shard, {"locations": locations}, shards, processes, start_method)
+    return merge_detector_results(shard_results)
@@ -0,0 +1,559 @@
+"""
+Fused detector pipeline: every registered detector declares the per-block features it needs
+(pair distances, displacements, ...), the executor computes the union of those features once per
+frame block and hands the same block to all detectors. A detector only adds its own masking cost,
+not another pass over the locations array.
+
+Example:
+    results = run_detectors(filled_locations, ["grooming", "leader_follower",
+                                               make_detector("proximity", proximity_threshold=300)])
+    grooming_events = results["grooming"]
+"""
+import numpy as np
+from runlength import RunAccumulator
+from contacts import all_pairs, compile_contact_rules
+from memory import analysis_dtype, frame_block_size, feature_bytes_per_frame
+
+MANDIBLE_INDEX = 0
+THORAX_INDEX = 1
+ABDOMEN_INDEX = 2
+
+DETECTORS = {}
+
+
+def register_detector(name):
+    """Class decorator that adds a detector to the registry under the given name."""
+    def decorator(cls):
+        cls.name = name
+        DETECTORS[name] = cls
+        return cls
+    return decorator
+
+
+def make_detector(name, label=None, **params):
+    """Create a registered detector. The label (default: the name) keys its result in run_detectors."""
+    detector = DETECTORS[name](**params)
+    detector.label = label or name
+    return detector
+
+
+class FrameBlock:
+    """One block of frames and the features derived from it, computed once and shared by all detectors.
+
+    Feature keys:
+    - ("pair_offset", a, b): (frames, 2, pairs) vector from node a of the active to node b of the passive termite.
+    - ("pair_distance", a, b): (frames, pairs) length of that vector.
+    - ("pair_bearing", a, b): (frames, pairs) image-frame direction of that vector in degrees, 0 .. 360.
+    - ("segment", a, b): (frames, 2, termites) vector from node a to node b of each termite.
+    - ("displacement", n): (frames, 2, termites) movement of node n since the previous frame.
+    - ("speed", n): (frames, termites) length of that movement.
+
+    Detectors index pairs through block.active and block.passive. If the block only evaluates some of the
+    pairs the detectors were started with, pairs holds their indices in that pair list (see coarse.py).
+    """
+
+    def __init__(self, locations, offset, active, passive, previous=None, pairs=None):
+        self.locations = locations
+        self.offset = offset
+        self.active = active
+        self.passive = passive
+        self.previous = previous
+        self.pairs = pairs
+        self.features = {}
+
+    def __len__(self):
+        return self.locations.shape[0]
+
+    def __getitem__(self, key):
+        if key not in self.features:
+            self.features[key] = self._compute(key)
+        return self.features[key]
+
+    def prepare(self, keys):
+        for key in keys:
+            self[key]
+
+    def _compute(self, key):
+        kind = key[0]
+        if kind == "pair_offset":
+            _, a, b = key
+            return self.locations[:, b][:, :, self.passive] - self.locations[:, a][:, :, self.active]
+        if kind == "pair_distance":
+            _, a, b = key
+            return np.sqrt((self[("pair_offset", a, b)] ** 2).sum(axis=1))
+        if kind == "pair_bearing":
+            _, a, b = key
+            vector = self[("pair_offset", a, b)]
+            return np.degrees(np.arctan2(vector[:, 1], vector[:, 0])) % 360
+        if kind == "segment":
+            _, a, b = key
+            return self.locations[:, b] - self.locations[:, a]
+        if kind == "displacement":
+            _, node = key
+            points = self.locations[:, node]
+            if self.previous is None:
+                previous = np.full_like(points[:1], np.nan)
+            else:
+                previous = self.previous[None, node]
+            return np.diff(np.concatenate([previous, points]), axis=0)
+        if kind == "speed":
+            _, node = key
+            return np.sqrt((self[("displacement", node)] ** 2).sum(axis=1))
+        raise KeyError(f"Unknown feature {key!r}")
+
+
+class RunDetector:
+    """Base class for detectors that report runs of frames in which a per-column condition holds.
+
+    Subclasses set requires and implement mask(block). Columns are ordered pairs by default,
+    unordered pairs (active < passive) if unordered is True, or termites if per_termite is True.
+    Pairwise detectors can also implement reach() (see coarse.py).
+
+    With max_gap_frames > 0 the locations may contain NaN for missing points: a run continues across up
+    to max_gap_frames frames in which a required feature is NaN (see valid), so detection works on
+    unfilled tracks without splitting an event at every dropped point or bridging long absences.
+    """
+
+    requires = ()
+    unordered = False
+    per_termite = False
+    labelled = False
+
+    def __init__(self, min_duration_frames=1, max_gap_frames=0):
+        self.min_duration_frames = min_duration_frames
+        self.max_gap_frames = max_gap_frames
+        self.label = getattr(self, "name", type(self).__name__)
+
+    def start(self, num_termites, active, passive):
+        if self.per_termite:
+            self.columns = np.arange(num_termites)
+        elif self.unordered:
+            self.columns = np.flatnonzero(active < passive)
+        else:
+            self.columns = np.arange(len(active))
+        self.active, self.passive = active, passive
+        # Maps the termite axis of the blocks to the track indices reported in events
+        self.track_ids = np.arange(num_termites)
+        self.accumulator = RunAccumulator(len(self.columns), self.min_duration_frames, track_labels=self.labelled,
+                                          max_gap=self.max_gap_frames)
+
+    def reach(self):
+        """(pair_distance keys, distance) such that every event frame has one of these distances at most distance.
+
+        None if the detector has no such bound.
+        """
+        return None
+
+    def valid(self, block, keys=None):
+        """(frames, columns) mask of the frames in which none of the required features (or keys) is NaN."""
+        pair_missing = np.zeros((len(block), len(block.active)), dtype=bool)
+        termite_missing = np.zeros((len(block), block.locations.shape[3]), dtype=bool)
+        for key in self.requires if keys is None else keys:
+            missing = np.isnan(block[key])
+            if missing.ndim == 3:
+                missing = missing.any(axis=1)
+            if key[0].startswith("pair_"):
+                pair_missing |= missing
+            else:
+                termite_missing |= missing
+        if self.per_termite:
+            return ~termite_missing[:, self.columns]
+        missing = pair_missing | termite_missing[:, block.active] | termite_missing[:, block.passive]
+        return ~missing[:, block.active < block.passive] if self.unordered else ~missing
+
+    def block_columns(self, block):
+        """Accumulator columns of the mask columns of a block that holds a subset of the pairs, else None."""
+        if block.pairs is None or self.per_termite:
+            return None
+        if self.unordered:
+            return np.searchsorted(self.columns, block.pairs[block.active < block.passive])
+        return block.pairs
+
+    def process(self, block):
+        valid = self.valid(block) if self.max_gap_frames else None
+        mask, labels = self.mask(block) if self.labelled else (self.mask(block), None)
+        columns = self.block_columns(block)
+        if columns is not None:
+            # Pairs left out of the block have no event in it
+            mask, labels, valid = (None if values is None else _scatter(values, columns, self.accumulator.num_columns, fill)
+                                   for values, fill in ((mask, False), (labels, 0), (valid, True)))
+        self.accumulator.update(mask, block.offset, labels, valid=valid)
+
+    def finish(self):
+        runs = self.accumulator.finish()
+        columns, starts, ends = runs[:3]
+        columns = self.columns[columns]
+        if self.per_termite:
+            return [(int(c), int(s), int(e)) for c, s, e in zip(self.track_ids[columns], starts, ends)]
+        active, passive = self.track_ids[self.active[columns]], self.track_ids[self.passive[columns]]
+        if self.labelled:
+            return [(int(a), int(p), int(n), int(s), int(e))
+                    for a, p, n, s, e in zip(active, passive, runs[3], starts, ends)]
+        return [(int(a), int(p), int(s), int(e)) for a, p, s, e in zip(active, passive, starts, ends)]
+
+
+@register_detector("grooming")
+class GroomingDetector(RunDetector):
+    """Mandible of the active termite within [min_distance, max_distance] of the passive termite's abdomen (groom.py)."""
+
+    def __init__(self, min_distance=1, max_distance=50, min_duration_frames=45,
+                 mandible_index=MANDIBLE_INDEX, abdomen_index=ABDOMEN_INDEX, max_gap_frames=0):
+        super().__init__(min_duration_frames, max_gap_frames)
+        self.min_distance, self.max_distance = min_distance, max_distance
+        self.requires = [("pair_distance", mandible_index, abdomen_index)]
+
+    def reach(self):
+        return self.requires, self.max_distance
+
+    def mask(self, block):
+        distance = block[self.requires[0]]
+        return (distance >= self.min_distance) & (distance <= self.max_distance)
+
+
+@register_detector("proximity")
+class ProximityDetector(RunDetector):
+    """Mandible of the active termite near any node of the passive one, at an image-frame bearing in range (proximity.py).
+
+    Events are (active, passive, node, start_frame, end_frame), node being the first matching node at the start frame.
+    """
+
+    labelled = True
+
+    def __init__(self, proximity_threshold=400, min_angle=50, max_angle=130, min_duration_frames=60,
+                 num_nodes=3, mandible_index=MANDIBLE_INDEX, max_gap_frames=0):
+        super().__init__(min_duration_frames, max_gap_frames)
+        self.proximity_threshold, self.min_angle, self.max_angle = proximity_threshold, min_angle, max_angle
+        self.requires = [key for node in range(num_nodes)
+                         for key in (("pair_bearing", mandible_index, node), ("pair_distance", mandible_index, node))]
+
+    def reach(self):
+        return self.requires[1::2], self.proximity_threshold
+
+    def mask(self, block):
+        node_masks = []
+        for bearing_key, distance_key in zip(self.requires[::2], self.requires[1::2]):
+            angle = block[bearing_key]
+            node_masks.append((block[distance_key] < self.proximity_threshold) &
+                              (angle >= self.min_angle) & (angle <= self.max_angle))
+        node_masks = np.stack(node_masks)
+        return node_masks.any(axis=0), node_masks.argmax(axis=0)
+
+
+@register_detector("oriented_proximity")
+class OrientedProximityDetector(RunDetector):
+    """Active mandible near a passive node while the body axes cross at more than min_angle (interactions.py).
+
+    The distance threshold shrinks to twice the active termite's mandible-thorax length.
+    """
+
+    labelled = True
+
+    def __init__(self, proximity_threshold=400, min_angle=50, min_duration_frames=45, num_nodes=3,
+                 mandible_index=MANDIBLE_INDEX, thorax_index=THORAX_INDEX, max_gap_frames=0):
+        super().__init__(min_duration_frames, max_gap_frames)
+        self.proximity_threshold, self.min_angle = proximity_threshold, min_angle
+        self.num_nodes = num_nodes
+        self.body_key = ("segment", mandible_index, thorax_index)
+        self.distance_keys = [("pair_distance", mandible_index, node) for node in range(num_nodes)]
+        self.segment_keys = [("segment", node, (node + 1) % num_nodes) for node in range(num_nodes)]
+        self.requires = [self.body_key] + self.distance_keys + self.segment_keys
+
+    def reach(self):
+        return self.distance_keys, self.proximity_threshold
+
+    def mask(self, block):
+        body = block[self.body_key][:, :, block.active]
+        body_length = np.sqrt((body ** 2).sum(axis=1))
+        threshold = np.minimum(self.proximity_threshold, body_length * 2.0)
+
+        node_masks = []
+        for distance_key, segment_key in zip(self.distance_keys, self.segment_keys):
+            segment = block[segment_key][:, :, block.passive]
+            cosine = (body * segment).sum(axis=1) / (body_length * np.sqrt((segment ** 2).sum(axis=1)))
+            angle = np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+            node_masks.append((block[distance_key] < threshold) & (angle > self.min_angle))
+        node_masks = np.stack(node_masks)
+        return node_masks.any(axis=0), node_masks.argmax(axis=0)
+
+
+@register_detector("leader_follower")
+class LeaderFollowerDetector(RunDetector):
+    """Both termites moving in the same direction while their thoraxes are close (social_behaviors.py)."""
+
+    def __init__(self, proximity_threshold=1000, min_leader_frames=10, movement_threshold=1.0, node_index=THORAX_INDEX,
+                 max_gap_frames=0):
+        super().__init__(min_leader_frames, max_gap_frames)
+        self.proximity_threshold, self.movement_threshold = proximity_threshold, movement_threshold
+        self.requires = [("displacement", node_index), ("speed", node_index), ("pair_distance", node_index, node_index)]
+
+    def reach(self):
+        return self.requires[2:], self.proximity_threshold
+
+    def mask(self, block):
+        displacement, speed, distance = (block[key] for key in self.requires)
+        moving = speed > self.movement_threshold
+        same_direction = (displacement[:, :, block.active] * displacement[:, :, block.passive]).sum(axis=1) > 0
+        return (moving[:, block.active] & moving[:, block.passive] &
+                (distance < self.proximity_threshold) & same_direction)
+
+
+@register_detector("mutual_grooming")
+class MutualGroomingDetector(RunDetector):
+    """Thoraxes of two termites within distance_threshold, reported once per unordered pair (sosyal1.py)."""
+
+    unordered = True
+
+    def __init__(self, distance_threshold=500, min_duration_frames=60, node_index=THORAX_INDEX, max_gap_frames=0):
+        super().__init__(min_duration_frames, max_gap_frames)
+        self.distance_threshold = distance_threshold
+        self.requires = [("pair_distance", node_index, node_index)]
+
+    def reach(self):
+        return self.requires, self.distance_threshold
+
+    def mask(self, block):
+        return block[self.requires[0]][:, block.active < block.passive] <= self.distance_threshold
+
+
+@register_detector("self_grooming")
+class SelfGroomingDetector(RunDetector):
+    """Thorax of a termite moving more than min_movement per frame (sosyal1.py). Events are (termite, start, end)."""
+
+    per_termite = True
+
+    def __init__(self, min_movement=10, min_duration_frames=60, node_index=THORAX_INDEX, max_gap_frames=0):
+        super().__init__(min_duration_frames, max_gap_frames)
+        self.min_movement = min_movement
+        self.requires = [("speed", node_index)]
+
+    def mask(self, block):
+        return block[self.requires[0]] > self.min_movement
+
+
+@register_detector("node_contacts")
+class NodeContactDetector(RunDetector):
+    """Rule-based node contacts (contacts.py). Events are (rule_name, active, passive, start_frame, end_frame)."""
+
+    def __init__(self, node_names, rules, max_gap_frames=0):
+        super().__init__(max_gap_frames=max_gap_frames)
+        self.plan = compile_contact_rules(rules, node_names)
+        self.rule_keys = [[("pair_distance", self.plan["active_nodes"][a], self.plan["passive_nodes"][p])
+                           for a in self.plan["active"][rule] for p in self.plan["passive"][rule]]
+                          for rule in range(len(self.plan["names"]))]
+        self.requires = sorted({key for keys in self.rule_keys for key in keys})
+
+    def start(self, num_termites, active, passive):
+        super().start(num_termites, active, passive)
+        num_rules = len(self.plan["names"])
+        self.accumulator = RunAccumulator(num_rules * len(active), np.repeat(self.plan["min_frames"], len(active)),
+                                          max_gap=self.max_gap_frames)
+
+    def reach(self):
+        return self.requires, self.plan["max_distance"].max()
+
+    def block_columns(self, block):
+        if block.pairs is None:
+            return None
+        return (np.arange(len(self.plan["names"]))[:, None] * len(self.active) + block.pairs).ravel()
+
+    def valid(self, block, keys=None):
+        return np.concatenate([RunDetector.valid(self, block, rule_keys) for rule_keys in self.rule_keys], axis=1)
+
+    def mask(self, block):
+        masks = []
+        for rule, keys in enumerate(self.rule_keys):
+            distance = np.stack([block[key] for key in keys])
+            distance = np.where(np.isnan(distance), np.inf, distance).min(axis=0)
+            masks.append((distance >= self.plan["min_distance"][rule]) & (distance <= self.plan["max_distance"][rule]))
+        return np.concatenate(masks, axis=1)
+
+    def finish(self):
+        columns, starts, ends = self.accumulator.finish()
+        rule_ids, pair_ids = np.divmod(columns, len(self.active))
+        active, passive = self.track_ids[self.active], self.track_ids[self.passive]
+        return sort_events([(self.plan["names"][r], int(active[p]), int(passive[p]), int(s), int(e))
+                            for r, p, s, e in zip(rule_ids, pair_ids, starts, ends)])
+
+
+@register_detector("approach_retreat")
+class ApproachRetreatDetector(RunDetector):
+    """Approach, contact and retreat phases of each unordered pair, from the closing speed of two nodes.
+
+    The closing speed is the relative velocity of the two nodes projected onto their separation, positive
+    while they move toward each other, so it does not depend on how the termites face in the image.
+    Within approach_distance, a pair is in contact at or below contact_distance, and otherwise approaching
+    or retreating while the closing speed is at least min_closing_speed or at most -min_closing_speed.
+    Events are (phase, active, passive, start_frame, end_frame) with phase "approach", "contact" or "retreat".
+    """
+
+    unordered = True
+    phases = ("approach", "contact", "retreat")
+
+    def __init__(self, contact_distance=100, approach_distance=400, min_closing_speed=1.0, min_duration_frames=10,
+                 node_index=THORAX_INDEX, max_gap_frames=0):
+        super().__init__(min_duration_frames, max_gap_frames)
+        self.contact_distance, self.approach_distance = contact_distance, approach_distance
+        self.min_closing_speed = min_closing_speed
+        self.requires = [("pair_offset", node_index, node_index), ("pair_distance", node_index, node_index),
+                         ("displacement", node_index)]
+
+    def reach(self):
+        return self.requires[1:2], self.approach_distance
+
+    def start(self, num_termites, active, passive):
+        super().start(num_termites, active, passive)
+        self.accumulator = RunAccumulator(len(self.phases) * len(self.columns), self.min_duration_frames,
+                                          max_gap=self.max_gap_frames)
+
+    def closing_speed(self, block):
+        """(frames, pairs) rate at which the separation of the pair shrinks, in units per frame."""
+        offset_key, distance_key, displacement_key = self.requires
+        displacement = block[displacement_key]
+        relative = displacement[:, :, block.passive] - displacement[:, :, block.active]
+        distance = block[distance_key]
+        # Coincident nodes have no separation to project onto: no closing speed (NaN) in those frames
+        closing = np.full_like(distance, np.nan)
+        np.divide(-(relative * block[offset_key]).sum(axis=1), distance, out=closing, where=distance > 0)
+        return closing
+
+    def mask(self, block):
+        columns = block.active < block.passive
+        distance = block[self.requires[1]][:, columns]
+        closing = self.closing_speed(block)[:, columns]
+        near = distance <= self.approach_distance
+        contact = distance <= self.contact_distance
+        moving = near & ~contact
+        return np.concatenate([moving & (closing >= self.min_closing_speed), contact,
+                               moving & (closing <= -self.min_closing_speed)], axis=1)
+
+    def valid(self, block, keys=None):
+        return np.tile(super().valid(block, keys), (1, len(self.phases)))
+
+    def block_columns(self, block):
+        columns = super().block_columns(block)
+        if columns is None:
+            return None
+        return (np.arange(len(self.phases))[:, None] * len(self.columns) + columns).ravel()
+
+    def finish(self):
+        columns, starts, ends = self.accumulator.finish()
+        phases, pairs = np.divmod(columns, len(self.columns))
+        pairs = self.columns[pairs]
+        active, passive = self.track_ids[self.active[pairs]], self.track_ids[self.passive[pairs]]
+        return sort_events([(self.phases[phase], int(a), int(p), int(s), int(e))
+                            for phase, a, p, s, e in zip(phases, active, passive, starts, ends)])
+
+
+@register_detector("proximity_counts")
+class ProximityCountDetector:
+    """Number of frames in which the thoraxes of each pair are closer than proximity_threshold (sosyal1.analyze_proximity).
+
+    The result is a (termites, termites) matrix of frame counts.
+    """
+
+    def __init__(self, proximity_threshold=100, node_index=THORAX_INDEX):
+        self.proximity_threshold = proximity_threshold
+        self.requires = [("pair_distance", node_index, node_index)]
+        self.label = self.name
+
+    def reach(self):
+        return self.requires, self.proximity_threshold
+
+    def start(self, num_termites, active, passive):
+        self.active, self.passive = active, passive
+        self.counts = np.zeros((num_termites, num_termites))
+
+    def process(self, block):
+        frames_close = (block[self.requires[0]] < self.proximity_threshold).sum(axis=0)
+        self.counts[block.active, block.passive] += frames_close
+
+    def finish(self):
+        return self.counts
+
+
+def _scatter(values, columns, num_columns, fill):
+    full = np.full((values.shape[0], num_columns), fill, dtype=values.dtype)
+    full[:, columns] = values
+    return full
+
+
+def sort_events(events):
+    """Sort events in place by (rule name,) track pair and start frame, the order run_detectors reports them in."""
+    events.sort(key=lambda event: (event[:3] if isinstance(event[0], str) else event[:2]) + (event[-2],))
+    return events
+
+
+def run_detectors(locations, detectors, block_size=None, pairs=None, frame_offset=0, track_ids=None, validity=None,
+                  previous=None):
+    """Run several detectors in a single pass over the frame blocks of a locations array.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, termites).
+    - detectors (list): Detector names or detectors created with make_detector.
+    - block_size (int): Number of frames per block. By default it is derived from the memory budget (see memory.py).
+    - pairs (tuple): Optional (active, passive) index arrays restricting the pairs that are evaluated.
+    - frame_offset (int): Frame number of the first row of locations, for windows cut out of a recording.
+    - track_ids (numpy.array): Track index reported for each termite of locations, for windows holding a subset of tracks.
+    - validity (numpy.array): Optional (frames, nodes, termites) mask of observed points; the other points are
+      treated as missing (NaN). With the preprocess.py cache, ~cache["imputed"] runs the detectors on the raw
+      points of the filled locations; give the detectors max_gap_frames to bridge short gaps.
+    - previous (numpy.array): Optional (nodes, coordinates, termites) positions in the frame before the first row,
+      for windows cut out of a recording; displacement and speed of the first row are NaN without it.
+
+    Returns:
+    - dict: The result of each detector, keyed by its label.
+    """
+    frame_count, num_nodes, _, num_termites = locations.shape
+    detectors, active, passive, requires = start_detectors(detectors, num_termites, pairs, track_ids)
+    if block_size is None:
+        block_size = detector_block_size(requires, num_nodes, num_termites, len(active), reserved=locations.nbytes)
+    blocks = ((frame_offset + offset, locations[offset:offset + block_size])
+              for offset in range(0, frame_count, block_size))
+    if validity is not None:
+        blocks = ((offset, mask_missing(block, validity[offset - frame_offset:offset - frame_offset + len(block)]))
+                  for offset, block in blocks)
+    return process_blocks(blocks, detectors, active, passive, requires, previous)
+
+
+def mask_missing(locations, validity):
+    """Copy of a (frames, nodes, coordinates, termites) block with NaN wherever validity (frames, nodes, termites) is False."""
+    return np.where(np.asarray(validity, dtype=bool)[:, :, None, :], locations, np.nan).astype(locations.dtype, copy=False)
+
+
+def start_detectors(detectors, num_termites, pairs=None, track_ids=None):
+    """Create and start detectors. Returns (detectors, active, passive, union of the required features)."""
+    active, passive = all_pairs(num_termites) if pairs is None else (np.asarray(pairs[0]), np.asarray(pairs[1]))
+    detectors = [make_detector(d) if isinstance(d, str) else d for d in detectors]
+    requires = []
+    for detector in detectors:
+        detector.start(num_termites, active, passive)
+        if track_ids is not None:
+            detector.track_ids = np.asarray(track_ids)
+        requires.extend(key for key in detector.requires if key not in requires)
+    return detectors, active, passive, requires
+
+
+def detector_block_size(requires, num_nodes, num_termites, num_pairs, reserved=0):
+    """Frames per block for the given features under the memory budget (see memory.py)."""
+    bytes_per_frame = feature_bytes_per_frame(requires, num_nodes, num_termites, num_pairs,
+                                              np.dtype(analysis_dtype()).itemsize)
+    return frame_block_size(bytes_per_frame, reserved=reserved)
+
+
+def process_blocks(blocks, detectors, active, passive, requires, previous=None):
+    """Feed consecutive (frame_offset, locations block) pairs to started detectors and return their results.
+
+    The blocks may come from anywhere, e.g. slices of an array or a prefetching file reader (prefetch.py).
+    previous optionally holds the (nodes, coordinates, termites) positions in the frame before the first block.
+    """
+    dtype = analysis_dtype()
+    if previous is not None:
+        previous = np.asarray(previous, dtype=dtype)
+    for offset, locations in blocks:
+        locations = locations.astype(dtype, copy=False)
+        block = FrameBlock(locations, offset, active, passive, previous)
+        block.prepare(requires)
+        for detector in detectors:
+            detector.process(block)
+        previous = locations[-1]
+    return {detector.label: detector.finish() for detector in detectors}
@@ -0,0 +1,186 @@
+"""
+Batched figure rendering for batch runs. Every figure is drawn with a few collection artists instead
+of one artist per track or event: all track paths go into one LineCollection, each pair's events
+into one broken_barh row, all distance points into one scatter. Figures are built with the
+object-oriented matplotlib API on the Agg backend, so render_figures can draw them in worker processes.
+
+Example:
+    jobs = [(save_track_plot, dict(locations=filled_locations, output_path="7_3_dev_results.png", max_points=2000)),
+            (save_event_timeline, dict(events=grooming_events, output_path="7_3_dev_grooming.png"))]
+    render_figures(jobs, processes=4)
+"""
+import multiprocessing
+import numpy as np
+
+
+def decimate_tracks(points, max_points=None):
+    """Keep at most about max_points frames of a (frames, 2, tracks) array by taking every k-th frame."""
+    if max_points is None or len(points) <= max_points:
+        return points
+    step = -(-len(points) // max_points)
+    return points[::step]
+
+
+def track_paths(locations, node=0, max_points=None):
+    """
+    One (frames, 2) X/Y path per track for a LineCollection; NaN frames split a path into pieces.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, tracks).
+    - node (int): Node whose path is drawn.
+    - max_points (int): Optional decimation to about this many points per track.
+
+    Returns:
+    - tuple: (list of paths, indices of the tracks that have any point)
+    """
+    points = decimate_tracks(locations[:, node], max_points)
+    present = np.flatnonzero(~np.isnan(points).any(axis=1).all(axis=0))
+    return [points[:, :, track] for track in present], present
+
+
+def draw_tracks(ax, locations, node=0, max_points=None, cmap="tab20", linewidth=0.8):
+    """Draw the path of one node of every track as a single LineCollection."""
+    from matplotlib import colormaps
+    from matplotlib.collections import LineCollection
+
+    paths, tracks = track_paths(locations, node, max_points)
+    colormap = colormaps[cmap]
+    ax.add_collection(LineCollection(paths, colors=colormap(tracks % colormap.N), linewidths=linewidth))
+    ax.autoscale_view()
+    ax.set_xlabel("X position")
+    ax.set_ylabel("Y position")
+    return ax
+
+
+def draw_distance_scatter(ax, distances):
+    """Draw the total distance of each track as one scatter artist."""
+    names = list(distances)
+    ax.scatter(np.arange(len(names)), list(distances.values()), s=100)
+    ax.set_xticks(np.arange(len(names)))
+    ax.set_xticklabels(names, rotation=90)
+    ax.set_xlabel("Tracks")
+    ax.set_ylabel("Total Distance")
+    return ax
+
+
+def event_row(event):
+    """Timeline row of an event: its (rule or phase,) track pair, or its termite for per-termite events."""
+    if len(event) == 3:
+        return event[:1]
+    return event[:3] if isinstance(event[0], str) else event[:2]
+
+
+def draw_event_timeline(ax, events, height=0.8):
+    """Draw detector events as a timeline with one broken_barh row per track pair.
+
+    Events are the tuples returned by the detectors, ending with (start_frame, end_frame). Rows are the
+    (active, passive) pair, prefixed by the rule or phase name for node_contacts and approach_retreat,
+    or the termite for per-termite events, and are sorted by those fields.
+    """
+    rows = {}
+    for event in events:
+        rows.setdefault(event_row(event), []).append((event[-2], event[-1] - event[-2] + 1))
+    keys = sorted(rows)
+    labels = ["-".join(str(part) for part in key) for key in keys]
+    for row, key in enumerate(keys):
+        ax.broken_barh(rows[key], (row - height / 2, height))
+    ax.set_yticks(np.arange(len(labels)))
+    ax.set_yticklabels(labels)
+    ax.set_ylim(-1, len(labels))
+    ax.grid(True)
+    return ax
+
+
+def draw_heatmap(ax, counts, extent, cmap="magma", log=True):
+    """Draw an occupancy map (occupancy.py) over its grid extent (x_min, x_max, y_min, y_max).
+
+    The color scale is logarithmic by default, with empty cells left blank.
+    """
+    from matplotlib.colors import LogNorm
+
+    masked = np.ma.masked_less_equal(counts, 0) if log else counts
+    image = ax.imshow(masked, origin="lower", extent=extent, cmap=cmap,
+                      norm=LogNorm() if log else None, interpolation="nearest")
+    ax.set_xlabel("X position")
+    ax.set_ylabel("Y position")
+    ax.figure.colorbar(image, ax=ax)
+    return ax
+
+
+def _agg_figure(figsize):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def _save(figure, output_path):
+    figure.tight_layout(rect=[0, 0.03, 1, 1])
+    figure.savefig(output_path)
+    return output_path
+
+
+def save_track_plot(locations, output_path, title=None, node=0, max_points=None):
+    """Save the tracks of one node of every termite to an image file."""
+    figure = _agg_figure((10, 8))
+    ax = draw_tracks(figure.add_subplot(), locations, node, max_points)
+    ax.set_title(title or "Tracks")
+    return _save(figure, output_path)
+
+
+def save_distance_scatter(distances, output_path, title=None):
+    """Save a scatter plot of the total distance traveled by each track."""
+    figure = _agg_figure((10, 8))
+    ax = draw_distance_scatter(figure.add_subplot(), distances)
+    ax.set_title(title or "Total Distance Traveled by Each Track")
+    return _save(figure, output_path)
+
+
+def save_event_timeline(events, output_path, title=None):
+    """Save an event timeline (see draw_event_timeline) to an image file."""
+    figure = _agg_figure((15, 10))
+    ax = draw_event_timeline(figure.add_subplot(), events)
+    ax.set_title(title or "Event timeline")
+    ax.set_xlabel("Frame")
+    ax.set_ylabel("Track pairs")
+    return _save(figure, output_path)
+
+
+def save_heatmap(counts, extent, output_path, title=None, log=True):
+    """Save an occupancy map to an image file, e.g. save_heatmap(maps.colony(), maps.extent(), "colony.png")."""
+    figure = _agg_figure((10, 8))
+    ax = draw_heatmap(figure.add_subplot(), counts, extent, log=log)
+    ax.set_title(title or "Occupancy")
+    return _save(figure, output_path)
+
+
+def _use_agg():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render(job):
+    function, kwargs = job
+    return function(**kwargs)
+
+
+def render_figures(jobs, processes=None, start_method=None):
+    """
+    Render figures in worker processes on the Agg backend.
+
+    Parameters:
+    - jobs (list): (function, kwargs) tuples, e.g. (save_track_plot, dict(locations=..., output_path=...)).
+      The function must be defined at module level so it can be sent to a worker.
+    - processes (int): Number of worker processes (default: number of CPUs); 1 renders in this process.
+    - start_method (str): multiprocessing start method; the platform default if None.
+
+    Returns:
+    - list: The return value of every job (the output paths for the save_* functions), in job order.
+    """
+    if processes == 1:
+        return [_render(job) for job in jobs]
+    context = multiprocessing.get_context(start_method)
+    with context.Pool(processes, initializer=_use_agg) as pool:
+        return pool.map(_render, jobs, chunksize=1)
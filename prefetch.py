@@ -0,0 +1,170 @@
+"""
+Background-thread prefetching. While the current frame block (or file) is being analysed, the next
+ones are already read on a separate thread, so slow storage such as network shares stalls the
+analysis only when reading is slower than computing. PrefetchStats records how long the consumer
+actually waited (stall time) next to the total read time.
+
+Example:
+    stats = PrefetchStats()
+    results = run_detectors_streaming("7_3_dev.h5", ["grooming"], depth=2, stats=stats)
+    print(stats.report())
+"""
+import queue
+import threading
+import time
+import h5py
+from memory import analysis_dtype
+from pipeline import detector_block_size, process_blocks, start_detectors
+
+_DONE = object()
+
+
+class PrefetchStats:
+    """Counters filled in by prefetch: items read, seconds spent reading, seconds the consumer waited."""
+
+    def __init__(self):
+        self.items = 0
+        self.read_seconds = 0.0
+        self.stall_seconds = 0.0
+
+    def report(self):
+        return {"items": self.items, "read_s": round(self.read_seconds, 3), "stall_s": round(self.stall_seconds, 3)}
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def _produce(items, buffer, stop, stats):
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            stats.read_seconds += time.perf_counter() - start
+            stats.items += 1
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+    except Exception as error:
+        buffer.put(_Failure(error))
+    finally:
+        items.close()
+        buffer.put(_DONE)
+
+
+def prefetch(items, depth=2, stats=None):
+    """
+    Iterate over items while a background thread reads up to depth items ahead.
+
+    Parameters:
+    - items: A generator that does the reading, e.g. one that slices an h5py dataset.
+    - depth (int): Number of items read ahead; 0 reads synchronously in the calling thread.
+    - stats (PrefetchStats): Optional counters for read and stall time.
+
+    Yields:
+    - The items, in order. An exception raised while reading is re-raised here.
+    """
+    stats = stats if stats is not None else PrefetchStats()
+    if depth <= 0:
+        # Without prefetching every read is a stall
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                elapsed = time.perf_counter() - start
+                stats.read_seconds += elapsed
+                stats.stall_seconds += elapsed
+                stats.items += 1
+                yield item
+        finally:
+            items.close()
+
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    thread = threading.Thread(target=_produce, args=(items, buffer, stop, stats), daemon=True)
+    thread.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            item = buffer.get()
+            stats.stall_seconds += time.perf_counter() - start
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # The consumer may stop early; let the reader finish its current item and exit
+        stop.set()
+        while thread.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+
+
+def read_frame_blocks(filename, block_size=4096, datasets=("tracks",), dtype=None):
+    """Generator of (start_frame, {name: frame-major block}) read from a SLEAP file one block at a time.
+
+    "tracks" blocks have shape (frames, nodes, 2, tracks) like load_h5_data; "point_scores" blocks
+    (frames, nodes, tracks) and "instance_scores" / "tracking_scores" blocks (frames, tracks).
+    """
+    dtype = dtype or analysis_dtype()
+    with h5py.File(filename, "r") as f:
+        frame_count = f["tracks"].shape[-1]
+        for start in range(0, frame_count, block_size):
+            stop = min(start + block_size, frame_count)
+            yield start, {name: f[name][..., start:stop].T.astype(dtype) for name in datasets}
+
+
+def prefetch_blocks(filename, block_size=4096, depth=2, datasets=("tracks",), dtype=None, stats=None):
+    """Frame blocks of a SLEAP file (see read_frame_blocks), read depth blocks ahead on a background thread."""
+    return prefetch(read_frame_blocks(filename, block_size, datasets, dtype), depth, stats)
+
+
+def prefetch_files(filenames, load, depth=1, stats=None):
+    """Yield (filename, load(filename)) for a batch of files, loading the next ones on a background thread.
+
+    Example:
+        for filename, data in prefetch_files(paths, load_h5_data):
+            frame_count, node_count, instance_count, locations, track_names, node_names = data
+    """
+    return prefetch(((filename, load(filename)) for filename in filenames), depth, stats)
+
+
+def run_detectors_streaming(filename, detectors, block_size=None, depth=2, pairs=None, stats=None):
+    """
+    Run pipeline detectors on the tracks of a SLEAP file without loading it, reading blocks ahead.
+
+    The blocks are analysed as stored, so clean and fill the file first (or use the preprocess.py cache
+    with run_detectors) if the detectors need gap-free tracks.
+
+    Parameters:
+    - filename (str): Path to the .h5 file.
+    - detectors (list): Detector names or detectors created with make_detector.
+    - block_size (int): Frames per block; by default derived from the memory budget.
+    - depth (int): Number of blocks read ahead.
+    - pairs (tuple): Optional (active, passive) index arrays, see pipeline.run_detectors.
+    - stats (PrefetchStats): Optional counters for read and stall time.
+
+    Returns:
+    - dict: The result of each detector, keyed by its label.
+    """
+    with h5py.File(filename, "r") as f:
+        num_tracks, _, num_nodes, _ = f["tracks"].shape
+    detectors, active, passive, requires = start_detectors(detectors, num_tracks, pairs)
+    if block_size is None:
+        block_size = detector_block_size(requires, num_nodes, num_tracks, len(active))
+    blocks = ((start, block["tracks"]) for start, block in prefetch_blocks(filename, block_size, depth, stats=stats))
+    return process_blocks(blocks, detectors, active, passive, requires)
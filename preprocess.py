@@ -0,0 +1,157 @@
+"""
+Analysis-ready cache of a SLEAP file. Loading, cleaning and filling a recording is done once and the
+result is written next to the .h5 file as a directory of .npy files:
+
+- locations.npy: cleaned and filled float32 locations, (frames, nodes, 2, tracks), frame-major so any
+  frame window is one contiguous slice of the file
+- imputed.npy: (frames, nodes, tracks) True where fill_missing supplied the point
+- speed.npy: (frames, nodes, tracks) float32 distance moved by every node since the previous frame
+- meta.json: size and modification time of the source file, the cleaning parameters and the names, and
+  what the cleaning did: the arena bounds it applied, whether they were given or estimated, and the number
+  of points it removed by each check
+
+Later runs memory-map the arrays instead of repeating the work. The cache is rebuilt automatically
+when the source file or the cleaning parameters change.
+
+Example:
+    frame_count, node_count, instance_count, filled_locations, track_names, node_names = load_preprocessed("7_3_dev.h5")
+"""
+import json
+import os
+import shutil
+import numpy as np
+from cleaning import DEFAULT_LENGTH_RANGE, DEFAULT_MAX_SPEED, clean_tracks, print_report
+from fillmissing import fill_missing
+from loadh5 import load_h5_data
+
+CACHE_VERSION = 1
+CACHE_ARRAYS = ("locations", "imputed", "speed")
+
+
+def cache_directory(filename):
+    """Default cache location: a '<filename>.cache' directory next to the source file."""
+    return filename + ".cache"
+
+
+def cache_key(filename, bounds=None, max_speed=DEFAULT_MAX_SPEED, length_range=DEFAULT_LENGTH_RANGE):
+    """Everything the cached arrays depend on; the cache is only used while this matches meta.json."""
+    stat = os.stat(filename)
+    return {
+        "version": CACHE_VERSION,
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "bounds": None if bounds is None else [float(b) for b in bounds],
+        "max_speed": None if max_speed is None else float(max_speed),
+        "length_range": None if length_range is None else [float(r) for r in length_range],
+    }
+
+
+def read_meta(directory):
+    """The meta.json of a cache directory, or None if there is no complete cache."""
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def node_speeds(locations, block_size=4096):
+    """Distance moved by every node since the previous frame, (frames, nodes, tracks); NaN in the first frame."""
+    frame_count = locations.shape[0]
+    speed = np.full((frame_count,) + locations.shape[1:2] + locations.shape[3:], np.nan, dtype=np.float32)
+    for start in range(1, frame_count, block_size):
+        stop = min(start + block_size, frame_count)
+        step = locations[start:stop] - locations[start - 1:stop - 1]
+        speed[start:stop] = np.sqrt((step ** 2).sum(axis=2))
+    return speed
+
+
+def build_cache(filename, directory=None, bounds=None, max_speed=DEFAULT_MAX_SPEED,
+                length_range=DEFAULT_LENGTH_RANGE, block_size=4096):
+    """
+    Load, clean and fill a SLEAP file and write the result to a cache directory.
+
+    Parameters:
+    - filename (str): Path to the .h5 file.
+    - directory (str): Cache directory; defaults to cache_directory(filename).
+    - bounds, max_speed, length_range: Cleaning parameters, see cleaning.clean_tracks.
+    - block_size (int): Number of frames processed and written together.
+
+    Returns:
+    - str: The cache directory.
+    """
+    directory = directory or cache_directory(filename)
+    key = cache_key(filename, bounds, max_speed, length_range)
+    frame_count, node_count, instance_count, locations, track_names, node_names = load_h5_data(filename, np.float32)
+
+    cleaned, report = clean_tracks(locations, bounds=bounds, max_speed=max_speed, length_range=length_range,
+                                   block_size=block_size, inplace=True)
+    print_report(report)
+    missing = np.isnan(cleaned[:, :, 0, :])
+    filled = fill_missing(cleaned)
+
+    # meta.json is written last, so an interrupted build is never mistaken for a valid cache
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    arrays = {
+        "locations": filled,
+        "imputed": missing & ~np.isnan(filled[:, :, 0, :]),
+        "speed": node_speeds(filled, block_size),
+    }
+    for name, array in arrays.items():
+        out = np.lib.format.open_memmap(os.path.join(directory, name + ".npy"), mode="w+",
+                                        dtype=array.dtype, shape=array.shape)
+        for start in range(0, frame_count, block_size):
+            out[start:start + block_size] = array[start:start + block_size]
+        out.flush()
+        del out
+
+    meta = dict(key, frame_count=frame_count, node_count=node_count, instance_count=instance_count,
+                track_names=track_names, node_names=node_names,
+                cleaning={"bounds": list(report["bounds"]), "bounds_source": report["bounds_source"],
+                          "counts": report["counts"]})
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=1)
+    return directory
+
+
+def load_cache(filename, directory=None, bounds=None, max_speed=DEFAULT_MAX_SPEED,
+               length_range=DEFAULT_LENGTH_RANGE, mmap_mode="r", rebuild=True):
+    """
+    Memory-map the cached arrays of a SLEAP file, building the cache first if it is missing or stale.
+
+    Parameters:
+    - filename (str): Path to the .h5 file.
+    - directory (str): Cache directory; defaults to cache_directory(filename).
+    - bounds, max_speed, length_range: Cleaning parameters, see cleaning.clean_tracks.
+    - mmap_mode (str): numpy memmap mode; "c" gives arrays that can be modified without touching the cache.
+    - rebuild (bool): Build a missing or stale cache; if False, return None instead.
+
+    Returns:
+    - dict: The arrays "locations", "imputed" and "speed", and "meta" with the names and counts.
+    """
+    directory = directory or cache_directory(filename)
+    key = cache_key(filename, bounds, max_speed, length_range)
+    meta = read_meta(directory)
+    if meta is None or any(meta.get(name) != value for name, value in key.items()):
+        if not rebuild:
+            return None
+        print("Building preprocessed cache:", directory)
+        build_cache(filename, directory, bounds, max_speed, length_range)
+        meta = read_meta(directory)
+
+    cache = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode) for name in CACHE_ARRAYS}
+    cache["meta"] = meta
+    return cache
+
+
+def load_preprocessed(filename, **options):
+    """Drop-in replacement for load_h5_data -> clean_and_validate_data -> fill_missing, served from the cache.
+
+    Returns the same tuple as load_h5_data, with the cleaned and filled locations. Options are passed to load_cache.
+    """
+    cache = load_cache(filename, **options)
+    meta = cache["meta"]
+    return (meta["frame_count"], meta["node_count"], meta["instance_count"], cache["locations"],
+            meta["track_names"], meta["node_names"])
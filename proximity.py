@@ -1,6 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
 
 def calculate_distance(point1, point2):
     """Calculate the Euclidean distance between two points in pixels."""
@@ -0,0 +1,162 @@
+"""
+Ragged track representation: most SLEAP track slots exist for only part of a recording, so each track
+is stored as one segment covering its lifespan (first to last occupied frame) instead of a full-length
+slot full of NaN. Pairwise detectors then only visit the frames in which both tracks exist.
+
+Example:
+    ragged = load_ragged("h5try/7_3_dev.h5")
+    ragged.fill_missing()
+    results = run_ragged_detectors(ragged, ["grooming", "leader_follower"])
+"""
+import copy
+import h5py
+import numpy as np
+from fillmissing import fill_missing
+from memory import analysis_dtype
+from pipeline import RunDetector, make_detector, run_detectors, sort_events
+
+
+class RaggedTracks:
+    """Per-track segments concatenated along the frame axis.
+
+    Attributes:
+    - values (numpy.array): (total segment frames, nodes, 2) coordinates of all segments, track after track.
+    - starts (numpy.array): First frame of each track's segment.
+    - lengths (numpy.array): Number of frames of each segment (0 for tracks that never occur).
+    - offsets (numpy.array): Position of each segment in values; segment t is values[offsets[t]:offsets[t + 1]].
+    """
+
+    def __init__(self, values, starts, lengths, frame_count, track_names=None):
+        self.values = values
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+        self.frame_count = frame_count
+        self.track_names = track_names
+
+    @property
+    def ends(self):
+        """Last frame of each track's segment (start - 1 for empty tracks)."""
+        return self.starts + self.lengths - 1
+
+    @property
+    def num_tracks(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_locations(cls, locations, occupancy=None, track_names=None):
+        """Build from a (frames, nodes, 2, tracks) array; occupancy defaults to the frames with any non-NaN point."""
+        if occupancy is None:
+            occupancy = ~np.isnan(locations).all(axis=(1, 2))
+        starts, lengths = lifespans(occupancy)
+        values = np.concatenate([locations[s:s + n, :, :, t] for t, (s, n) in enumerate(zip(starts, lengths))])
+        return cls(values, starts, lengths, locations.shape[0], track_names)
+
+    def segment(self, track):
+        """View of the (frames, nodes, 2) segment of one track."""
+        return self.values[self.offsets[track]:self.offsets[track + 1]]
+
+    def window(self, tracks, first, last):
+        """Dense (frames, nodes, 2, len(tracks)) array of the given tracks for frames first..last, which all of them cover."""
+        return np.stack([self.segment(t)[first - self.starts[t]:last - self.starts[t] + 1] for t in tracks], axis=-1)
+
+    def previous_frame(self, tracks, first):
+        """(nodes, 2, len(tracks)) positions of the given tracks in frame first - 1; NaN for tracks that start later."""
+        previous = np.full(self.values.shape[1:] + (len(tracks),), np.nan, dtype=self.values.dtype)
+        for column, track in enumerate(tracks):
+            if self.starts[track] < first <= self.ends[track] + 1:
+                previous[:, :, column] = self.segment(track)[first - 1 - self.starts[track]]
+        return previous
+
+    def to_locations(self):
+        """Expand back to the dense (frames, nodes, 2, tracks) array, NaN outside the segments."""
+        locations = np.full((self.frame_count,) + self.values.shape[1:] + (self.num_tracks,), np.nan,
+                            dtype=self.values.dtype)
+        for track in range(self.num_tracks):
+            locations[self.starts[track]:self.ends[track] + 1, :, :, track] = self.segment(track)
+        return locations
+
+    def fill_missing(self, kind="linear"):
+        """Interpolate missing points inside each segment, in place. Frames outside a track's lifespan stay absent."""
+        for track in np.flatnonzero(self.lengths > 1):
+            self.values[self.offsets[track]:self.offsets[track + 1]] = fill_missing(self.segment(track), kind=kind)
+        return self
+
+    def co_present_pairs(self):
+        """Unordered pairs of tracks whose lifespans overlap.
+
+        Returns:
+        - tuple: (track_a, track_b, first_frame, last_frame) arrays with track_a < track_b.
+        """
+        ends = self.ends
+        first = np.maximum(self.starts[:, None], self.starts[None, :])
+        last = np.minimum(ends[:, None], ends[None, :])
+        upper = np.triu(np.ones((self.num_tracks, self.num_tracks), dtype=bool), k=1)
+        track_a, track_b = np.nonzero(upper & (first <= last))
+        return track_a, track_b, first[track_a, track_b], last[track_a, track_b]
+
+
+def lifespans(occupancy):
+    """First occupied frame and lifespan length of every track of a (frames, tracks) occupancy array."""
+    occupancy = np.asarray(occupancy, dtype=bool)
+    occupied = occupancy.any(axis=0)
+    first = occupancy.argmax(axis=0)
+    last = occupancy.shape[0] - 1 - occupancy[::-1].argmax(axis=0)
+    lengths = np.where(occupied, last - first + 1, 0)
+    return np.where(occupied, first, 0), lengths
+
+
+def load_ragged(filename, dtype=None):
+    """Load a SLEAP analysis file as RaggedTracks, reading only the occupied frames of each track slot."""
+    if dtype is None:
+        dtype = analysis_dtype()
+    with h5py.File(filename, "r") as f:
+        track_names = [n.decode() for n in f["track_names"][:]]
+        starts, lengths = lifespans(f["track_occupancy"][:])
+        tracks = f["tracks"]
+        values = np.empty((lengths.sum(), tracks.shape[2], 2), dtype=dtype)
+        position = 0
+        for track, (start, length) in enumerate(zip(starts, lengths)):
+            if length:
+                values[position:position + length] = tracks[track, :, :, start:start + length].T
+                position += length
+        frame_count = tracks.shape[3]
+    return RaggedTracks(values, starts, lengths, frame_count, track_names)
+
+
+def run_ragged_detectors(ragged, detectors, block_size=None):
+    """Run pairwise detectors on the co-presence window of every pair of tracks.
+
+    The cost is proportional to the frames in which two tracks actually exist together, not to
+    frames x track slots squared. Pairs with the same window (e.g. all pairs of tracks that span the
+    whole recording) are evaluated together in one run_detectors call. Every window is seeded with the
+    frame before it, so displacement and speed match a run on the dense locations. Only pairwise run
+    detectors are supported.
+
+    Returns:
+    - dict: Events of each detector keyed by its label, sorted like run_detectors' output.
+    """
+    detectors = [make_detector(d) if isinstance(d, str) else d for d in detectors]
+    for detector in detectors:
+        if not isinstance(detector, RunDetector) or detector.per_termite:
+            raise ValueError(f"Detector {detector.label!r} is not a pairwise run detector")
+
+    track_a, track_b, first, last = ragged.co_present_pairs()
+    windows, group = np.unique(np.stack([first, last], axis=1), axis=0, return_inverse=True)
+    group = group.ravel()
+    results = {detector.label: [] for detector in detectors}
+    for index, (window_first, window_last) in enumerate(windows):
+        members = group == index
+        tracks, local = np.unique(np.concatenate([track_a[members], track_b[members]]), return_inverse=True)
+        local_a, local_b = np.split(local, 2)
+        window_results = run_detectors(ragged.window(tracks, window_first, window_last),
+                                       [copy.copy(d) for d in detectors], block_size,
+                                       pairs=(np.concatenate([local_a, local_b]), np.concatenate([local_b, local_a])),
+                                       frame_offset=int(window_first), track_ids=tracks,
+                                       previous=ragged.previous_frame(tracks, window_first))
+        for label, events in window_results.items():
+            results[label].extend(events)
+
+    for events in results.values():
+        sort_events(events)
+    return results
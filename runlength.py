@@ -0,0 +1,205 @@
+import numpy as np
+
+
+def find_runs(mask, min_length=1, max_gap=0, valid=None):
+    """Find runs of True frames in every column of a boolean mask.
+
+    Parameters:
+    - mask (numpy.array): Boolean array with shape (frames,) or (frames, columns).
+    - min_length (int or numpy.array): Minimum run length, either global or one value per column.
+    - max_gap (int): Merge runs that are separated by at most max_gap frames in which valid is False.
+    - valid (numpy.array): Boolean array like mask, False where the condition could not be evaluated
+      (missing points). Only used with max_gap; every frame is valid by default.
+
+    Returns:
+    - tuple: (columns, start_frames, end_frames) arrays, sorted by column and start frame. End frames are inclusive.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if mask.ndim == 1:
+        mask = mask[:, None]
+        valid = None if valid is None else np.asarray(valid)[:, None]
+    frame_count, num_columns = mask.shape
+    if max_gap:
+        accumulator = RunAccumulator(num_columns, min_length, max_gap=max_gap)
+        accumulator.update(mask, 0, valid=valid)
+        return accumulator.finish()
+
+    padded = np.zeros((frame_count + 2, num_columns), dtype=np.int8)
+    padded[1:-1] = mask
+    edges = np.diff(padded, axis=0).T
+    columns, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    ends = ends - 1
+
+    min_length = np.broadcast_to(np.asarray(min_length), (num_columns,))
+    keep = (ends - starts + 1) >= min_length[columns]
+    return columns[keep], starts[keep], ends[keep]
+
+
+class RunAccumulator:
+    """Collect runs of True frames from a mask that arrives in consecutive frame blocks.
+
+    Runs that touch the end of a block are kept open and continued by the next block, so the
+    result is identical to calling find_runs on the whole mask at once. With track_labels=True,
+    update also takes an integer label per mask cell and every run reports the label of its first frame.
+
+    With max_gap > 0, two runs of a column are merged when the frames between them are at most max_gap
+    and all invalid (see update), so a few dropped points do not split an event. The merged run spans
+    the gap, and min_length applies to the merged run.
+    """
+
+    def __init__(self, num_columns, min_length=1, track_labels=False, max_gap=0):
+        self.num_columns = num_columns
+        self.min_length = np.broadcast_to(np.asarray(min_length), (num_columns,))
+        self.track_labels = track_labels
+        self.max_gap = max_gap
+        self.open_start = np.full(num_columns, -1, dtype=np.int64)
+        self.open_label = np.zeros(num_columns, dtype=np.int64)
+        self.next_frame = 0
+        self._columns, self._starts, self._ends, self._labels = [], [], [], []
+
+        # Gap tolerance: number of valid frames seen so far per column. Two runs can only merge if this
+        # count is the same at the end of the first and the start of the second run. The last closed run
+        # of each column stays pending until it is clear that no later run merges into it.
+        self.valid_total = np.zeros(num_columns, dtype=np.int64)
+        self.open_valid_before = np.zeros(num_columns, dtype=np.int64)
+        self.pending_start = np.full(num_columns, -1, dtype=np.int64)
+        self.pending_end = np.zeros(num_columns, dtype=np.int64)
+        self.pending_label = np.zeros(num_columns, dtype=np.int64)
+        self.pending_valid_end = np.zeros(num_columns, dtype=np.int64)
+
+    def _store(self, columns, starts, ends, labels):
+        # Closed runs are final, so short ones are dropped right away instead of piling up
+        keep = (np.asarray(ends) - np.asarray(starts) + 1) >= self.min_length[columns]
+        columns, starts, ends, labels = (np.asarray(a)[keep] for a in (columns, starts, ends, labels))
+        if len(columns):
+            self._columns.append(np.asarray(columns, dtype=np.int64))
+            self._starts.append(np.asarray(starts, dtype=np.int64))
+            self._ends.append(np.asarray(ends, dtype=np.int64))
+            self._labels.append(np.asarray(labels, dtype=np.int64))
+
+    def _emit(self, columns, starts, ends, labels, valid_before=None, valid_end=None):
+        if not self.max_gap:
+            self._store(columns, starts, ends, labels)
+            return
+        if not len(columns):
+            return
+        columns, starts, ends, labels, valid_before, valid_end = (
+            np.asarray(a, dtype=np.int64) for a in (columns, starts, ends, labels, valid_before, valid_end))
+
+        # Put the pending run of each column in front of its new runs
+        pending = np.unique(columns)
+        pending = pending[self.pending_start[pending] >= 0]
+        columns = np.concatenate([pending, columns])
+        starts = np.concatenate([self.pending_start[pending], starts])
+        ends = np.concatenate([self.pending_end[pending], ends])
+        labels = np.concatenate([self.pending_label[pending], labels])
+        # The pending run ended before every new run, so its valid count at the start does not matter
+        valid_before = np.concatenate([np.zeros(len(pending), dtype=np.int64), valid_before])
+        valid_end = np.concatenate([self.pending_valid_end[pending], valid_end])
+        order = np.lexsort((starts, columns))
+        columns, starts, ends, labels, valid_before, valid_end = (
+            a[order] for a in (columns, starts, ends, labels, valid_before, valid_end))
+
+        joins = ((columns[1:] == columns[:-1]) & (starts[1:] - ends[:-1] - 1 <= self.max_gap) &
+                 (valid_before[1:] == valid_end[:-1]))
+        first = np.flatnonzero(np.concatenate([[True], ~joins]))
+        last = np.append(first[1:] - 1, len(columns) - 1)
+        columns, starts, labels = columns[first], starts[first], labels[first]
+        ends, valid_end = ends[last], valid_end[last]
+
+        # The last merged run of each column may still be extended by a later run
+        latest = np.append(columns[1:] != columns[:-1], True)
+        self.pending_start[columns[latest]] = starts[latest]
+        self.pending_end[columns[latest]] = ends[latest]
+        self.pending_label[columns[latest]] = labels[latest]
+        self.pending_valid_end[columns[latest]] = valid_end[latest]
+        self._store(columns[~latest], starts[~latest], ends[~latest], labels[~latest])
+
+    def _flush_pending(self):
+        columns = np.flatnonzero(self.pending_start >= 0)
+        self._store(columns, self.pending_start[columns], self.pending_end[columns], self.pending_label[columns])
+        self.pending_start[columns] = -1
+
+    def _close_open_runs(self, columns=None):
+        if columns is None:
+            columns = np.flatnonzero(self.open_start >= 0)
+        self._emit(columns, self.open_start[columns], np.full(len(columns), self.next_frame - 1),
+                   self.open_label[columns], self.open_valid_before[columns], self.valid_total[columns])
+        self.open_start[columns] = -1
+
+    def update(self, mask, offset, labels=None, valid=None):
+        """Add the mask rows of frames offset .. offset + len(mask) - 1.
+
+        valid (same shape as mask) marks the frames in which the condition could be evaluated; it is only
+        needed with max_gap, and every frame is valid by default.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        block_length = mask.shape[0]
+        if offset != self.next_frame:
+            # A jump in frames breaks every run that was still open
+            self._close_open_runs()
+            self._flush_pending()
+            self.next_frame = offset
+        if block_length == 0:
+            return
+
+        padded = np.zeros((block_length + 2, self.num_columns), dtype=np.int8)
+        padded[1:-1] = mask
+        edges = np.diff(padded, axis=0).T
+        columns, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        ends = ends - 1
+        run_labels = labels[starts, columns] if self.track_labels else np.zeros(len(columns), dtype=np.int64)
+
+        valid_before = valid_end = None
+        if self.max_gap:
+            valid = np.ones_like(mask) if valid is None else np.asarray(valid, dtype=bool)
+            # counts[t] is the number of valid frames up to and including block frame t
+            counts = self.valid_total + np.cumsum(valid, axis=0, dtype=np.int64)
+            valid_before = np.where(starts > 0, counts[starts - 1, columns], self.valid_total[columns])
+            valid_end = counts[ends, columns]
+        starts = starts + offset
+        ends = ends + offset
+
+        # Open runs that did not continue into this block ended on the previous frame
+        self._close_open_runs(np.flatnonzero((self.open_start >= 0) & ~mask[0]))
+
+        carried = (starts == offset) & (self.open_start[columns] >= 0)
+        starts[carried] = self.open_start[columns[carried]]
+        run_labels[carried] = self.open_label[columns[carried]]
+        if self.max_gap:
+            valid_before[carried] = self.open_valid_before[columns[carried]]
+            self.valid_total = counts[-1]
+        self.open_start[:] = -1
+
+        still_open = ends == offset + block_length - 1
+        self.open_start[columns[still_open]] = starts[still_open]
+        self.open_label[columns[still_open]] = run_labels[still_open]
+        if self.max_gap:
+            self.open_valid_before[columns[still_open]] = valid_before[still_open]
+            valid_before, valid_end = valid_before[~still_open], valid_end[~still_open]
+        self._emit(columns[~still_open], starts[~still_open], ends[~still_open], run_labels[~still_open],
+                   valid_before, valid_end)
+        self.next_frame = offset + block_length
+
+    def finish(self):
+        """Close the remaining runs and return (columns, start_frames, end_frames) like find_runs.
+
+        With track_labels=True a fourth array holds the label of each run.
+        """
+        self._close_open_runs()
+        self._flush_pending()
+        if self._columns:
+            columns = np.concatenate(self._columns)
+            starts = np.concatenate(self._starts)
+            ends = np.concatenate(self._ends)
+            labels = np.concatenate(self._labels)
+        else:
+            columns, starts, ends, labels = (np.zeros(0, dtype=np.int64) for _ in range(4))
+
+        order = np.lexsort((starts, columns))
+        runs = columns[order], starts[order], ends[order]
+        if self.track_labels:
+            return runs + (labels[order],)
+        return runs
@@ -0,0 +1,150 @@
+"""
+Trajectory smoothing for all tracks and nodes at once, vectorized along the frame axis.
+
+Both filters work on frame blocks and give exactly the same result as filtering the whole array:
+the Savitzky-Golay filter reads half a window of halo frames on each side of a block, and the
+Kalman filter carries its state from one block to the next. Run them after fill_missing;
+see each function for how remaining NaN values are handled.
+
+Example:
+    filled_locations = fill_missing(locations)
+    smoothed = smooth_savgol(filled_locations, window_length=9, polyorder=2)
+"""
+import numpy as np
+from scipy import linalg, signal
+from scipy.ndimage import maximum_filter1d
+from runlength import find_runs
+
+
+def savgol_blocks(locations, window_length=9, polyorder=2, block_size=4096):
+    """Yield (start_frame, smoothed block) for consecutive frame blocks of a Savitzky-Golay filtered array.
+
+    A missing point makes every output whose filter window contains it NaN, so all-NaN track
+    slots stay NaN and gaps left by fill_missing grow by half a window on each side.
+    """
+    frame_count = locations.shape[0]
+    halo = window_length // 2
+    for start in range(0, frame_count, block_size):
+        stop = min(start + block_size, frame_count)
+        lo, hi = max(start - halo, 0), min(stop + halo, frame_count)
+        # Keep the window at least window_length frames long near the end of the recording
+        lo = max(0, min(lo, hi - window_length))
+        window = locations[lo:hi]
+
+        missing = np.isnan(window)
+        smoothed = signal.savgol_filter(np.where(missing, 0, window), window_length, polyorder, axis=0, mode="interp")
+        touched = maximum_filter1d(missing, window_length, axis=0, mode="constant", cval=False)
+        # At the ends of the recording the polynomial is fitted to the first / last window_length frames
+        if lo == 0:
+            touched[:halo] |= missing[:window_length].any(axis=0)
+        if hi == frame_count:
+            touched[-halo:] |= missing[-window_length:].any(axis=0)
+        smoothed[touched] = np.nan
+        yield start, smoothed[start - lo:stop - lo].astype(locations.dtype, copy=False)
+
+
+def smooth_savgol(locations, window_length=9, polyorder=2, block_size=4096, out=None):
+    """Savitzky-Golay smoothing of every node of every track along the frame axis.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, termites).
+    - window_length (int): Odd number of frames in the filter window.
+    - polyorder (int): Order of the polynomial fitted in each window.
+    - block_size (int): Number of frames filtered together.
+    - out (numpy.array): Optional array for the result. It cannot be locations itself, because the
+      halo frames of a block must still hold the unfiltered values.
+
+    Returns:
+    - numpy.array: The smoothed locations.
+    """
+    if out is locations:
+        raise ValueError("smooth_savgol cannot write into its input; the halo frames would already be smoothed")
+    if out is None:
+        out = np.empty_like(locations)
+    for start, block in savgol_blocks(locations, window_length, polyorder, block_size):
+        out[start:start + len(block)] = block
+    return out
+
+
+def steady_state_kalman_filter(process_noise=1.0, measurement_noise=4.0):
+    """IIR coefficients (b, a) of a steady-state constant-velocity Kalman filter for one coordinate.
+
+    With a fixed model the Kalman gain converges to a constant, and the filter becomes a linear
+    recursive filter that scipy.signal.lfilter can run along the frame axis of all series at once.
+    """
+    transition = np.array([[1.0, 1.0], [0.0, 1.0]])
+    observation = np.array([[1.0, 0.0]])
+    # White-noise acceleration between two frames
+    noise = process_noise * np.array([[0.25, 0.5], [0.5, 1.0]])
+    predicted = linalg.solve_discrete_are(transition.T, observation.T, noise, np.array([[measurement_noise]]))
+    gain = predicted @ observation.T / (observation @ predicted @ observation.T + measurement_noise)
+
+    # x_k = A x_(k-1) + K z_k with A = (I - K H) F, and position estimate y_k = H x_k = H A x_(k-1) + H K z_k
+    update = (np.eye(2) - gain @ observation) @ transition
+    b, a = signal.ss2tf(update, gain, observation @ update, observation @ gain)
+    return b[0] / a[0], a / a[0]
+
+
+class KalmanBlockFilter:
+    """Steady-state constant-velocity Kalman filter applied to consecutive frame blocks.
+
+    Each series (node coordinate of a track) is filtered over its runs of present frames: missing
+    frames stay NaN, and the filter restarts at rest on the first frame after a gap. The state is
+    carried from one block to the next, so the result does not depend on the block size.
+    """
+
+    def __init__(self, process_noise=1.0, measurement_noise=4.0):
+        self.b, self.a = steady_state_kalman_filter(process_noise, measurement_noise)
+        self.step_state = signal.lfilter_zi(self.b, self.a)
+        self.state = None
+
+    def update(self, block):
+        """Filter the next block of frames and return the filtered block."""
+        series = block.reshape(block.shape[0], -1)
+        if self.state is None:
+            self.state = np.full((len(self.step_state), series.shape[1]), np.nan)
+
+        present = ~np.isnan(series)
+        complete = present.all(axis=0)
+        restart = complete & np.isnan(self.state[0])
+        # Start at rest on the first sample: no jump from zero at the beginning of a series
+        self.state[:, restart] = self.step_state[:, None] * series[0, restart]
+
+        filtered = np.full(series.shape, np.nan)
+        filtered[:, complete], self.state[:, complete] = signal.lfilter(
+            self.b, self.a, series[:, complete], axis=0, zi=self.state[:, complete])
+
+        # Series with gaps in this block are filtered run by run
+        columns, starts, ends = find_runs(present[:, ~complete])
+        columns = np.flatnonzero(~complete)[columns]
+        for column, start, end in zip(columns, starts, ends):
+            state = self.state[:, column]
+            if start > 0 or np.isnan(state[0]):
+                state = self.step_state * series[start, column]
+            filtered[start:end + 1, column], state = signal.lfilter(
+                self.b, self.a, series[start:end + 1, column], zi=state)
+            if end == len(series) - 1:
+                self.state[:, column] = state
+        self.state[:, ~present[-1]] = np.nan
+        return filtered.reshape(block.shape).astype(block.dtype, copy=False)
+
+
+def smooth_kalman(locations, process_noise=1.0, measurement_noise=4.0, block_size=4096, out=None):
+    """Causal Kalman smoothing of every node of every track, block by block.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, termites).
+    - process_noise (float): Variance of the acceleration between frames (px^2); larger follows the data more closely.
+    - measurement_noise (float): Variance of the tracking jitter (px^2); larger smooths more.
+    - block_size (int): Number of frames filtered together.
+    - out (numpy.array): Optional array for the result; may be locations itself.
+
+    Returns:
+    - numpy.array: The filtered locations.
+    """
+    if out is None:
+        out = np.empty_like(locations)
+    kalman = KalmanBlockFilter(process_noise, measurement_noise)
+    for start in range(0, locations.shape[0], block_size):
+        out[start:start + block_size] = kalman.update(locations[start:start + block_size])
+    return out
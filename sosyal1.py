@@ -2,6 +2,7 @@ import h5py
 import numpy as np
 from fillmissing import fill_missing
 from cleaning import clean_and_validate_data
+from pipeline import run_detectors
 
 def load_h5_data(filename):
     with h5py.File(filename, "r") as f:
@@ -114,13 +115,13 @@ filename = "h5try/7_3_dev.h5"
 frame_count, node_count, instance_count, locations, track_names, node_names = load_h5_data(filename)
 filled_locations = fill_missing(locations)
 
-# Analyze interactions
-interaction_counts = analyze_proximity(filled_locations)
+# Analyze interactions, mutual grooming and self-grooming in a single pass
+results = run_detectors(filled_locations, ["proximity_counts", "mutual_grooming", "self_grooming"])
+interaction_counts = results["proximity_counts"]
 interaction_summary = summarize_interactions(interaction_counts, frame_count)
 
-# Detect mutual grooming and self-grooming events
-mutual_grooming_events = detect_mutual_grooming(filled_locations)
-self_grooming_events = detect_self_grooming(filled_locations)
+mutual_grooming_events = results["mutual_grooming"]
+self_grooming_events = results["self_grooming"]
 
 # Print the interaction summary
 #for termite, interactions in interaction_summary.items():
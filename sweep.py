@@ -0,0 +1,93 @@
+"""
+Threshold parameter sweeps. Instead of rerunning a detector for every combination of thresholds, one
+pipeline detector is created per combination of the spatial thresholds (distance, angle range, ...)
+and all of them run together through run_detectors: the distances and bearings of every frame block
+are computed once and shared, and each detector only applies its own comparisons.
+
+Durations cost nothing extra: every detector finds its runs once with the smallest min_duration_frames
+of the grid, and the events of each larger duration are a filter of those runs.
+
+Example:
+    cells = sweep_grooming(filled_locations, max_distances=[30, 40, 50, 60], min_durations=[15, 30, 45])
+    print_sweep(cells)
+"""
+import itertools
+import numpy as np
+from pipeline import make_detector, run_detectors
+
+
+def threshold_grid(**values):
+    """All combinations of the given parameter values, as a list of dicts."""
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values.values())]
+
+
+def filter_by_duration(events, min_duration_frames):
+    """Events lasting at least min_duration_frames frames (start and end frames are the last two fields)."""
+    return [event for event in events if event[-1] - event[-2] + 1 >= min_duration_frames]
+
+
+def sweep_detector(locations, name, grid, min_durations, block_size=None, pairs=None, **fixed):
+    """
+    Evaluate a registered detector for every cell of a threshold grid in a single pass over the frames.
+
+    Parameters:
+    - locations (numpy.array): The 4D array with shape (frames, nodes, coordinates, termites).
+    - name (str): Registered detector name, e.g. "grooming" or "proximity".
+    - grid (list): Parameter dicts, one per spatial cell, e.g. from threshold_grid.
+    - min_durations (list): min_duration_frames values; every spatial cell is evaluated with each of them.
+    - block_size, pairs: See pipeline.run_detectors.
+    - fixed: Further detector parameters shared by all cells.
+
+    Returns:
+    - list: One dict per grid cell with "params" (including min_duration_frames), "count" and "events".
+    """
+    min_durations = sorted(min_durations)
+    detectors = [make_detector(name, label=f"cell {index}", min_duration_frames=min_durations[0], **fixed, **params)
+                 for index, params in enumerate(grid)]
+    results = run_detectors(locations, detectors, block_size, pairs)
+
+    cells = []
+    for detector, params in zip(detectors, grid):
+        for min_duration in min_durations:
+            events = filter_by_duration(results[detector.label], min_duration)
+            cells.append({"params": dict(params, min_duration_frames=min_duration), "count": len(events),
+                          "events": events})
+    return cells
+
+
+def sweep_grooming(locations, max_distances, min_durations, min_distances=(1,), **options):
+    """Sweep the grooming detector (groom.detect_grooming_events) over distance and duration thresholds."""
+    grid = threshold_grid(min_distance=min_distances, max_distance=max_distances)
+    return sweep_detector(locations, "grooming", grid, min_durations, **options)
+
+
+def sweep_proximity(locations, proximity_thresholds, angle_ranges, min_durations, **options):
+    """Sweep the proximity detector (proximity.detect_proximity_interactions_with_nodes_and_angles).
+
+    angle_ranges is a list of (min_angle, max_angle) tuples.
+    """
+    grid = [dict(proximity_threshold=threshold, min_angle=low, max_angle=high)
+            for threshold, (low, high) in itertools.product(proximity_thresholds, angle_ranges)]
+    return sweep_detector(locations, "proximity", grid, min_durations, **options)
+
+
+def sweep_counts(cells, row, column):
+    """Event counts as a 2D table over two swept parameters, summing over the others.
+
+    Returns:
+    - tuple: (row values, column values, counts array).
+    """
+    row_values = sorted({cell["params"][row] for cell in cells})
+    column_values = sorted({cell["params"][column] for cell in cells})
+    counts = np.zeros((len(row_values), len(column_values)), dtype=np.int64)
+    for cell in cells:
+        counts[row_values.index(cell["params"][row]), column_values.index(cell["params"][column])] += cell["count"]
+    return row_values, column_values, counts
+
+
+def print_sweep(cells):
+    """Print the event count of every grid cell."""
+    for cell in cells:
+        params = ", ".join(f"{key}={value}" for key, value in cell["params"].items())
+        print(f"{params}: {cell['count']} events")
@@ -0,0 +1,83 @@
+"""
+Temporal contact-chain reachability: which termites could have been reached from a source termite
+through time-ordered contacts (grooming, trophallaxis, pathogen spread), and when at the earliest.
+
+Contacts are intervals (a, b, start_frame, end_frame). Something that reached a at frame t passes to b
+at frame max(t, start_frame), provided t <= end_frame. For each source the termites are settled in order
+of arrival, as in Dijkstra's algorithm: a settled termite passes the agent on through the contacts that
+end at or after its arrival frame, so every contact is examined at most once per source, whatever the
+order in which overlapping contacts start.
+
+Example:
+    events = detect_grooming_events(filled_locations)
+    arrival = earliest_arrival(events, instance_count)
+    reached = reach_sets(arrival)
+"""
+import heapq
+import numpy as np
+from contact_network import event_arrays
+
+NOT_REACHED = np.iinfo(np.int64).max
+
+
+def earliest_arrival(events, num_termites, directed=False, start_frame=0):
+    """Earliest frame at which every termite can be reached from every source.
+
+    Parameters:
+    - events (list): Contact events, e.g. from groom.detect_grooming_events or the pipeline detectors.
+    - num_termites (int): Number of termites (track slots).
+    - directed (bool): Only pass from the active to the passive termite of each event.
+    - start_frame (int): Frame at which each source carries the agent.
+
+    Returns:
+    - numpy.array: (sources, termites) arrival frames; NOT_REACHED where a termite cannot be reached.
+    """
+    active, passive, starts, ends = event_arrays(events)
+    keep = ends >= start_frame
+    active, passive, starts, ends = active[keep], passive[keep], starts[keep], ends[keep]
+    if not directed:
+        active, passive = np.concatenate([active, passive]), np.concatenate([passive, active])
+        starts, ends = np.concatenate([starts, starts]), np.concatenate([ends, ends])
+    # Contacts grouped by the termite that passes the agent on, sorted by end frame within a group
+    order = np.lexsort((ends, active))
+    passive, starts, ends = passive[order], np.maximum(starts[order], start_frame), ends[order]
+    bounds = np.searchsorted(active[order], np.arange(num_termites + 1))
+
+    arrival = np.full((num_termites, num_termites), NOT_REACHED, dtype=np.int64)
+    for source in range(num_termites):
+        row = arrival[source]
+        row[source] = start_frame
+        settled = np.zeros(num_termites, dtype=bool)
+        queue = [(start_frame, source)]
+        while queue:
+            frame, termite = heapq.heappop(queue)
+            if settled[termite]:
+                continue
+            settled[termite] = True
+            # Only the contacts still running at the arrival frame can pass the agent on
+            lo, hi = bounds[termite], bounds[termite + 1]
+            lo += np.searchsorted(ends[lo:hi], frame)
+            targets = passive[lo:hi]
+            before = row[targets]
+            np.minimum.at(row, targets, np.maximum(starts[lo:hi], frame))
+            for target in np.unique(targets[row[targets] < before]):
+                heapq.heappush(queue, (int(row[target]), int(target)))
+    return arrival
+
+
+def reach_sets(arrival, include_source=False):
+    """Turn an arrival matrix into a dict mapping each source to the array of termites it reaches."""
+    reached = arrival != NOT_REACHED
+    if not include_source:
+        np.fill_diagonal(reached, False)
+    return {source: np.flatnonzero(reached[source]) for source in range(arrival.shape[0])}
+
+
+def reach_summary(arrival, start_frame=0):
+    """Number of termites reached by each source and the mean delay until they are reached."""
+    reached = arrival != NOT_REACHED
+    np.fill_diagonal(reached, False)
+    counts = reached.sum(axis=1)
+    delays = np.where(reached, arrival - start_frame, 0).sum(axis=1)
+    mean_delay = np.divide(delays, counts, out=np.full(len(counts), np.nan), where=counts > 0)
+    return counts, mean_delay
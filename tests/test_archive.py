@@ -0,0 +1,31 @@
+import numpy as np
+from archive import load_archive, read_archive, write_archive
+from benchmark import synthetic_locations
+
+
+def test_round_trip_within_the_fixed_point_step(tmp_path):
+    locations = synthetic_locations(1000, 5, 3, missing_fraction=0.05)
+    # A jump beyond the int16 delta range, and a track that leaves and comes back
+    locations[500:, :, 0, 2] += 5000
+    locations[200:300, :, :, 4] = np.nan
+    path = str(tmp_path / "recording.sarc")
+
+    write_archive(locations, path, track_names=[f"track_{i}" for i in range(5)],
+                  node_names=["mandible", "thorax", "abdomen"], scale=16, frame_chunk=128)
+    frame_count, node_count, instance_count, loaded, track_names, node_names = load_archive(path, dtype=np.float64)
+
+    assert (frame_count, node_count, instance_count) == locations.shape[:2] + locations.shape[3:]
+    assert track_names[4] == "track_4" and node_names == ["mandible", "thorax", "abdomen"]
+    np.testing.assert_array_equal(np.isnan(loaded), np.isnan(locations))
+    assert np.nanmax(np.abs(loaded - locations)) <= 0.5 / 16
+
+
+def test_read_archive_window_across_chunks(tmp_path):
+    locations = synthetic_locations(1000, 4, 3, missing_fraction=0.05)
+    path = str(tmp_path / "recording.sarc")
+    write_archive(locations, path, frame_chunk=128)
+
+    window = read_archive(path, 250, 700, dtype=np.float64)
+
+    np.testing.assert_array_equal(window, read_archive(path, dtype=np.float64)[250:700])
+    np.testing.assert_array_equal(np.isnan(window), np.isnan(locations[250:700]))
@@ -0,0 +1,42 @@
+import numpy as np
+from contact_network import ContactNetworks, load_contact_networks, save_contact_networks
+from contacts import all_pairs
+
+
+def test_asymmetric_events_in_both_directions_are_added():
+    # 0 grooms 1 for 10 frames and 1 grooms 0 for 4 frames: 14 contact frames between them
+    events = [(0, 1, 0, 9), (1, 0, 20, 23), (1, 2, 50, 54)]
+
+    networks = ContactNetworks.from_events(events, 3, window_size=100, frame_count=100)
+
+    assert networks.window(0).toarray().tolist() == [[0, 14, 0], [14, 0, 5], [0, 5, 0]]
+    assert networks.strength().tolist() == [[14, 19, 5]]
+    assert networks.degree().tolist() == [[1, 2, 1]]
+
+
+def test_directed_networks_keep_the_directions_apart():
+    events = [(0, 1, 0, 9), (1, 0, 20, 23)]
+
+    networks = ContactNetworks.from_events(events, 2, window_size=100, frame_count=100, directed=True)
+
+    assert networks.window(0).toarray().tolist() == [[0, 10], [4, 0]]
+
+
+def test_symmetric_contacts_listed_in_both_orders_count_once():
+    active, passive = all_pairs(3)
+    events = [(int(a), int(p), 0, 9) for a, p in zip(active, passive)]
+
+    networks = ContactNetworks.from_events(events, 3, window_size=100, frame_count=100, unordered=True)
+
+    assert networks.strength().tolist() == [[20, 20, 20]]
+
+
+def test_events_are_split_over_windows_and_survive_a_round_trip(tmp_path):
+    events = [(0, 1, 90, 109), (2, 1, 150, 160)]
+    networks = ContactNetworks.from_events(events, 3, window_size=100, frame_count=200)
+
+    save_contact_networks(networks, tmp_path / "networks.npz")
+    loaded = load_contact_networks(tmp_path / "networks.npz")
+
+    assert networks.strength().tolist() == [[10, 10, 0], [10, 21, 11]]
+    assert (loaded.matrix != networks.matrix).nnz == 0
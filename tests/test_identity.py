@@ -0,0 +1,23 @@
+import numpy as np
+from identity import apply_identity_swaps, detect_identity_swaps
+
+
+def crowded_tracks(frame_count=200, num_tracks=4, spacing=20.0):
+    """Termites side by side 20 px apart, all walking up at 1 px per frame, three nodes each."""
+    locations = np.zeros((frame_count, 3, 2, num_tracks))
+    locations[:, :, 0, :] = np.arange(num_tracks) * spacing
+    locations[:, :, 1, :] = np.arange(frame_count)[:, None, None] + np.array([0.0, 5.0, 10.0])[None, :, None]
+    return locations
+
+
+def test_chained_swaps_are_all_detected_and_undone():
+    truth = crowded_tracks()
+    swapped = truth.copy()
+    # Columns 1 and 2 swap at frame 51, then the columns holding identities 1 and 3 swap at frame 151
+    swapped[51:] = swapped[51:][:, :, :, [0, 2, 1, 3]]
+    swapped[151:] = swapped[151:][:, :, :, [0, 1, 3, 2]]
+
+    swaps = detect_identity_swaps(swapped, encounter_radius=60)
+
+    assert [(frame, list(tracks)) for frame, tracks, _ in swaps] == [(51, [1, 2]), (151, [1, 3])]
+    np.testing.assert_array_equal(apply_identity_swaps(swapped, swaps), truth)
@@ -0,0 +1,37 @@
+import numpy as np
+import memory
+import pytest
+from benchmark import synthetic_locations
+from occupancy import load_occupancy, occupancy_from_locations, save_occupancy
+
+
+def test_sparse_maps_match_a_histogram_and_survive_save_and_load(tmp_path):
+    locations = synthetic_locations(1000, 5, 3, missing_fraction=0.05)
+    bounds = (np.nanmin(locations[:, :, 0]), np.nanmax(locations[:, :, 0]) + 1,
+              np.nanmin(locations[:, :, 1]), np.nanmax(locations[:, :, 1]) + 1)
+
+    maps = occupancy_from_locations(locations, bounds, cell_size=5, block_size=37)
+    x_edges, y_edges = maps.edges()
+    x, y = locations[:, 1, 0, 3], locations[:, 1, 1, 3]
+    expected, _, _ = np.histogram2d(y[~np.isnan(x)], x[~np.isnan(x)], bins=(y_edges, x_edges))
+
+    np.testing.assert_array_equal(maps.track_map("time", 3, node=1), expected)
+    np.testing.assert_array_equal(maps.colony("time"), maps.dense("time").sum(axis=(0, 1)))
+    assert maps.colony("time").sum() == (~np.isnan(locations).any(axis=2)).sum()
+
+    save_occupancy(maps, tmp_path / "maps.npz")
+    loaded = load_occupancy(tmp_path / "maps.npz")
+    for kind in maps.kinds:
+        np.testing.assert_array_equal(loaded.dense(kind), maps.dense(kind))
+
+
+def test_dense_maps_respect_the_memory_budget():
+    locations = synthetic_locations(100, 5, 3, missing_fraction=0)
+    maps = occupancy_from_locations(locations, (0, 1000, 0, 1000), cell_size=1)
+
+    memory.set_memory_budget("1MB")
+    try:
+        with pytest.raises(ValueError):
+            maps.dense("time")
+    finally:
+        memory.set_memory_budget(None)
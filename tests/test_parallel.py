@@ -0,0 +1,23 @@
+import numpy as np
+import memory
+from benchmark import synthetic_locations
+from parallel import run_detectors_parallel, run_sharded
+from pipeline import run_detectors
+
+
+def worker_memory_settings(arrays, shard):
+    return memory.MEMORY_BUDGET, np.dtype(memory.analysis_dtype()).name
+
+
+def test_spawned_workers_use_the_memory_budget_of_the_parent():
+    memory.set_memory_budget("64MB")
+    try:
+        settings = run_sharded(worker_memory_settings, {}, [0, 1], processes=2, start_method="spawn")
+        locations = synthetic_locations(400, 6, 3, missing_fraction=0).astype(np.float32)
+        parallel = run_detectors_parallel(locations, ["grooming", "proximity"], processes=2, start_method="spawn")
+        serial = run_detectors(locations, ["grooming", "proximity"])
+    finally:
+        memory.set_memory_budget(None)
+
+    assert settings == [(64 * 1024 ** 2, "float32")] * 2
+    assert parallel == serial
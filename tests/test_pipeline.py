@@ -0,0 +1,16 @@
+import warnings
+import numpy as np
+from pipeline import make_detector, run_detectors
+
+
+def test_approach_retreat_handles_coincident_nodes():
+    steps = np.arange(30, dtype=float)[:, None, None] * [2.0, 0]
+    body = np.array([[8, 0], [0, 0], [-8, 0]], dtype=float)[None]
+    locations = np.stack([steps + body, steps + body], axis=-1)
+    detector = make_detector("approach_retreat", contact_distance=5, approach_distance=50, min_duration_frames=3)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        events = run_detectors(locations, [detector])["approach_retreat"]
+
+    assert events == [("contact", 0, 1, 0, 29)]
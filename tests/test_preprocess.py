@@ -0,0 +1,28 @@
+import h5py
+import numpy as np
+from benchmark import synthetic_locations
+from preprocess import load_cache
+
+
+def write_sleap_file(filename, locations):
+    with h5py.File(filename, "w") as f:
+        f["tracks"] = locations.T
+        f["track_names"] = np.array([f"track_{i}".encode() for i in range(locations.shape[3])])
+        f["node_names"] = np.array([b"mandible", b"thorax", b"abdomen"])
+
+
+def test_cache_meta_records_what_cleaning_removed(tmp_path):
+    locations = synthetic_locations(500, 4, 3, missing_fraction=0)
+    locations[100, :, :, 2] += 5000
+    filename = str(tmp_path / "recording.h5")
+    write_sleap_file(filename, locations)
+
+    estimated = load_cache(filename)["meta"]["cleaning"]
+    given = load_cache(filename, bounds=(-1e6, 1e6, -1e6, 1e6))["meta"]["cleaning"]
+
+    assert estimated["bounds_source"] == "estimated"
+    assert estimated["counts"]["out_of_bounds"] == 3
+    assert given["bounds_source"] == "given"
+    assert given["bounds"] == [-1e6, 1e6, -1e6, 1e6]
+    assert given["counts"]["out_of_bounds"] == 0
+    assert given["counts"]["velocity_outliers"] == 3
@@ -0,0 +1,86 @@
+import numpy as np
+from pipeline import make_detector, run_detectors
+from ragged import RaggedTracks, run_ragged_detectors
+
+
+def random_walks(frame_count=600, num_tracks=8, seed=0, scale=120):
+    """(frames, 3 nodes, 2, tracks) random walks of straight three-node bodies."""
+    rng = np.random.default_rng(seed)
+    centre = np.cumsum(rng.normal(0, 2, (frame_count, 2, num_tracks)), axis=0) + rng.uniform(0, scale, (1, 2, num_tracks))
+    angle = rng.uniform(0, 2 * np.pi, num_tracks)
+    body = np.stack([np.cos(angle), np.sin(angle)]) * 8
+    return np.stack([centre + node * body for node in range(3)], axis=1)
+
+
+def broken_tracks(seed=3):
+    """Three tracks span the recording, the others exist for part of it and one never occurs."""
+    locations = random_walks()
+    rng = np.random.default_rng(seed)
+    for track in range(3, 8):
+        start = rng.integers(0, 300)
+        stop = rng.integers(start + 50, 600)
+        locations[:start, :, :, track] = np.nan
+        locations[stop:, :, :, track] = np.nan
+    locations[:, :, :, 5] = np.nan
+    return locations
+
+
+def detectors():
+    return [make_detector("grooming", min_duration_frames=5),
+            make_detector("leader_follower", proximity_threshold=60, min_leader_frames=3),
+            make_detector("mutual_grooming", distance_threshold=60, min_duration_frames=10),
+            make_detector("proximity", proximity_threshold=60, min_duration_frames=5),
+            make_detector("approach_retreat", contact_distance=30, approach_distance=80, min_closing_speed=0.5,
+                          min_duration_frames=3)]
+
+
+def test_round_trip_to_dense_locations():
+    locations = broken_tracks()
+
+    ragged = RaggedTracks.from_locations(locations)
+
+    assert ragged.lengths[5] == 0
+    np.testing.assert_array_equal(ragged.to_locations(), locations)
+
+
+def test_ragged_detectors_match_a_dense_run():
+    locations = broken_tracks()
+
+    dense = run_detectors(locations, detectors(), block_size=40)
+    ragged = run_ragged_detectors(RaggedTracks.from_locations(locations), detectors(), block_size=17)
+
+    assert all(dense[label] for label in ("grooming", "leader_follower", "approach_retreat"))
+    assert ragged == dense
+
+
+def test_fill_missing_stays_inside_lifespans():
+    locations = broken_tracks()
+    locations[100:103, 1, :, 0] = np.nan
+    ragged = RaggedTracks.from_locations(locations)
+
+    filled = ragged.fill_missing().to_locations()
+
+    assert not np.isnan(filled[100:103, 1, :, 0]).any()
+    np.testing.assert_array_equal(np.isnan(filled).all(axis=(1, 2)), np.isnan(locations).all(axis=(1, 2)))
+
+
+def test_previous_frame_seeds_speed_at_the_window_start():
+    steps = np.arange(40, dtype=float)[:, None, None] * [1.5, 0]
+    body = np.array([[[8, 0]], [[0, 0]], [[-8, 0]]], dtype=float).transpose(1, 0, 2)
+    locations = np.stack([steps + body, steps + body + [0, 20]], axis=-1)
+
+    def leader_follower():
+        return [make_detector("leader_follower", proximity_threshold=60, min_leader_frames=3)]
+
+    whole = run_detectors(locations, leader_follower())
+    seeded = run_detectors(locations[10:], leader_follower(), frame_offset=10, previous=locations[9])
+    unseeded = run_detectors(locations[10:], leader_follower(), frame_offset=10)
+
+    assert whole["leader_follower"][0][2] == 1
+    assert seeded["leader_follower"][0][2] == 10
+    assert unseeded["leader_follower"][0][2] == 11
+
+    locations[:10, :, :, 1] = np.nan
+    previous = RaggedTracks.from_locations(locations).previous_frame([0, 1], 10)
+    np.testing.assert_array_equal(previous[:, :, 0], locations[9, :, :, 0])
+    assert np.isnan(previous[:, :, 1]).all()
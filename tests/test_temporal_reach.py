@@ -0,0 +1,32 @@
+import numpy as np
+from temporal_reach import NOT_REACHED, earliest_arrival, reach_sets
+
+
+def test_overlapping_chain_out_of_start_order_is_reached():
+    # Contact k links termites k and k + 1 and starts one frame before contact k - 1, so the chain
+    # runs backwards in start order; all contacts overlap, so the agent reaches every termite at 1000
+    events = [(k, k + 1, 1000 - k, 2000) for k in range(800)]
+
+    arrival = earliest_arrival(events, 801, directed=True)
+
+    assert (arrival[0, 1:] == 1000).all()
+    assert (arrival[800, :800] == NOT_REACHED).all()
+
+
+def test_contact_that_ended_before_arrival_does_not_pass_the_agent():
+    events = [(0, 1, 10, 20), (1, 2, 0, 15), (1, 3, 5, 30)]
+
+    arrival = earliest_arrival(events, 4)
+
+    assert arrival[0].tolist() == [0, 10, 10, 10]
+    assert arrival[2].tolist() == [10, 0, 0, 5]
+    assert reach_sets(arrival)[0].tolist() == [1, 2, 3]
+
+
+def test_directed_contacts_pass_only_from_active_to_passive():
+    events = [(0, 1, 0, 5), (2, 1, 3, 8)]
+
+    arrival = earliest_arrival(events, 3, directed=True)
+
+    assert arrival[0].tolist() == [0, 0, NOT_REACHED]
+    assert arrival[1].tolist() == [NOT_REACHED, 0, NOT_REACHED]
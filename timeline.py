@@ -0,0 +1,121 @@
+"""
+Level-of-detail event timelines for large event sets. Events are binned once into a pyramid of
+per-pair counts: level 0 counts the event frames of every track pair in buckets of base_bucket
+frames, and every further level merges factor buckets of the level below. A view only draws the
+level whose buckets match the screen resolution over the visible frame range, so thousands of pairs
+and events stay responsive; the interactive viewer swaps in finer levels when zooming in.
+
+Example:
+    pyramid = EventPyramid(grooming_events, frame_count)
+    show_timeline(pyramid)
+"""
+import numpy as np
+from scipy import sparse
+from contact_network import window_edges_from_events
+
+
+class EventPyramid:
+    """Multi-resolution (pairs, buckets) counts of event frames per track pair.
+
+    pairs holds the (active, passive) track indices of the rows; levels[k] is a sparse matrix with
+    buckets of base_bucket * factor ** k frames, so memory grows with the events, not the recording.
+    """
+
+    def __init__(self, events, frame_count, base_bucket=16, factor=4):
+        self.frame_count = frame_count
+        self.base_bucket = base_bucket
+        self.factor = factor
+
+        window, active, passive, frames = window_edges_from_events(events, base_bucket)
+        stride = int(passive.max()) + 1 if len(passive) else 1
+        keys, rows = np.unique(active * stride + passive, return_inverse=True)
+        self.pairs = np.stack(np.divmod(keys, stride), axis=1)
+        num_buckets = max(1, -(-frame_count // base_bucket))
+        base = sparse.csr_matrix((frames.astype(np.float32), (rows, window)), shape=(len(self.pairs), num_buckets))
+
+        self.levels = [base]
+        while self.levels[-1].shape[1] > 1:
+            # Sum groups of factor buckets: multiply by a (buckets, buckets / factor) 0/1 matrix
+            below = self.levels[-1].shape[1]
+            merge = sparse.csr_matrix((np.ones(below, dtype=np.float32), (np.arange(below), np.arange(below) // factor)),
+                                      shape=(below, -(-below // factor)))
+            self.levels.append((self.levels[-1] @ merge).tocsr())
+
+    def bucket_size(self, level):
+        return self.base_bucket * self.factor ** level
+
+    def pair_labels(self):
+        return [f"{a}-{p}" for a, p in self.pairs]
+
+    def level_for(self, first_frame, last_frame, max_buckets):
+        """Finest level that shows the frame range in at most max_buckets buckets."""
+        span = max(last_frame - first_frame + 1, 1)
+        for level in range(len(self.levels)):
+            if span / self.bucket_size(level) <= max_buckets:
+                return level
+        return len(self.levels) - 1
+
+    def view(self, first_frame, last_frame, max_buckets=2000):
+        """
+        Counts for a frame range at the matching level of detail.
+
+        Returns:
+        - tuple: (level, first frame of the first bucket, bucket size, (pairs, buckets) fraction of event frames)
+        """
+        level = self.level_for(first_frame, last_frame, max_buckets)
+        size = self.bucket_size(level)
+        counts = self.levels[level]
+        lo = min(max(int(first_frame) // size, 0), counts.shape[1] - 1)
+        hi = min(max(int(last_frame) // size + 1, lo + 1), counts.shape[1])
+        return level, lo * size, size, counts[:, lo:hi].toarray() / size
+
+
+class TimelineViewer:
+    """Interactive matplotlib view of an EventPyramid that redraws the matching level after every zoom or pan."""
+
+    def __init__(self, pyramid, max_buckets=2000, max_labels=60, cmap="viridis"):
+        import matplotlib.pyplot as plt
+
+        self.pyramid = pyramid
+        self.max_buckets = max_buckets
+        self.figure, self.ax = plt.subplots(figsize=(15, 10))
+        num_pairs = len(pyramid.pairs)
+        self.image = self.ax.imshow(np.zeros((max(num_pairs, 1), 1)), aspect="auto", origin="lower",
+                                    interpolation="nearest", cmap=cmap, vmin=0, vmax=1)
+        self.figure.colorbar(self.image, ax=self.ax, label="Fraction of frames with an event")
+        step = max(1, -(-num_pairs // max_labels))
+        self.ax.set_yticks(np.arange(0, num_pairs, step))
+        self.ax.set_yticklabels(pyramid.pair_labels()[::step])
+        self.ax.set_xlabel("Frame")
+        self.ax.set_ylabel("Track pairs")
+        self._updating = False
+        self.show_range(0, pyramid.frame_count - 1)
+        self.ax.callbacks.connect("xlim_changed", self._on_xlim_changed)
+
+    def show_range(self, first_frame, last_frame):
+        level, start, size, counts = self.pyramid.view(first_frame, last_frame, self.max_buckets)
+        self._updating = True
+        self.image.set_data(counts)
+        self.image.set_extent((start, start + counts.shape[1] * size, -0.5, counts.shape[0] - 0.5))
+        self.ax.set_xlim(first_frame, last_frame)
+        self.ax.set_title(f"Event timeline ({size} frames per bucket)")
+        self._updating = False
+        self.figure.canvas.draw_idle()
+
+    def _on_xlim_changed(self, ax):
+        if not self._updating:
+            first, last = ax.get_xlim()
+            self.show_range(max(first, 0), min(last, self.pyramid.frame_count - 1))
+
+
+def show_timeline(pyramid_or_events, frame_count=None, **options):
+    """Open the interactive timeline for an EventPyramid or an event list."""
+    import matplotlib.pyplot as plt
+
+    pyramid = pyramid_or_events
+    if not isinstance(pyramid, EventPyramid):
+        frame_count = frame_count or max((event[-1] for event in pyramid_or_events), default=0) + 1
+        pyramid = EventPyramid(pyramid_or_events, frame_count)
+    viewer = TimelineViewer(pyramid, **options)
+    plt.show()
+    return viewer